@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+import logging
 import os
 
 # 确保在类定义前加载环境变量
@@ -9,15 +10,132 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Doc Translator"
     VERSION: str = "1.0.0"
     API_PREFIX: str = "/api"
+    LOG_LEVEL: str = "INFO"
+    # 独立 worker 暴露 /metrics 的端口，0 表示不启用（API 进程直接使用 /metrics 路由）
+    WORKER_METRICS_PORT: int = 0
     UPLOAD_DIR: str = "uploads"
+    # 上传文件大小上限（字节）与流式写盘的分块大小
+    MAX_UPLOAD_SIZE: int = 20 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
-    CLOUDFLARE_ACCOUNT_ID: str
-    CLOUDFLARE_ACCESS_KEY_ID: str
-    CLOUDFLARE_ACCESS_KEY_SECRET: str
-    R2_BUCKET_NAME: str
-    
+    OPENAI_MODEL: str = "gpt-3.5-turbo"
+    # OpenAI 兼容服务的地址，为空时使用官方 API
+    OPENAI_BASE_URL: str = ""
+    # 翻译引擎：openai、compatible（另一个 OpenAI 兼容服务，如本地模型）或 offline（确定性伪译文，用于测试与基准）；
+    # 主引擎失败或超时后改用 TRANSLATION_FALLBACK_ENGINE，为空时不降级
+    TRANSLATION_ENGINE: str = "openai"
+    TRANSLATION_FALLBACK_ENGINE: str = ""
+    COMPATIBLE_BASE_URL: str = "http://localhost:8000/v1"
+    COMPATIBLE_API_KEY: str = ""
+    COMPATIBLE_MODEL: str = ""
+    # 结果存储：r2 或 local（本地目录，通过 API 下载）
+    STORAGE_BACKEND: str = "r2"
+    CLOUDFLARE_ACCOUNT_ID: str = ""
+    CLOUDFLARE_ACCESS_KEY_ID: str = ""
+    CLOUDFLARE_ACCESS_KEY_SECRET: str = ""
+    R2_BUCKET_NAME: str = ""
+    # 覆盖 R2 地址，可指向 MinIO 等 S3 兼容服务
+    R2_ENDPOINT_URL: str = ""
+    LOCAL_STORAGE_DIR: str = "storage"
+    # 本地存储生成下载链接时使用的服务地址前缀，为空时返回相对路径
+    PUBLIC_BASE_URL: str = ""
+    # 下载链接有效期（秒）
+    STORAGE_URL_EXPIRES: int = 3600 * 24
+    # 同时进行的上传数、连接池大小与分片上传参数
+    STORAGE_WORKERS: int = 4
+    STORAGE_MAX_POOL_CONNECTIONS: int = 32
+    STORAGE_MULTIPART_THRESHOLD_MB: int = 16
+    STORAGE_MULTIPART_CHUNK_MB: int = 8
+    STORAGE_MULTIPART_CONCURRENCY: int = 4
+
+    # 翻译并发：同时在途的请求数上限，遇到 429 时自动下调
+    TRANSLATION_CONCURRENCY: int = 8
+    TRANSLATION_MIN_CONCURRENCY: int = 1
+    # 限流、超时等临时错误的最大重试次数，等待时间从 BACKOFF 秒起指数增长（带随机抖动），最长 MAX_BACKOFF 秒
+    TRANSLATION_RETRIES: int = 5
+    TRANSLATION_RETRY_BACKOFF: float = 1.0
+    TRANSLATION_RETRY_MAX_BACKOFF: float = 30.0
+    # 单次请求超时（秒），0 表示不限制
+    TRANSLATION_REQUEST_TIMEOUT: float = 120.0
+    # 对冲请求：耗时超过该引擎最近成功延迟的 HEDGE_PERCENTILE 分位（不少于 HEDGE_MIN_DELAY 秒）时再发一份相同请求，
+    # 取先返回的结果；积累 HEDGE_MIN_SAMPLES 个样本后启用，对冲请求不超过请求总数的 HEDGE_MAX_RATIO
+    TRANSLATION_HEDGE_ENABLED: bool = True
+    TRANSLATION_HEDGE_PERCENTILE: float = 95
+    TRANSLATION_HEDGE_MIN_DELAY: float = 1.0
+    TRANSLATION_HEDGE_MIN_SAMPLES: int = 20
+    TRANSLATION_HEDGE_MAX_RATIO: float = 0.1
+    # 翻译断点目录；重试后仍失败的文本块占比不超过该值时任务以 partial 状态完成并保留原文
+    CHECKPOINT_DIR: str = "cache/checkpoints"
+    TRANSLATION_MAX_FAILED_RATIO: float = 0.1
+    # 批量翻译：将相邻的小文本块按 token 预算打包成一次请求
+    TRANSLATION_BATCHING: bool = True
+    TRANSLATION_BATCH_TOKENS: int = 1200
+    TRANSLATION_BATCH_MAX_BLOCKS: int = 30
+    # 超过该 token 数的文本块在句子边界处切分后并发翻译；单次请求的输出 token 上限
+    TRANSLATION_SPLIT_TOKENS: int = 800
+    TRANSLATION_MAX_OUTPUT_TOKENS: int = 4096
+    # 翻译前跳过页码、公式、链接、代码、参考文献及已是目标语言的文本块
+    BLOCK_CLASSIFIER_ENABLED: bool = True
+    # 合并被拆碎的同一段落，合并后的文本块不超过 BLOCK_MERGE_MAX_TOKENS
+    BLOCK_MERGE_ENABLED: bool = True
+    BLOCK_MERGE_MAX_TOKENS: int = 400
+    # 翻译记忆缓存（SQLite），按最近使用淘汰
+    TRANSLATION_CACHE_ENABLED: bool = True
+    TRANSLATION_CACHE_PATH: str = "cache/translation_memory.db"
+    TRANSLATION_CACHE_MAX_ENTRIES: int = 200000
+
+    # PDF 处理进程数，0 表示在单个线程中执行（PyMuPDF 不是线程安全的）
+    PDF_WORKERS: int = 2
+    # 译文字体：嵌入随代码发布的中文字体（PDF_FONT_PATH 为空时），并只嵌入用到的字形；
+    # 关闭嵌入时使用不含字形的内置 CJK 字体，显示效果取决于阅读器
+    PDF_EMBED_FONT: bool = True
+    PDF_SUBSET_FONT: bool = True
+    PDF_FONT_PATH: str = ""
+    # 页数达到阈值、且 PDF_WORKERS 与 CPU 核数都大于 1 时按页分片并行渲染，每片 PDF_SHARD_PAGES 页
+    PDF_SHARD_MIN_PAGES: int = 100
+    PDF_SHARD_PAGES: int = 50
+    # 流水线模式：每 PIPELINE_CHUNK_PAGES 页为一块，最多 PIPELINE_WINDOW 块同时翻译，阶段之间最多缓冲 PIPELINE_WINDOW 块；
+    # 同时翻译的块打包出的批量请求数应不少于 TRANSLATION_CONCURRENCY，否则并发用不满
+    PIPELINE_ENABLED: bool = True
+    PIPELINE_CHUNK_PAGES: int = 8
+    PIPELINE_WINDOW: int = 4
+
+    # 任务存储：sqlite（单机多 worker）或 redis（多机）
+    JOB_STORE: str = "sqlite"
+    JOB_STORE_PATH: str = "cache/jobs.db"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # 翻译进度写入存储的最小间隔（秒）
+    JOB_PROGRESS_FLUSH_INTERVAL: float = 1.0
+    # 任务事件流（SSE）：推送的最小间隔、轮询共享存储发现其他进程更新的间隔与心跳间隔（秒）
+    JOB_EVENTS_MIN_INTERVAL: float = 0.5
+    JOB_EVENTS_POLL_INTERVAL: float = 2.0
+    JOB_EVENTS_HEARTBEAT: float = 15.0
+    # 任务调度：每个进程同时执行的任务数、排队上限与轮询间隔（秒）
+    JOB_CONCURRENCY: int = 2
+    MAX_QUEUED_JOBS: int = 50
+    JOB_POLL_INTERVAL: float = 2.0
+    # 每页推后的排队时间（秒），让小文档优先但大文档不会饿死
+    JOB_PAGE_WEIGHT_SECONDS: float = 2.0
+    # 相同文档（内容、目标语言、模型、提示词版本均相同）直接复用已有结果或正在执行的任务
+    DOCUMENT_DEDUP_ENABLED: bool = True
+    # 执行中任务的租约时长（秒）：worker 每隔三分之一租约时长续期一次，
+    # 租约过期的 processing 任务视为 worker 已退出，重新入队并从断点恢复
+    JOB_LEASE_SECONDS: float = 120.0
+    # 失败或部分完成任务的源文件与断点保留时长（小时），过期后不能再重试
+    FAILED_JOB_RETENTION_HOURS: int = 24
+    JOB_MAINTENANCE_INTERVAL: float = 60.0
+    # API 进程是否同时执行任务；单独部署 python -m app.worker 时设为 false
+    RUN_EMBEDDED_WORKER: bool = True
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+def setup_logging():
+    """API 与 worker 进程入口统一配置日志格式"""
+    logging.basicConfig(
+        level=settings.LOG_LEVEL.upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
\ No newline at end of file
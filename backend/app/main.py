@@ -1,23 +1,79 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from .config import settings
+from .config import settings, setup_logging
+from . import metrics
 from .models import TranslationJob, JobStatus, TranslationRequest
-from .services.pdf import PDFService
+from .services.pdf import PDFService, get_pdf_executor, shutdown_pdf_executor
+from .services.fonts import check_font
+from .services.storage import LocalStorageService, get_storage_service
 from .services.translator import TranslatorService
-from .services.storage import StorageService
+from .services.job_store import get_job_store, job_watchers
+from .pipeline import upload_path, translated_path, finished_shards
+from .scheduler import enqueue_job, start_scheduler, stop_scheduler
+import asyncio
+import json
+import logging
 import os
+import time
 import uuid
+import hashlib
 import aiofiles
-from typing import Dict
 import uvicorn
 
 # 删除代理设置，在 Render 上不需要
 # os.environ["http_proxy"] = "http://127.0.0.1:7890"
 # os.environ["https_proxy"] = "http://127.0.0.1:7890"
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "https://doc-translator.pages.dev,https://api.cloudflare.com").split(",")
+# multipart 表单中文件以外的部分（分隔符、字段头等）允许的额外字节数
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """在解析 multipart 表单之前限制上传请求体的大小
+
+    FastAPI 会先把整个表单读入临时文件再调用接口，因此在这里拦截：声明的 Content-Length 超限时
+    不读取请求体直接返回 413；未声明长度（分块传输）时边接收边计数，超限即中止。
+    """
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        max_body_size = settings.MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_body_size:
+            response = JSONResponse({"detail": "文件过大"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise HTTPException(status_code=413, detail="文件过大")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# 先添加的中间件在内层，CORS 在最外层，使 413 响应同样带有 CORS 头
+app.add_middleware(UploadSizeLimitMiddleware, path=f"{settings.API_PREFIX}/translate")
 
 # CORS 配置
 app.add_middleware(
@@ -32,175 +88,344 @@ app.add_middleware(
 upload_dir = os.path.join(os.path.dirname(__file__), "..", settings.UPLOAD_DIR)
 os.makedirs(upload_dir, exist_ok=True)
 
-# 存储任务状态
-jobs: Dict[str, TranslationJob] = {}
+@app.on_event("startup")
+async def startup():
+    # 字体不可用时尽早报错，而不是在渲染时静默换用其他字体
+    check_font()
+    # 按配置创建任务存储与存储服务，配置有误时启动即失败
+    get_job_store()
+    get_storage_service()
+    # 创建共享的 PDF 进程池
+    get_pdf_executor()
+    # 未单独部署 worker 时在 API 进程内执行任务
+    if settings.RUN_EMBEDDED_WORKER:
+        start_scheduler()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_scheduler()
+    shutdown_pdf_executor()
 
-# 初始化服务
-storage_service = StorageService()
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """分块将上传文件写入磁盘，校验大小与 PDF 文件头，返回内容的 SHA-256
 
-async def process_translation(job_id: str, file_path: str, translated_path: str, target_language: str):
-    """后台任务处理翻译"""
+    请求体的大小已由 UploadSizeLimitMiddleware 在解析表单前限制，这里再精确校验文件本身。
+    """
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="文件过大")
+
+    digest = hashlib.sha256()
+    size = 0
     try:
-        if job_id not in jobs:
-            print(f"Task {job_id} does not exist")
-            return
-            
-        job = jobs[job_id]
-        job.status = JobStatus.PROCESSING
-        print(f"Starting to process task {job_id}")
-        
-        # 提取文本
-        try:
-            print(f"Starting to extract PDF text: {file_path}")
-            text_blocks = await PDFService.extract_text(file_path)
-            print(f"Successfully extracted text, total {len(text_blocks)} text blocks")
-            
-            # 打印前两个文本块示例
-            if text_blocks:
-                print("Text block examples:")
-                for i, (page, block_info) in enumerate(text_blocks[:2]):
-                    print(f"Page {page}: {block_info['text'][:100]}...")
-            
-        except Exception as e:
-            print(f"PDF text extraction failed: {str(e)}")
-            job.status = JobStatus.FAILED
-            job.error = f"PDF text extraction failed: {str(e)}"
-            return
-            
-        # 翻译文本
-        try:
-            print(f"Starting translation to {target_language}")
-            async def update_progress(progress: float):
-                job.progress = progress
-                print(f"Translation progress: {progress:.2f}%")
-            
-            translated_blocks = await TranslatorService.translate_blocks(
-                text_blocks,
-                target_language,
-                update_progress
-            )
-            print("Translation completed")
-            
-        except Exception as e:
-            print(f"Translation failed: {str(e)}")
-            job.status = JobStatus.FAILED
-            job.error = f"Translation failed: {str(e)}"
-            return
-            
-        # 创建新PDF
-        try:
-            print("Starting to generate translated PDF")
-            output_path = f"{settings.UPLOAD_DIR}/translated_{job.file_name}"
-            await PDFService.create_translated_pdf(file_path, translated_blocks, output_path)
-            print(f"PDF generation completed: {output_path}")
-            
-            # 上传到R2存储
-            print("Starting upload to R2 storage")
-            result_url = await storage_service.upload_file(
-                output_path,
-                f"translated/{job_id}/{job.file_name}"
-            )
-            print(f"Upload completed, URL: {result_url}")
-            
-            # 更新任务状态
-            job.status = JobStatus.COMPLETED
-            job.result_url = result_url
-            job.progress = 100
-            print(f"Task {job_id} processing completed, result_url: {result_url}")
-            
-            # 清理临时文件
-            os.remove(file_path)
-            os.remove(output_path)
-            print("Temporary files cleaned up")
-            
-        except Exception as e:
-            print(f"PDF generation or upload failed: {str(e)}")
-            job.status = JobStatus.FAILED
-            job.error = f"PDF generation or upload failed: {str(e)}"
-            try:
-                os.remove(file_path)
-            except:
-                pass
-            
-    except Exception as e:
-        print(f"Task processing failed: {str(e)}")
-        if job_id in jobs:
-            jobs[job_id].status = JobStatus.FAILED
-            jobs[job_id].error = str(e)
-        try:
+        async with aiofiles.open(file_path, 'wb') as out_file:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0 and b"%PDF-" not in chunk[:1024]:
+                    raise HTTPException(status_code=400, detail="只支持PDF文件")
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail="文件过大")
+                digest.update(chunk)
+                await out_file.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="文件为空")
+    except BaseException:
+        if os.path.exists(file_path):
             os.remove(file_path)
-        except:
-            pass
+        raise
+    return digest.hexdigest()
 
 @app.post(f"{settings.API_PREFIX}/translate")
 async def create_translation(
     file: UploadFile = File(...),
-    target_language: str = "zh",
-    background_tasks: BackgroundTasks = None
+    target_language: str = "zh"
 ):
     """创建翻译任务"""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="只支持PDF文件")
     
+    # 队列已满时拒绝新任务，而不是无限堆积
+    if await get_job_store().queue_length() >= settings.MAX_QUEUED_JOBS:
+        raise HTTPException(
+            status_code=503,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "30"}
+        )
+
     # 创建上传目录
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     
     # 生成任务ID
     job_id = str(uuid.uuid4())
-    file_path = f"{settings.UPLOAD_DIR}/{job_id}_{file.filename}"
+    file_name = os.path.basename(file.filename)
+    file_path = upload_path(job_id, file_name)
     
-    # 保存上传的文件
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    # 流式保存上传的文件
+    timings = {}
+    with metrics.stage_timer("upload", timings):
+        file_hash = await save_upload(file, file_path)
+    try:
+        page_count = await PDFService.page_count(file_path)
+    except Exception:
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail="无法解析PDF文件")
     
     # 创建任务
     job = TranslationJob(
         id=job_id,
-        file_name=file.filename,
+        file_name=file_name,
         source_language="auto",
         target_language=target_language,
         status=JobStatus.PENDING,
+        file_hash=file_hash,
+        page_count=page_count,
+        timings=timings,
     )
-    jobs[job_id] = job
+
+    if settings.DOCUMENT_DEDUP_ENABLED:
+        job.document_key = TranslatorService.document_key(file_hash, target_language)
+        # 登记的任务在查询前被删除时重新登记，此时由当前任务接手
+        for _ in range(3):
+            existing = await get_job_store().reserve_document(job.document_key, job)
+            if existing is None:
+                break
+            existing_id, object_key = existing
+            if object_key:
+                # 已有翻译结果：直接返回完成的任务和新的下载链接
+                os.remove(file_path)
+                return await reuse_result(job, object_key)
+            # 相同文档正在翻译：返回该任务，而不是重复翻译
+            response = await attach_to_job(existing_id)
+            if response is not None:
+                os.remove(file_path)
+                return response
+            logger.warning("Job %s registered for the document no longer exists, reserving again", existing_id)
     
-    # 启动后台任务
-    background_tasks.add_task(
-        process_translation,
-        job_id,
-        file_path,
-        f"{settings.UPLOAD_DIR}/translated_{file.filename}",
-        target_language
-    )
+    # 加入任务队列，由调度器按并发上限执行
+    await enqueue_job(job, file_path)
+    job.queue_position = await get_job_store().queue_position(job_id)
     
     return {
         "jobId": job_id,
         "status": job.status,
-        "translatedPdfUrl": job.result_url
+        "translatedPdfUrl": job.result_url,
+        "queuePosition": job.queue_position,
+        "deduplicated": False
+    }
+
+async def reuse_result(job: TranslationJob, object_key: str):
+    """用已有的翻译结果完成任务"""
+    job.status = JobStatus.COMPLETED
+    job.progress = 100
+    job.pages_completed = job.page_count or 0
+    job.result_key = object_key
+    job.result_url = await get_storage_service().presign_url(object_key)
+    await get_job_store().save(job)
+    logger.info("Reused translation %s for job %s", object_key, job.id)
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "translatedPdfUrl": job.result_url,
+        "queuePosition": None,
+        "deduplicated": True
+    }
+
+async def attach_to_job(job_id: str):
+    """返回正在处理相同文档的任务；任务已不存在时返回 None"""
+    job = await get_job_store().get(job_id)
+    if job is None:
+        return None
+    queue_position = None
+    if job.status == JobStatus.PENDING:
+        queue_position = await get_job_store().queue_position(job_id)
+    logger.info("Attached upload to in-flight job %s", job_id)
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "translatedPdfUrl": job.result_url,
+        "queuePosition": queue_position,
+        "deduplicated": True
     }
 
 @app.get(f"{settings.API_PREFIX}/jobs/{{job_id}}")
-async def get_job_status(job_id: str):
-    """获取任务状态"""
-    if job_id not in jobs:
+async def get_job_status(job_id: str, timings: bool = False):
+    """获取任务状态；timings=true 时附带各阶段耗时"""
+    job = await get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job.status == JobStatus.PENDING:
+        job.queue_position = await get_job_store().queue_position(job_id)
+    if timings:
+        return job
+    return job.model_dump(exclude={"timings"})
+
+# 事件流只推送跟踪进度所需的字段
+EVENT_FIELDS = {
+    "id", "status", "stage", "progress", "error", "result_url",
+    "page_count", "pages_completed", "failed_blocks", "queue_position"
+}
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.PARTIAL, JobStatus.FAILED)
+
+async def job_events(job_id: str):
+    """生成任务状态的 SSE 事件：有变化时推送，最多每 JOB_EVENTS_MIN_INTERVAL 秒一次，任务结束后关闭
+
+    本进程内保存任务时立即唤醒；其他 worker 的更新通过每 JOB_EVENTS_POLL_INTERVAL 秒读取共享存储发现。
+    """
+    metrics.EVENT_STREAMS.inc()
+    last_payload = None
+    last_sent = time.monotonic()
+    try:
+        with job_watchers.watch(job_id) as changed:
+            yield f"retry: {int(settings.JOB_EVENTS_POLL_INTERVAL * 1000)}\n\n"
+            while True:
+                changed.clear()
+                job = await get_job_store().get(job_id)
+                if job is None:
+                    yield f"event: error\ndata: {json.dumps({'detail': '任务不存在'}, ensure_ascii=False)}\n\n"
+                    return
+                if job.status == JobStatus.PENDING:
+                    job.queue_position = await get_job_store().queue_position(job_id)
+                payload = job.model_dump_json(include=EVENT_FIELDS)
+                if payload != last_payload:
+                    yield f"event: status\ndata: {payload}\n\n"
+                    last_payload = payload
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= settings.JOB_EVENTS_HEARTBEAT:
+                    # 注释行作为心跳，避免代理关闭空闲连接
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                if job.status in FINISHED_STATUSES:
+                    return
+                # 合并高频更新：两次推送之间至少间隔 JOB_EVENTS_MIN_INTERVAL 秒
+                await asyncio.sleep(settings.JOB_EVENTS_MIN_INTERVAL)
+                try:
+                    await asyncio.wait_for(changed.wait(), settings.JOB_EVENTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        metrics.EVENT_STREAMS.dec()
+
+@app.get(f"{settings.API_PREFIX}/jobs/{{job_id}}/events")
+async def stream_job_events(job_id: str):
+    """以 Server-Sent Events 推送任务进度、阶段变化和完成事件，替代轮询任务状态"""
+    if await get_job_store().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(
+        job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post(f"{settings.API_PREFIX}/jobs/{{job_id}}/retry")
+async def retry_job(job_id: str):
+    """重新执行失败或部分完成的任务，已翻译的文本块从断点恢复"""
+    job = await get_job_store().get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="任务不存在")
-    return jobs[job_id]
+    if job.status not in (JobStatus.FAILED, JobStatus.PARTIAL):
+        raise HTTPException(status_code=400, detail="只能重试失败或部分完成的任务")
+
+    file_path = upload_path(job_id, job.file_name)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="源文件已过期，请重新上传")
+    if await get_job_store().queue_length() >= settings.MAX_QUEUED_JOBS:
+        raise HTTPException(
+            status_code=503,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "30"}
+        )
+
+    job.status = JobStatus.PENDING
+    job.error = None
+    job.progress = 0
+    job.pages_completed = 0
+    await enqueue_job(job, file_path)
+    job.queue_position = await get_job_store().queue_position(job_id)
+    logger.info("Retrying job %s", job_id)
+
+    return {
+        "jobId": job_id,
+        "status": job.status,
+        "translatedPdfUrl": job.result_url,
+        "queuePosition": job.queue_position
+    }
 
 @app.get(f"{settings.API_PREFIX}/jobs/{{job_id}}/download")
 async def download_result(job_id: str):
     """下载翻译结果"""
-    if job_id not in jobs:
+    job = await get_job_store().get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    job = jobs[job_id]
-    if job.status != JobStatus.COMPLETED:
+    if job.status not in (JobStatus.COMPLETED, JobStatus.PARTIAL):
         raise HTTPException(status_code=400, detail="翻译尚未完成")
     
     if not job.result_url:
         raise HTTPException(status_code=400, detail="翻译结果不可用")
     
+    # 创建任务时生成的链接可能已过期，有对象键时重新生成
+    if job.result_key:
+        return {"url": await get_storage_service().presign_url(job.result_key)}
     return {"url": job.result_url}
 
+@app.get(f"{settings.API_PREFIX}/jobs/{{job_id}}/partial")
+async def download_partial(job_id: str):
+    """下载已经翻译并渲染完成的前若干页"""
+    job = await get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job.status != JobStatus.PROCESSING:
+        raise HTTPException(status_code=400, detail="任务未在处理中")
+
+    shard_paths = finished_shards(translated_path(job_id, job.file_name))
+    if not shard_paths:
+        raise HTTPException(status_code=400, detail="暂无已完成的页面")
+
+    partial_path = f"{settings.UPLOAD_DIR}/partial_{uuid.uuid4()}_{job.file_name}"
+    try:
+        await PDFService.stitch_shards(
+            upload_path(job_id, job.file_name),
+            shard_paths,
+            partial_path,
+            copy_outline=False
+        )
+    except Exception:
+        # 任务可能恰好完成并清理了分片
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise HTTPException(status_code=409, detail="部分结果暂不可用，请重试")
+
+    return FileResponse(
+        partial_path,
+        media_type="application/pdf",
+        filename=f"partial_{job.file_name}",
+        background=BackgroundTask(os.remove, partial_path)
+    )
+
+@app.get(f"{settings.API_PREFIX}/files/{{object_name:path}}")
+async def download_file(object_name: str):
+    """下载本地存储中的翻译结果（仅 STORAGE_BACKEND=local 时可用）"""
+    if not isinstance(get_storage_service(), LocalStorageService):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    try:
+        file_path = get_storage_service().local_path(object_name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return FileResponse(file_path, media_type="application/pdf", filename=os.path.basename(file_path))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 格式的运行指标"""
+    try:
+        metrics.QUEUE_DEPTH.set(await get_job_store().queue_length())
+    except Exception as e:
+        logger.warning("Failed to read queue length: %s", e)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,200 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 进程内的指标注册表，按 Prometheus 文本格式输出；
+# 每个进程单独统计，多进程部署时由 Prometheus 分别抓取后聚合
+REGISTRY: List["Metric"] = []
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, value in list(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 每组标签：各桶计数（非累计）、总和、总数
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * len(self.buckets), [0.0, 0.0])
+        counts, totals = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        totals[0] += value
+        totals[1] += 1
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, (counts, totals) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, totals[0]
+            yield f"{self.name}_count", labels, totals[1]
+
+
+def render() -> str:
+    """按 Prometheus 文本格式输出所有指标"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "doc_translator_stage_seconds",
+    "Time spent in each processing stage",
+    ["stage"]
+)
+JOB_SECONDS = Histogram(
+    "doc_translator_job_seconds",
+    "End-to-end processing time of translation jobs",
+    ["status"]
+)
+JOBS_TOTAL = Counter("doc_translator_jobs_total", "Finished translation jobs", ["status"])
+JOBS_IN_FLIGHT = Gauge("doc_translator_jobs_in_flight", "Translation jobs being processed by this process")
+QUEUE_DEPTH = Gauge("doc_translator_queue_depth", "Jobs waiting in the shared queue")
+EVENT_STREAMS = Gauge("doc_translator_event_streams", "Open job event streams")
+LLM_REQUEST_SECONDS = Histogram(
+    "doc_translator_llm_request_seconds",
+    "Latency of LLM requests",
+    ["engine", "kind", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+LLM_LATENCY_QUANTILE = Gauge(
+    "doc_translator_llm_latency_quantile_seconds",
+    "Latency quantiles of recent successful LLM requests per engine and input size bucket",
+    ["engine", "kind", "size", "quantile"]
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "doc_translator_llm_hedged_requests_total",
+    "Duplicate LLM requests sent after the original exceeded the latency percentile, by which one succeeded first",
+    ["engine", "winner"]
+)
+LLM_FALLBACKS = Counter(
+    "doc_translator_llm_fallbacks_total",
+    "LLM requests retried on the fallback engine after the primary engine failed",
+    ["engine", "reason"]
+)
+LLM_REQUESTS_IN_FLIGHT = Gauge("doc_translator_llm_requests_in_flight", "LLM requests awaiting a response")
+LLM_TOKENS = Counter("doc_translator_llm_tokens_total", "Tokens reported by the LLM API", ["type"])
+LLM_RETRIES = Counter("doc_translator_llm_retries_total", "Retried LLM requests", ["reason"])
+FAILED_BLOCKS = Counter(
+    "doc_translator_failed_blocks_total",
+    "Text blocks left untranslated after exhausting retries"
+)
+BATCH_FALLBACKS = Counter(
+    "doc_translator_batch_fallbacks_total",
+    "Batches retried block by block after a mismatched response"
+)
+TRANSLATED_BLOCKS = Counter("doc_translator_translated_blocks_total", "Text blocks translated")
+SPLIT_BLOCKS = Counter(
+    "doc_translator_split_blocks_total",
+    "Oversized text blocks split at sentence boundaries and translated in pieces"
+)
+SKIPPED_BLOCKS = Counter(
+    "doc_translator_skipped_blocks_total",
+    "Text blocks passed through without an LLM request",
+    ["reason"]
+)
+MERGED_BLOCKS = Counter(
+    "doc_translator_merged_blocks_total",
+    "Fragmented text blocks merged into the preceding block of the same paragraph"
+)
+CACHE_LOOKUPS = Counter(
+    "doc_translator_translation_cache_total",
+    "Translation cache lookups by result",
+    ["result"]
+)
+
+
+@contextmanager
+def stage_timer(stage: str, timings: Optional[Dict[str, float]] = None):
+    """记录一个阶段的耗时；传入 timings 时同时累加到任务的阶段耗时中"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed, 3)
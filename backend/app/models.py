@@ -1,25 +1,51 @@
 from enum import Enum
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
 
 class JobStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
+    # 已生成结果，但部分文本块重试后仍翻译失败而保留原文，可通过重试接口补全
+    PARTIAL = "partial"
     FAILED = "failed"
 
+class JobStage(str, Enum):
+    # 任务当前所处的阶段；流水线模式下提取、翻译与渲染交替进行，统一记为 translating
+    QUEUED = "queued"
+    EXTRACTING = "extracting"
+    TRANSLATING = "translating"
+    RENDERING = "rendering"
+    UPLOADING = "uploading"
+
 class TranslationJob(BaseModel):
     id: str
     file_name: str
     source_language: str
     target_language: str
     status: JobStatus
+    # 排队或执行中的阶段，任务结束后为 None
+    stage: Optional[JobStage] = None
     progress: float = 0
     error: Optional[str] = None
     result_url: Optional[str] = None
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    # 结果在存储中的对象键，用于重新生成下载链接
+    result_key: Optional[str] = None
+    file_hash: Optional[str] = None
+    # 文档去重键，见 TranslatorService.document_key
+    document_key: Optional[str] = None
+    page_count: Optional[int] = None
+    # 已渲染完成、可提前下载的页数
+    pages_completed: int = 0
+    # 保留原文的文本块数
+    failed_blocks: int = 0
+    # 排队中的位置（从 1 开始），仅在查询时计算
+    queue_position: Optional[int] = None
+    # 各阶段累计耗时（秒）；流水线模式下各阶段并行，总和可能大于总耗时
+    timings: Dict[str, float] = Field(default_factory=dict)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
 
 class TranslationRequest(BaseModel):
     target_language: str
\ No newline at end of file
@@ -0,0 +1,379 @@
+from .config import settings
+from . import metrics
+from .metrics import stage_timer
+from .models import JobStage, JobStatus, TranslationJob
+from .services.pdf import PDFService
+from .services.translator import AdaptiveLimiter, TranslatorService
+from .services.classifier import BlockClassifier
+from .services.storage import get_storage_service
+from .services.job_store import get_job_store, ProgressWriter
+from .services.layout import flatten_blocks, with_translations
+from .services.checkpoint import TranslationCheckpoint, checkpoint_path, remove_checkpoint
+from datetime import datetime
+from typing import Dict, List
+import asyncio
+import glob
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+def upload_path(job_id: str, file_name: str) -> str:
+    return f"{settings.UPLOAD_DIR}/{job_id}_{file_name}"
+
+def translated_path(job_id: str, file_name: str) -> str:
+    return f"{settings.UPLOAD_DIR}/translated_{job_id}_{file_name}"
+
+def finished_shards(output_path: str) -> List[str]:
+    """返回从第一片开始连续渲染完成的分片路径"""
+    shard_paths = []
+    while os.path.exists(f"{output_path}.part{len(shard_paths)}"):
+        shard_paths.append(f"{output_path}.part{len(shard_paths)}")
+    return shard_paths
+
+def remove_shards(output_path: str):
+    for shard_path in glob.glob(f"{glob.escape(output_path)}.part*"):
+        try:
+            os.remove(shard_path)
+        except OSError:
+            pass
+
+def check_failed_blocks(job: TranslationJob, checkpoint: TranslationCheckpoint, total_blocks: int):
+    """记录保留原文的文本块数，失败比例超过 TRANSLATION_MAX_FAILED_RATIO 时整个任务失败"""
+    job.failed_blocks = checkpoint.failed_blocks
+    if job.failed_blocks and job.failed_blocks > total_blocks * settings.TRANSLATION_MAX_FAILED_RATIO:
+        raise Exception(
+            f"{job.failed_blocks} of {total_blocks} text blocks could not be translated, "
+            f"first error: {checkpoint.first_error}"
+        )
+
+def limit_failed_blocks(checkpoint: TranslationCheckpoint, expected_blocks: float):
+    """按预计的文本块总数设置允许失败的块数，翻译过程中一旦超过即结束任务，不必等到全部翻译完"""
+    checkpoint.max_failed_blocks = int(expected_blocks * settings.TRANSLATION_MAX_FAILED_RATIO)
+
+async def set_stage(job: TranslationJob, stage: JobStage, progress_writer: ProgressWriter):
+    """切换任务阶段并立即保存，推送给客户端的阶段变化不受进度写入间隔限制"""
+    job.stage = stage
+    await progress_writer.changed(force=True)
+
+async def run_pipeline(
+    job: TranslationJob,
+    file_path: str,
+    output_path: str,
+    progress_writer: ProgressWriter,
+    checkpoint: TranslationCheckpoint
+) -> int:
+    """按页分块流水线处理：前面的块渲染的同时翻译后面的块，返回文本块总数
+
+    最多 PIPELINE_WINDOW 块同时翻译，共用同一个并发限制器，整体请求并发与非流水线模式相同；
+    阶段之间通过有界队列连接，内存占用取决于 PIPELINE_WINDOW 而不是文档大小；
+    每块渲染完成后立即写出分片文件，已完成的页可以提前下载。
+    """
+    page_count = job.page_count or await PDFService.page_count(file_path)
+    chunk_pages = max(1, settings.PIPELINE_CHUNK_PAGES)
+    ranges = [
+        (start, min(start + chunk_pages, page_count))
+        for start in range(0, page_count, chunk_pages)
+    ]
+    window = max(1, settings.PIPELINE_WINDOW)
+    extracted: asyncio.Queue = asyncio.Queue(maxsize=window)
+    # 翻译中的块按页序排队等待渲染，最多 PIPELINE_WINDOW 块同时翻译
+    translating = asyncio.Semaphore(window)
+    translated: asyncio.Queue = asyncio.Queue(maxsize=window)
+    chunk_tasks: List[asyncio.Task] = []
+    # 整个任务共用一个并发限制器：各块的请求一起受 TRANSLATION_CONCURRENCY 限制，限流后的下调不会在下一块丢失
+    limiter = AdaptiveLimiter(settings.TRANSLATION_CONCURRENCY, settings.TRANSLATION_MIN_CONCURRENCY)
+    # 任一块翻译失败时记录第一个异常，渲染阶段立即结束，不必等排在前面的块翻译完
+    failure = asyncio.get_running_loop().create_future()
+    chunk_progress: Dict[int, float] = {}
+    shard_paths: List[str] = []
+    # 各分片写入的字符，合并时据此生成字体子集，不必重新解析输出
+    shard_chars: List[str] = []
+    total_blocks = 0
+
+    async def extract_stage():
+        for start, end in ranges:
+            with stage_timer("extract", job.timings):
+                layouts = await PDFService.extract_layout(file_path, start, end)
+            await extracted.put((start, end, layouts))
+        await extracted.put(None)
+
+    async def translate_chunk(start: int, end: int, layouts) -> tuple:
+        nonlocal total_blocks
+        try:
+            layouts = BlockClassifier.prepare_layouts(layouts, job.target_language)
+            text_blocks = flatten_blocks(layouts)
+            total_blocks += len(text_blocks)
+            # 按已提取页面的平均块数估算整份文档的块数
+            limit_failed_blocks(checkpoint, total_blocks * page_count / end)
+
+            # 多块同时翻译，整份文档的进度为各块已完成页数之和
+            async def update_progress(progress: float):
+                chunk_progress[start] = (end - start) * progress / 100
+                await progress_writer.update(sum(chunk_progress.values()) / page_count * 100)
+
+            translated_blocks = []
+            if text_blocks:
+                with stage_timer("translate", job.timings):
+                    translated_blocks = await TranslatorService.translate_blocks(
+                        text_blocks,
+                        job.target_language,
+                        update_progress,
+                        checkpoint=checkpoint,
+                        limiter=limiter
+                    )
+            else:
+                await update_progress(100)
+            return start, end, with_translations(layouts, translated_blocks)
+        except Exception as e:
+            if not failure.done():
+                failure.set_exception(e)
+            raise
+        finally:
+            translating.release()
+
+    async def translate_stage():
+        while True:
+            item = await extracted.get()
+            if item is None:
+                break
+            await translating.acquire()
+            task = asyncio.create_task(translate_chunk(*item))
+            chunk_tasks.append(task)
+            await translated.put(task)
+        await translated.put(None)
+
+    async def render_stage():
+        while True:
+            task = await translated.get()
+            if task is None:
+                break
+            await asyncio.wait([task, failure], return_when=asyncio.FIRST_COMPLETED)
+            if failure.done():
+                failure.result()
+            start, end, layouts = task.result()
+            shard_path = f"{output_path}.part{len(shard_paths)}"
+            with stage_timer("render", job.timings):
+                shard_chars.append(await PDFService.render_shard(file_path, start, end, layouts, shard_path))
+            shard_paths.append(shard_path)
+            job.pages_completed = end
+            await progress_writer.changed()
+            logger.debug("Job %s rendered pages %d-%d of %d", job.id, start + 1, end, page_count)
+
+    stages = [
+        asyncio.create_task(extract_stage()),
+        asyncio.create_task(translate_stage()),
+        asyncio.create_task(render_stage()),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        for task in stages + chunk_tasks:
+            task.cancel()
+        await asyncio.gather(*stages, *chunk_tasks, return_exceptions=True)
+        if failure.done():
+            # 异常已由失败的块抛出，这里只是标记为已读取
+            failure.exception()
+        raise
+
+    await progress_writer.flush()
+    check_failed_blocks(job, checkpoint, total_blocks)
+    await set_stage(job, JobStage.RENDERING, progress_writer)
+    with stage_timer("render", job.timings):
+        await PDFService.stitch_shards(file_path, shard_paths, output_path, "".join(shard_chars))
+    remove_shards(output_path)
+    return total_blocks
+
+async def fail_job(job: TranslationJob, error: str, lease: str):
+    """标记任务失败；保留源文件和翻译断点，重试时只翻译缺失的文本块
+
+    任务已结束或已被其他 worker 接管时不覆盖其状态。
+    """
+    job.status = JobStatus.FAILED
+    job.stage = None
+    job.error = error
+    if not await get_job_store().save(job, lease):
+        logger.warning("Task %s is no longer owned by this worker, not marking it failed", job.id)
+
+async def keep_lease(job_id: str, lease: str, task: asyncio.Task):
+    """定期续期任务租约；租约已被其他 worker 接管时取消本次执行"""
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await get_job_store().renew_lease(job_id, lease, settings.JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.warning("Failed to renew lease of task %s: %s", job_id, e)
+            continue
+        if not renewed:
+            logger.warning("Task %s was taken over by another worker, stopping", job_id)
+            task.cancel()
+            return
+
+async def process_translation(job_id: str, file_path: str):
+    """处理单个翻译任务：提取、翻译、生成 PDF 并上传"""
+    job = None
+    checkpoint = None
+    heartbeat = None
+    lease = uuid.uuid4().hex
+    started = time.perf_counter()
+    metrics.JOBS_IN_FLIGHT.inc()
+    try:
+        job = await get_job_store().get(job_id)
+        if job is None:
+            logger.warning("Task %s does not exist", job_id)
+            return
+            
+        target_language = job.target_language
+        job.status = JobStatus.PROCESSING
+        job.stage = JobStage.TRANSLATING if settings.PIPELINE_ENABLED else JobStage.EXTRACTING
+        job.error = None
+        job.failed_blocks = 0
+        job.timings["queue"] = round((datetime.now() - job.created_at).total_seconds(), 3)
+        # 登记租约与 processing 状态在同一事务中完成，重复入队的任务只会执行一次
+        if not await get_job_store().acquire_lease(job, lease, settings.JOB_LEASE_SECONDS):
+            logger.warning("Task %s is no longer pending, skipping", job_id)
+            job = None
+            return
+        heartbeat = asyncio.create_task(keep_lease(job_id, lease, asyncio.current_task()))
+        logger.info("Starting to process task %s (%s pages)", job_id, job.page_count)
+        
+        output_path = translated_path(job_id, job.file_name)
+        # 进度写入按时间间隔合并，避免每个文本块都写一次存储
+        progress_writer = get_job_store().progress_writer(job, lease)
+        # 已翻译的文本块逐条写入断点，任务重启或重试时只翻译缺失的部分
+        checkpoint = TranslationCheckpoint(checkpoint_path(job_id))
+
+        if settings.PIPELINE_ENABLED:
+            try:
+                logger.info("Starting pipelined translation of %s to %s", job_id, target_language)
+                await run_pipeline(job, file_path, output_path, progress_writer, checkpoint)
+                logger.info("PDF generation completed: %s", output_path)
+            except Exception as e:
+                logger.error("Translation pipeline failed for %s: %s", job_id, e)
+                remove_shards(output_path)
+                await fail_job(job, f"Translation pipeline failed: {str(e)}", lease)
+                return
+        else:
+            # 提取文本
+            try:
+                logger.info("Starting to extract PDF text: %s", file_path)
+                with stage_timer("extract", job.timings):
+                    layouts = await PDFService.extract_layout(file_path)
+                layouts = BlockClassifier.prepare_layouts(layouts, target_language)
+                text_blocks = flatten_blocks(layouts)
+                logger.info("Extracted %d text blocks from %s", len(text_blocks), job_id)
+            
+            except Exception as e:
+                logger.error("PDF text extraction failed for %s: %s", job_id, e)
+                await fail_job(job, f"PDF text extraction failed: {str(e)}", lease)
+                return
+            
+            # 翻译文本
+            try:
+                logger.info("Starting translation of %s to %s", job_id, target_language)
+                await set_stage(job, JobStage.TRANSLATING, progress_writer)
+                limit_failed_blocks(checkpoint, len(text_blocks))
+                async def update_progress(progress: float):
+                    await progress_writer.update(progress)
+                    logger.debug("Job %s translation progress: %.2f%%", job_id, progress)
+            
+                with stage_timer("translate", job.timings):
+                    translated_blocks = await TranslatorService.translate_blocks(
+                        text_blocks,
+                        target_language,
+                        update_progress,
+                        checkpoint=checkpoint
+                    )
+                await progress_writer.flush()
+                check_failed_blocks(job, checkpoint, len(text_blocks))
+                logger.info("Translation of %s completed", job_id)
+            
+            except Exception as e:
+                logger.error("Translation failed for %s: %s", job_id, e)
+                await fail_job(job, f"Translation failed: {str(e)}", lease)
+                return
+            
+            # 创建新PDF
+            try:
+                logger.info("Starting to generate translated PDF for %s", job_id)
+                await set_stage(job, JobStage.RENDERING, progress_writer)
+                with stage_timer("render", job.timings):
+                    await PDFService.create_translated_pdf(
+                        file_path,
+                        with_translations(layouts, translated_blocks),
+                        output_path
+                    )
+                logger.info("PDF generation completed: %s", output_path)
+            except Exception as e:
+                logger.error("PDF generation failed for %s: %s", job_id, e)
+                await fail_job(job, f"PDF generation failed: {str(e)}", lease)
+                return
+
+        try:
+            # 上传到结果存储
+            object_key = f"translated/{job_id}/{job.file_name}"
+            await set_stage(job, JobStage.UPLOADING, progress_writer)
+            with stage_timer("store", job.timings):
+                result_url = await get_storage_service().upload_file(output_path, object_key)
+            logger.info("Uploaded %s to %s storage", object_key, settings.STORAGE_BACKEND)
+            # 先登记结果再标记完成，之后上传的相同文档会直接复用；
+            # 部分翻译或用到备用引擎的结果不复用（去重键中的模型是主引擎的）
+            if job.document_key and not job.failed_blocks and not checkpoint.fallback_blocks:
+                await get_job_store().complete_document(job.document_key, job_id, object_key)
+            elif checkpoint.fallback_blocks:
+                logger.info(
+                    "Task %s used the fallback engine for %d blocks, not reusing its result",
+                    job_id, checkpoint.fallback_blocks
+                )
+            
+            # 更新任务状态
+            if job.failed_blocks:
+                job.status = JobStatus.PARTIAL
+                job.error = f"{job.failed_blocks} text blocks were left untranslated: {checkpoint.first_error}"
+            else:
+                job.status = JobStatus.COMPLETED
+            job.stage = None
+            job.result_url = result_url
+            job.result_key = object_key
+            job.progress = 100
+            job.timings["total"] = round(time.perf_counter() - started, 3)
+            if not await get_job_store().save(job, lease):
+                # 其他 worker 已接管该任务，源文件与断点留给它使用
+                logger.warning("Task %s was taken over by another worker, discarding this result", job_id)
+                return
+            logger.info("Task %s %s in %.1fs, timings %s", job_id, job.status.value, job.timings["total"], job.timings)
+            
+            # 清理临时文件；部分完成的任务保留源文件和断点以便重试
+            os.remove(output_path)
+            if job.status == JobStatus.COMPLETED:
+                checkpoint.close()
+                remove_checkpoint(job_id)
+                os.remove(file_path)
+            
+        except Exception as e:
+            logger.error("Upload failed for %s: %s", job_id, e)
+            await fail_job(job, f"Upload failed: {str(e)}", lease)
+            
+    except Exception as e:
+        logger.exception("Task %s processing failed", job_id)
+        if job is not None:
+            try:
+                await fail_job(job, str(e), lease)
+            except Exception:
+                pass
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+            try:
+                await get_job_store().release_lease(job_id, lease)
+            except Exception as e:
+                logger.warning("Failed to release lease of task %s: %s", job_id, e)
+        if checkpoint is not None:
+            checkpoint.close()
+        metrics.JOBS_IN_FLIGHT.dec()
+        if job is not None:
+            status = job.status.value
+            metrics.JOBS_TOTAL.inc(status=status)
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started, status=status)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional, Set
+from .config import settings
+from .models import JobStage, JobStatus, TranslationJob
+from .pipeline import process_translation, upload_path
+from .services.checkpoint import remove_checkpoint
+from .services.job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+
+def job_priority(page_count: int) -> float:
+    """计算排队优先级（越小越先执行）
+
+    以入队时间为基准，每页额外推后 JOB_PAGE_WEIGHT_SECONDS 秒：小文档可以插到
+    大文档前面，而大文档等待足够久后也会被执行，不会被持续饿死。
+    """
+    return time.time() + page_count * settings.JOB_PAGE_WEIGHT_SECONDS
+
+
+async def enqueue_job(job: TranslationJob, file_path: str):
+    """将任务写入共享队列，并唤醒本进程内的调度器"""
+    job.stage = JobStage.QUEUED
+    await get_job_store().enqueue(job, file_path, job_priority(job.page_count or 0))
+    if scheduler is not None:
+        scheduler.notify()
+
+
+async def recover_stale_jobs():
+    """将租约已过期的 processing 任务重新入队：执行它的 worker 已停止续期，
+    重新执行时已翻译的文本块从断点恢复"""
+    for job in await get_job_store().list_by_status(JobStatus.PROCESSING):
+        file_path = upload_path(job.id, job.file_name)
+        if not os.path.exists(file_path):
+            continue
+        job.stage = JobStage.QUEUED
+        if not await get_job_store().requeue_expired(job, file_path, job_priority(job.page_count or 0)):
+            continue
+        logger.warning("Lease of job %s expired, requeueing", job.id)
+        if scheduler is not None:
+            scheduler.notify()
+
+
+async def remove_expired_uploads():
+    """删除已结束且超过保留时间的任务的源文件和断点"""
+    cutoff = time.time() - settings.FAILED_JOB_RETENTION_HOURS * 3600
+    try:
+        names = os.listdir(settings.UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        # 源文件命名为 {job_id}_{file_name}，job_id 为 36 位 UUID
+        if name.startswith(("translated_", "partial_")) or name[36:37] != "_":
+            continue
+        path = os.path.join(settings.UPLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        job_id = name[:36]
+        job = await get_job_store().get(job_id)
+        if job is not None and job.status in (JobStatus.PENDING, JobStatus.PROCESSING):
+            continue
+        logger.info("Removing expired upload %s", name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        remove_checkpoint(job_id)
+
+
+class JobScheduler:
+    """从共享队列领取任务并以固定并发数执行"""
+
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._loop_task = None
+        self._maintenance_task = None
+
+    @property
+    def running_jobs(self) -> int:
+        return len(self._tasks)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+            self._maintenance_task = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        """停止领取新任务并等待正在执行的任务结束"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._maintenance_task.cancel()
+            await asyncio.gather(self._loop_task, self._maintenance_task, return_exceptions=True)
+            self._loop_task = None
+            self._maintenance_task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            if len(self._tasks) >= self.concurrency:
+                await self._wait()
+                continue
+            try:
+                claimed = await get_job_store().claim()
+            except Exception as e:
+                logger.error("Failed to claim job: %s", e)
+                claimed = None
+            if claimed is None:
+                await self._wait()
+                continue
+
+            job, file_path = claimed
+            logger.info(
+                "Claimed job %s (%s pages), running %d/%d",
+                job.id, job.page_count, len(self._tasks) + 1, self.concurrency
+            )
+            task = asyncio.create_task(process_translation(job.id, file_path))
+            self._tasks.add(task)
+            task.add_done_callback(self._on_done)
+
+    async def _maintain(self):
+        """定期恢复中断的任务并清理过期文件"""
+        while True:
+            try:
+                await recover_stale_jobs()
+                await remove_expired_uploads()
+            except Exception as e:
+                logger.error("Job maintenance failed: %s", e)
+            await asyncio.sleep(settings.JOB_MAINTENANCE_INTERVAL)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self.notify()
+
+    async def _wait(self):
+        """等待任务完成、新任务入队或轮询间隔到期（其他进程入队的任务只能靠轮询发现）"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+# 当前进程内运行的调度器（API 进程未内嵌 worker 时为 None）
+scheduler: Optional[JobScheduler] = None
+
+
+def start_scheduler() -> JobScheduler:
+    global scheduler
+    if scheduler is None:
+        scheduler = JobScheduler(settings.JOB_CONCURRENCY, settings.JOB_POLL_INTERVAL)
+        scheduler.start()
+    return scheduler
+
+
+async def stop_scheduler():
+    global scheduler
+    if scheduler is not None:
+        await scheduler.stop()
+        scheduler = None
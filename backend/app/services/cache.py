@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from ..config import settings
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """基于 SQLite 的翻译记忆：按规范化原文、目标语言、模型与提示词版本的哈希缓存译文
+
+    数据库读写都在线程中执行，不阻塞事件循环；查询按批进行，新译文先暂存在内存中由后台任务批量写入。
+    """
+
+    # 每写入多少条检查一次容量，避免每次写入都执行 COUNT
+    EVICT_CHECK_INTERVAL = 100
+    # 单条 SQL 中 IN 列表的最大参数数
+    QUERY_CHUNK = 500
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 尚未写入数据库的译文及负责写入的后台任务
+        self._pending: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """合并空白字符，使仅排版不同的文本命中同一条缓存"""
+        return " ".join(text.split())
+
+    @staticmethod
+    def make_key(text: str, target_language: str, model: str, prompt_version: str) -> str:
+        raw = "\x1f".join([TranslationCache.normalize(text), target_language, model, prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get_many_sync(self, keys: List[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(keys), self.QUERY_CHUNK):
+                chunk = keys[start:start + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, value FROM translations WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """批量读取缓存并刷新最近使用时间，返回命中的译文"""
+        found = {key: self._pending[key] for key in keys if key in self._pending}
+        rest = [key for key in keys if key not in found]
+        if rest:
+            found.update(await asyncio.to_thread(self._get_many_sync, rest))
+        hits = len(found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        if hits:
+            metrics.CACHE_LOOKUPS.inc(hits, result="hit")
+        if len(keys) > hits:
+            metrics.CACHE_LOOKUPS.inc(len(keys) - hits, result="miss")
+        return found
+
+    async def get(self, key: str) -> Optional[str]:
+        """读取缓存并刷新最近使用时间"""
+        return (await self.get_many([key])).get(key)
+
+    def _put_many_sync(self, items: List[Tuple[str, str]]):
+        with self._lock:
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, value, last_used) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items]
+            )
+            self._conn.commit()
+            before = self._writes
+            self._writes += len(items)
+            if self._writes // self.EVICT_CHECK_INTERVAL != before // self.EVICT_CHECK_INTERVAL:
+                self._evict()
+
+    def put(self, key: str, value: str):
+        """暂存译文，由后台任务批量写入数据库"""
+        self._pending[key] = value
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        # 写入期间新暂存的译文在下一轮写入
+        while self._pending:
+            items = list(self._pending.items())
+            try:
+                await asyncio.to_thread(self._put_many_sync, items)
+            except Exception as e:
+                # 翻译缓存只是加速手段，写入失败不影响翻译结果
+                logger.warning("Failed to write %d translations to the cache: %s", len(items), e)
+            for key, value in items:
+                if self._pending.get(key) == value:
+                    del self._pending[key]
+
+    async def flush(self):
+        """等待暂存的译文全部写入数据库"""
+        while self._pending:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+            await asyncio.shield(self._flush_task)
+
+    def _evict(self):
+        """超出容量时按最近使用时间淘汰最旧的条目"""
+        count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                "SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+            self._conn.commit()
+
+    def begin(self, key: str) -> Optional[asyncio.Future]:
+        """若相同内容已在翻译中返回其 Future，否则登记为在途并返回 None"""
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            self.deduplicated += 1
+            metrics.CACHE_LOOKUPS.inc(result="deduplicated")
+            return future
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def finish(
+        self,
+        key: str,
+        value: Optional[str] = None,
+        error: Optional[BaseException] = None,
+        store: bool = True
+    ):
+        """结束在途登记：成功时写入缓存并唤醒等待者，失败时将异常传递给等待者
+
+        store 为 False 时（例如备用引擎的译文）只唤醒等待者而不写入缓存；
+        等待者得到 (译文, 是否已写入缓存)。
+        """
+        future = self._inflight.pop(key, None)
+        if error is None and value is not None and store:
+            self.put(key, value)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result((value, store))
+        else:
+            future.set_exception(error)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+
+    async def get_or_translate(self, key: str, translate: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        """缓存命中直接返回；相同内容正在翻译时等待其结果；否则调用 translate 并写入缓存
+
+        translate 返回 (译文, 是否可以写入缓存)。
+        """
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+        future = self.begin(key)
+        if future is not None:
+            value, _ = await asyncio.shield(future)
+            return value
+        try:
+            value, store = await translate()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, value, store=store)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "inflight": len(self._inflight),
+            "pending_writes": len(self._pending),
+        }
+
+
+_translation_cache: Optional[TranslationCache] = None
+
+
+def get_translation_cache() -> Optional[TranslationCache]:
+    """返回进程内共享的翻译缓存，未启用时返回 None"""
+    global _translation_cache
+    if not settings.TRANSLATION_CACHE_ENABLED:
+        return None
+    if _translation_cache is None:
+        _translation_cache = TranslationCache(
+            settings.TRANSLATION_CACHE_PATH,
+            settings.TRANSLATION_CACHE_MAX_ENTRIES
+        )
+    return _translation_cache
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+from typing import Dict, Optional
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def checkpoint_path(job_id: str) -> str:
+    return os.path.join(settings.CHECKPOINT_DIR, f"{job_id}.jsonl")
+
+
+def remove_checkpoint(job_id: str):
+    try:
+        os.remove(checkpoint_path(job_id))
+    except FileNotFoundError:
+        pass
+
+
+class TooManyFailedBlocks(Exception):
+    """最终失败的文本块超过允许的数量，继续翻译已没有意义"""
+
+
+class TranslationCheckpoint:
+    """单个任务的翻译断点：已完成的译文逐条追加写入磁盘
+
+    以翻译缓存的 key（规范化原文的哈希）为键，任务重启或重试时直接复用已翻译的文本块，
+    只翻译缺失的部分。同时记录本次运行中最终失败的文本块数。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.translations: Dict[str, str] = {}
+        # 本次运行中重试后仍失败、保留原文的文本块数，以及第一个失败的原因
+        self.failed_blocks = 0
+        self.first_error: Optional[str] = None
+        # 允许失败的文本块数，超过后立即结束翻译；None 表示不限制
+        self.max_failed_blocks: Optional[int] = None
+        # 本次运行中由备用引擎翻译的文本块数：这些译文不写入断点与翻译缓存
+        self.fallback_blocks = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.translations[entry["k"]] = entry["v"]
+                except (ValueError, KeyError, TypeError):
+                    # 进程在写入中途退出时最后一行可能不完整
+                    continue
+        if self.translations:
+            logger.info("Loaded %d checkpointed translations from %s", len(self.translations), self.path)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.translations.get(key)
+
+    def record(self, key: str, value: str):
+        if self.translations.get(key) == value:
+            return
+        self.translations[key] = value
+        self._file.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record_failure(self, blocks: int, error: BaseException):
+        """记录重试后仍失败的文本块，超过 max_failed_blocks 时抛出 TooManyFailedBlocks"""
+        self.failed_blocks += blocks
+        if self.first_error is None:
+            self.first_error = str(error) or type(error).__name__
+        if self.max_failed_blocks is not None and self.failed_blocks > self.max_failed_blocks:
+            raise TooManyFailedBlocks(
+                f"{self.failed_blocks} text blocks could not be translated "
+                f"(at most {self.max_failed_blocks} allowed), first error: {self.first_error}"
+            )
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
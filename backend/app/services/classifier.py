@@ -0,0 +1,201 @@
+from array import array
+from collections import Counter
+from typing import List, Optional
+import logging
+import re
+from ..config import settings
+from .. import metrics
+from .layout import TextBlock, PageLayout
+from .segmenter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 页码："12"、"- 12 -"、"Page 3 of 10"、"iv"、"第 3 页"
+PAGE_NUMBER_PATTERN = re.compile(
+    r"^(page|p\.|第)?\s*[-–—]?\s*(\d{1,4}|[ivx]{1,5})\s*[-–—]?\s*((of|/)\s*\d{1,4})?\s*(页)?$",
+    re.IGNORECASE
+)
+URL_PATTERN = re.compile(
+    r"(https?://|ftp://|www\.)\S+|\bdoi:\s*\S+|\b10\.\d{4,9}/\S+|[\w.+-]+@[\w-]+\.[\w.-]+",
+    re.IGNORECASE
+)
+URL_LABEL_PATTERN = re.compile(r"\b(doi|url|e-?mail|available|at|online|https?)\b", re.IGNORECASE)
+# 等式中常见的关系符与大型运算符
+MATH_SYMBOL_PATTERN = re.compile(r"[=<>≤≥≈≠≡∝∑∏∫∮√∂∇±∓×÷∈∉⊂⊆∪∩∀∃→⇒⇔]")
+WORD_PATTERN = re.compile(r"[^\W\d_]{4,}")
+# 两个字母以上的单词；公式中除函数名外的单词不多于关系符与运算符，多于时视为含公式的正文句子
+PROSE_WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+# 以首字母大写的单词开头、以句末标点结尾的完整句子
+SENTENCE_PATTERN = re.compile(r"^([A-Z][a-z]+)\b.*[.!?]$")
+MATH_WORDS = {
+    "sin", "cos", "tan", "sinh", "cosh", "tanh", "log", "exp", "max", "min", "lim", "sup", "inf",
+    "argmax", "argmin", "softmax", "sigmoid", "relu", "diag", "trace", "sign", "mean", "prob",
+}
+MONOSPACE_FONT_PATTERN = re.compile(r"mono|courier|consola|menlo|inconsolata|typewriter|cmtt|code", re.IGNORECASE)
+CODE_PATTERN = re.compile(
+    r"[;{}]|==|!=|->|=>|::|\w\(.*\)|--?\w|\w\.\w|"
+    r"\b(def|return|import|from|class|function|var|let|const|public|void|int|if|for|while)\b|#include"
+)
+# 参考文献条目：编号加年份与出版信息，或 "Author, A. B. (2020)." 形式
+REFERENCE_NUMBER_PATTERN = re.compile(r"^\s*(\[\d{1,3}\]|\d{1,3}\.)\s+\S")
+REFERENCE_AUTHOR_PATTERN = re.compile(r"^[A-Z][\w'’-]+,\s+([A-Z]\.\s*)+.*\((19|20)\d{2}[a-z]?\)")
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}[a-z]?\b")
+PUBLICATION_PATTERN = re.compile(
+    r"\bet al\.|\bpp?\.\s*\d|\bvol\.|\bdoi\b|arxiv|\bproc(eedings|\.)|\bjournal\b|\bconference\b|\btrans\.",
+    re.IGNORECASE
+)
+# 目标语言对应的文字；拉丁字母语言之间无法按文字区分，不做判断
+KANA_PATTERN = re.compile(r"[\u3040-\u30ff]")
+TARGET_SCRIPTS = {
+    "zh": re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"),
+    "ja": re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]"),
+    "ko": re.compile(r"[\uac00-\ud7af\u1100-\u11ff]"),
+    "ru": re.compile(r"[\u0400-\u04ff]"),
+    "uk": re.compile(r"[\u0400-\u04ff]"),
+    "ar": re.compile(r"[\u0600-\u06ff]"),
+    "he": re.compile(r"[\u0590-\u05ff]"),
+    "el": re.compile(r"[\u0370-\u03ff]"),
+    "th": re.compile(r"[\u0e00-\u0e7f]"),
+}
+# 结尾为这些标点时视为段落结束，不与下一个文本块合并
+PARAGRAPH_END_PATTERN = re.compile(r"[.!?。！？:：;；]['\"”’)）]?$")
+
+
+class BlockClassifier:
+    """翻译前的本地预处理：跳过无需翻译的文本块，合并被拆碎的同一段落"""
+
+    @staticmethod
+    def classify(block: TextBlock, target_language: str) -> Optional[str]:
+        """返回文本块无需翻译的原因，需要翻译时返回 None"""
+        text = block.text.strip()
+        if PAGE_NUMBER_PATTERN.match(text):
+            return "page_number"
+        if not any(char.isalpha() for char in text):
+            return "numeric"
+        if URL_PATTERN.search(text):
+            rest = URL_LABEL_PATTERN.sub("", URL_PATTERN.sub("", text))
+            if not any(char.isalpha() for char in rest):
+                return "url"
+        if MONOSPACE_FONT_PATTERN.search(block.font or "") and CODE_PATTERN.search(text):
+            return "code"
+        if BlockClassifier.is_equation(text):
+            return "equation"
+        if REFERENCE_AUTHOR_PATTERN.match(text) or (
+            REFERENCE_NUMBER_PATTERN.match(text)
+            and YEAR_PATTERN.search(text)
+            and PUBLICATION_PATTERN.search(text)
+        ):
+            return "reference"
+        if BlockClassifier.is_target_language(text, target_language):
+            return "target_language"
+        return None
+
+    @staticmethod
+    def is_equation(text: str) -> bool:
+        """含关系符、不是完整句子，且没有长单词、普通单词也不多于关系符；例如 "Let x = 1 and y = 2." 仍需翻译"""
+        symbols = len(MATH_SYMBOL_PATTERN.findall(text))
+        if not symbols or any(word.lower() not in MATH_WORDS for word in WORD_PATTERN.findall(text)):
+            return False
+        sentence = SENTENCE_PATTERN.match(text)
+        if sentence and sentence.group(1).lower() not in MATH_WORDS:
+            return False
+        words = [word for word in PROSE_WORD_PATTERN.findall(text) if word.lower() not in MATH_WORDS]
+        return len(words) <= symbols
+
+    @staticmethod
+    def is_target_language(text: str, target_language: str) -> bool:
+        """按文字判断文本是否已经是目标语言：目标文字占字母的一半以上"""
+        language = re.split(r"[-_]", target_language.lower(), maxsplit=1)[0]
+        script = TARGET_SCRIPTS.get(language)
+        if script is None:
+            return False
+        letters = sum(1 for char in text if char.isalpha())
+        matched = len(script.findall(text))
+        # 汉字同时用于日文，含假名的文本不视为中文
+        if language == "zh" and KANA_PATTERN.search(text):
+            return False
+        if language == "ja" and not KANA_PATTERN.search(text):
+            return False
+        return letters > 0 and matched * 2 >= letters
+
+    @staticmethod
+    def should_merge(previous: TextBlock, block: TextBlock) -> bool:
+        """判断相邻的两个文本块是否属于被拆开的同一段落"""
+        if abs(previous.size - block.size) > 0.5 or previous.color != block.color:
+            return False
+        if PARAGRAPH_END_PATTERN.search(previous.text):
+            return False
+        # 垂直方向紧邻：间距不超过约一行（允许双倍行距）
+        gap = block.y0 - previous.y1
+        if gap < -0.3 * block.size or gap > 1.2 * max(previous.size, block.size):
+            return False
+        # 水平方向大部分重叠，避免合并不同栏的文本
+        overlap = min(previous.x1, block.x1) - max(previous.x0, block.x0)
+        narrower = min(previous.x1 - previous.x0, block.x1 - block.x0)
+        if narrower <= 0 or overlap < 0.5 * narrower:
+            return False
+        return count_tokens(previous.text) + count_tokens(block.text) <= settings.BLOCK_MERGE_MAX_TOKENS
+
+    @staticmethod
+    def merge(previous: TextBlock, block: TextBlock) -> TextBlock:
+        """合并为一个文本块，区域取两者的并集，格式沿用前一块"""
+        return TextBlock(
+            f"{previous.text} {block.text}",
+            (
+                min(previous.x0, block.x0),
+                min(previous.y0, block.y0),
+                max(previous.x1, block.x1),
+                max(previous.y1, block.y1)
+            ),
+            previous.size,
+            previous.color,
+            previous.font
+        )
+
+    @staticmethod
+    def prepare_layouts(layouts: List[PageLayout], target_language: str) -> List[PageLayout]:
+        """过滤并合并各页的文本块，返回只包含需要翻译的文本块的排版信息
+
+        跳过的文本块不再涂抹，渲染后保留原文的字体和字形（公式、代码等）。
+        """
+        prepared = []
+        skipped_total = 0
+        merged_total = 0
+        for layout in layouts:
+            blocks: List[TextBlock] = []
+            skipped_rects = Counter()
+            # 只合并原本就相邻的文本块，中间隔着被跳过的块时不合并
+            previous_kept = False
+            for block in layout.blocks:
+                reason = BlockClassifier.classify(block, target_language) if settings.BLOCK_CLASSIFIER_ENABLED else None
+                if reason is not None:
+                    skipped_rects[block.rect] += 1
+                    metrics.SKIPPED_BLOCKS.inc(reason=reason)
+                    skipped_total += 1
+                    previous_kept = False
+                    continue
+                if (
+                    settings.BLOCK_MERGE_ENABLED
+                    and previous_kept
+                    and BlockClassifier.should_merge(blocks[-1], block)
+                ):
+                    blocks[-1] = BlockClassifier.merge(blocks[-1], block)
+                    metrics.MERGED_BLOCKS.inc()
+                    merged_total += 1
+                    continue
+                blocks.append(block)
+                previous_kept = True
+
+            redact_rects = layout.redact_rects
+            if skipped_rects:
+                redact_rects = array("d")
+                for rect in layout.iter_redact_rects():
+                    if skipped_rects[rect] > 0:
+                        skipped_rects[rect] -= 1
+                        continue
+                    redact_rects.extend(rect)
+            prepared.append(PageLayout(layout.page_num, redact_rects, blocks))
+
+        if skipped_total or merged_total:
+            logger.debug("Skipped %d text blocks and merged %d fragments", skipped_total, merged_total)
+        return prepared
@@ -0,0 +1,364 @@
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from ..config import settings
+from .. import metrics
+from .segmenter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 滑动窗口内保留的最近成功请求数，用于计算对冲延迟与上报尾延迟
+LATENCY_WINDOW = 200
+# 上报的延迟分位
+REPORTED_QUANTILES = (50, 95, 99)
+# 延迟按请求输入的 token 数分桶统计（各桶上限），长请求的正常耗时不会被当成短请求的长尾
+SIZE_BUCKETS = (128, 512, 1024)
+
+
+# 与具体文本块无关、重试也不会成功的错误：请求无效、密钥无效、无权限、模型不存在、额度用尽
+FATAL_STATUS_CODES = {400, 401, 403, 404}
+FATAL_ERROR_CODES = {"insufficient_quota", "invalid_api_key", "model_not_found"}
+# 只与单个文本块有关的请求错误，其余文本块仍可翻译
+BLOCK_ERROR_CODES = {"context_length_exceeded", "content_filter"}
+
+
+def is_fatal(error: Optional[BaseException]) -> bool:
+    """沿异常链判断是否为影响所有请求的错误（认证、权限、请求参数、额度用尽），应直接结束任务"""
+    while error is not None:
+        code = getattr(error, "code", None)
+        if code in FATAL_ERROR_CODES:
+            return True
+        if code in BLOCK_ERROR_CODES:
+            return False
+        if getattr(error, "status_code", None) in FATAL_STATUS_CODES:
+            return True
+        error = error.__cause__
+    return False
+
+
+def is_rate_limited(error: Optional[BaseException]) -> bool:
+    """沿异常链判断是否为 429 限流错误；额度用尽同样返回 429，但不属于限流"""
+    if is_fatal(error):
+        return False
+    while error is not None:
+        if isinstance(error, RateLimitError) or getattr(error, "status_code", None) == 429:
+            return True
+        error = error.__cause__
+    return False
+
+
+def is_retryable(error: Optional[BaseException]) -> bool:
+    """沿异常链判断是否为可重试的临时错误：限流、超时、连接失败或服务端 5xx"""
+    if is_fatal(error):
+        return False
+    while error is not None:
+        if isinstance(error, (RateLimitError, APIConnectionError, InternalServerError, asyncio.TimeoutError)):
+            return True
+        status_code = getattr(error, "status_code", None)
+        if status_code == 429 or (status_code is not None and status_code >= 500):
+            return True
+        error = error.__cause__
+    return False
+
+
+def failure_reason(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if is_rate_limited(error):
+        return "rate_limited"
+    return "error"
+
+
+class TranslationEngine(ABC):
+    """翻译引擎接口：发送一组 chat 消息，返回模型输出的文本
+
+    kind 为 single 时最后一条消息是待翻译的文本；为 batch 时是字符串的 JSON 数组，
+    需要返回同样长度的 JSON 数组。
+    """
+
+    name = "engine"
+    # 参与翻译缓存与文档去重的键，模型变化后不复用旧译文
+    model = ""
+
+    @abstractmethod
+    async def complete(self, kind: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        raise NotImplementedError
+
+
+class OpenAIEngine(TranslationEngine):
+    """OpenAI 或任意 OpenAI 兼容的 chat completions 服务（如本地模型服务）"""
+
+    def __init__(self, name: str, api_key: str, model: str, base_url: str = ""):
+        self.name = name
+        self.model = model
+        # 超时与重试由 EngineRouter 统一处理
+        self.client = AsyncOpenAI(api_key=api_key or "none", base_url=base_url or None, max_retries=0)
+
+    async def complete(self, kind: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, type="prompt")
+            metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, type="completion")
+        return response.choices[0].message.content or ""
+
+
+class OfflineEngine(TranslationEngine):
+    """不调用任何服务的确定性引擎，用于测试与基准：相同输入总是得到相同的伪译文
+
+    latency 为每次请求的模拟延迟（秒）；tail_ratio 的请求额外等待 tail_latency 秒，用于模拟长尾。
+    """
+
+    model = "offline"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tail_ratio: float = 0.0,
+        tail_latency: float = 0.0,
+        seed: int = 0,
+        name: str = "offline"
+    ):
+        self.name = name
+        self.latency = latency
+        self.tail_ratio = tail_ratio
+        self.tail_latency = tail_latency
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def translate(text: str) -> str:
+        """伪译文：保留原文并加上由内容决定的标记，便于核对顺序与对应关系"""
+        if not text.strip():
+            return ""
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:6]
+        return f"〔译 {digest}〕{text}"
+
+    async def complete(self, kind: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        delay = self.latency
+        if self.tail_ratio and self._random.random() < self.tail_ratio:
+            delay += self.tail_latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        content = messages[-1]["content"]
+        if kind == "batch":
+            return json.dumps([OfflineEngine.translate(text) for text in json.loads(content)], ensure_ascii=False)
+        return OfflineEngine.translate(content)
+
+
+def size_bucket(messages: List[Dict[str, str]]) -> str:
+    """按待翻译内容（最后一条消息）的 token 数返回所属分桶的上限，超过所有上限时为 +Inf"""
+    tokens = count_tokens(messages[-1]["content"]) if messages else 0
+    for limit in SIZE_BUCKETS:
+        if tokens <= limit:
+            return str(limit)
+    return "+Inf"
+
+
+class LatencyTracker:
+    """记录一个引擎某类、某个大小分桶的请求最近的成功延迟，计算分位数"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class EngineRouter:
+    """在主引擎上发起请求：超时取消，慢请求发对冲请求，失败后改用备用引擎
+
+    对冲请求：请求耗时超过该引擎同类、输入大小相近的请求最近成功延迟的
+    TRANSLATION_HEDGE_PERCENTILE 分位时，向同一引擎再发一份相同的请求，取先成功的结果并取消另一个。
+    """
+
+    def __init__(self, primary: TranslationEngine, fallback: Optional[TranslationEngine] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self._latencies: Dict[tuple, LatencyTracker] = {}
+        # 每个引擎的请求数与对冲请求数，控制对冲带来的额外负载
+        self._requests: Dict[str, int] = {}
+        self._hedges: Dict[str, int] = {}
+
+    def tracker(self, engine: TranslationEngine, kind: str, size: str) -> LatencyTracker:
+        key = (engine.name, kind, size)
+        if key not in self._latencies:
+            self._latencies[key] = LatencyTracker()
+        return self._latencies[key]
+
+    def hedge_delay(self, engine: TranslationEngine, kind: str, size: str) -> Optional[float]:
+        """发出对冲请求前的等待时间；该分桶样本不足、已用完对冲额度或未启用时返回 None"""
+        if not settings.TRANSLATION_HEDGE_ENABLED:
+            return None
+        tracker = self.tracker(engine, kind, size)
+        if len(tracker.samples) < settings.TRANSLATION_HEDGE_MIN_SAMPLES:
+            return None
+        if self._hedges.get(engine.name, 0) >= settings.TRANSLATION_HEDGE_MAX_RATIO * self._requests.get(engine.name, 0):
+            return None
+        return max(settings.TRANSLATION_HEDGE_MIN_DELAY, tracker.percentile(settings.TRANSLATION_HEDGE_PERCENTILE))
+
+    async def _request(
+        self,
+        engine: TranslationEngine,
+        kind: str,
+        size: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        """向引擎发起一次带超时的请求，并记录延迟与在途请求数"""
+        self._requests[engine.name] = self._requests.get(engine.name, 0) + 1
+        metrics.LLM_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            content = await asyncio.wait_for(
+                engine.complete(kind, messages, max_tokens, temperature),
+                settings.TRANSLATION_REQUEST_TIMEOUT or None
+            )
+            outcome = "ok"
+            return content
+        except asyncio.CancelledError:
+            # 对冲中落败被取消的请求不计入延迟样本
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = failure_reason(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.LLM_REQUESTS_IN_FLIGHT.dec()
+            metrics.LLM_REQUEST_SECONDS.observe(elapsed, engine=engine.name, kind=kind, outcome=outcome)
+            if outcome == "ok":
+                self.observe(engine, kind, size, elapsed)
+
+    def observe(self, engine: TranslationEngine, kind: str, size: str, seconds: float):
+        tracker = self.tracker(engine, kind, size)
+        tracker.observe(seconds)
+        for quantile in REPORTED_QUANTILES:
+            metrics.LLM_LATENCY_QUANTILE.set(
+                tracker.percentile(quantile), engine=engine.name, kind=kind, size=size, quantile=f"{quantile / 100:g}"
+            )
+
+    async def _hedged(
+        self,
+        engine: TranslationEngine,
+        kind: str,
+        size: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        """在一个引擎上请求，超过对冲延迟仍未返回时再发一份，返回先成功的结果"""
+        first = asyncio.create_task(self._request(engine, kind, size, messages, max_tokens, temperature))
+        tasks = [first]
+        hedge = None
+        try:
+            delay = self.hedge_delay(engine, kind, size)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._hedges[engine.name] = self._hedges.get(engine.name, 0) + 1
+                    hedge = asyncio.create_task(self._request(engine, kind, size, messages, max_tokens, temperature))
+                    tasks.append(hedge)
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # 同时完成时优先取原请求的结果
+                for task in sorted(done, key=lambda task: task is not first):
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if hedge is not None:
+                            metrics.LLM_HEDGED_REQUESTS.inc(
+                                engine=engine.name, winner="hedge" if task is hedge else "original"
+                            )
+                        return task.result()
+                    error = error or task.exception()
+            if hedge is not None:
+                metrics.LLM_HEDGED_REQUESTS.inc(engine=engine.name, winner="none")
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def complete(
+        self,
+        kind: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> Tuple[str, TranslationEngine]:
+        """先请求主引擎，失败（含超时）时改用备用引擎，返回结果及给出结果的引擎；
+        都失败时抛出主引擎的错误，以便按限流调整并发"""
+        size = size_bucket(messages)
+        try:
+            return await self._hedged(self.primary, kind, size, messages, max_tokens, temperature), self.primary
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            reason = failure_reason(e)
+            metrics.LLM_FALLBACKS.inc(engine=self.primary.name, reason=reason)
+            logger.warning(
+                "Engine %s failed (%s), falling back to %s: %s",
+                self.primary.name, reason, self.fallback.name, str(e) or type(e).__name__
+            )
+            try:
+                return await self._hedged(self.fallback, kind, size, messages, max_tokens, temperature), self.fallback
+            except Exception as fallback_error:
+                logger.warning("Fallback engine %s also failed: %s", self.fallback.name, fallback_error)
+                raise e
+
+
+def create_engine(name: str) -> TranslationEngine:
+    """按名称创建引擎：openai、compatible 或 offline"""
+    if name == "openai":
+        return OpenAIEngine("openai", settings.OPENAI_API_KEY, settings.OPENAI_MODEL, settings.OPENAI_BASE_URL)
+    if name == "compatible":
+        return OpenAIEngine(
+            "compatible",
+            settings.COMPATIBLE_API_KEY,
+            settings.COMPATIBLE_MODEL,
+            settings.COMPATIBLE_BASE_URL
+        )
+    if name == "offline":
+        return OfflineEngine()
+    raise ValueError(f"Unknown translation engine: {name}")
+
+
+_engine_router: Optional[EngineRouter] = None
+
+
+def get_engine_router() -> EngineRouter:
+    """返回进程内共享的引擎路由，延迟数据在所有任务之间共享"""
+    global _engine_router
+    if _engine_router is None:
+        primary = create_engine(settings.TRANSLATION_ENGINE)
+        fallback = None
+        if settings.TRANSLATION_FALLBACK_ENGINE and settings.TRANSLATION_FALLBACK_ENGINE != settings.TRANSLATION_ENGINE:
+            fallback = create_engine(settings.TRANSLATION_FALLBACK_ENGINE)
+        _engine_router = EngineRouter(primary, fallback)
+        logger.info(
+            "Translation engine %s (%s), fallback %s",
+            primary.name, primary.model, fallback.name if fallback else "none"
+        )
+    return _engine_router
@@ -0,0 +1,191 @@
+import copy
+import io
+import logging
+import os
+import sys
+from array import array
+from typing import Optional, Tuple
+import fitz
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 随代码发布的中文字体，不在运行时下载
+BUNDLED_FONT_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "fonts", "NotoSansSC-Regular.otf"))
+# 写入页面时使用的字体资源名
+EMBEDDED_FONT_NAME = "doc-translator-cjk"
+# 不嵌入字体时使用的 PyMuPDF 内置 CJK 字体，由阅读器自行替换字形
+BUILTIN_FONT_NAME = "china-s"
+
+
+class EmbeddedFont:
+    """译文使用的嵌入字体：每个进程只读取一次，所有页面和任务共享
+
+    写入文档前按实际用到的字符生成子集，只嵌入需要的字形。
+    """
+
+    def __init__(self, buffer: bytes, source: str):
+        self.name = EMBEDDED_FONT_NAME
+        self.buffer = buffer
+        self.source = source
+        # 用于测量字宽，与嵌入的字形一致
+        self.font = fitz.Font(fontbuffer=buffer)
+        # 解析后的字体（含 cmap），每次生成子集时复制，避免重复解析
+        self._parsed = None
+        self._subsetting = True
+
+    def _parsed_font(self):
+        if self._parsed is None:
+            from fontTools.ttLib import TTFont
+            font = TTFont(io.BytesIO(self.buffer), lazy=True, recalcBBoxes=False, recalcTimestamp=False)
+            font["cmap"].getBestCmap()
+            self._parsed = font
+        return self._parsed
+
+    def preload(self):
+        """提前解析字体，避免第一个任务承担解析耗时"""
+        if settings.PDF_SUBSET_FONT and self._subsetting:
+            try:
+                self._parsed_font()
+            except ImportError:
+                self._disable_subsetting("fontTools is not installed")
+
+    def _disable_subsetting(self, reason: str):
+        self._subsetting = False
+        logger.warning("Font subsetting disabled, embedding the full font: %s", reason)
+
+    def subset(self, text: str, retain_gids: bool = False) -> bytes:
+        """返回只包含 text 中字符的字体数据；无法生成子集时返回完整字体
+
+        retain_gids 为 True 时保留原字形编号，用于替换已按完整字体写入页面的字体数据。
+        """
+        if not settings.PDF_SUBSET_FONT or not self._subsetting:
+            return self.buffer
+        try:
+            return self._save(self._subset_font(text, retain_gids))
+        except ImportError:
+            self._disable_subsetting("fontTools is not installed")
+            return self.buffer
+        except Exception as e:
+            logger.warning("Failed to subset font, embedding the full font: %s", e)
+            return self.buffer
+
+    def subset_with_cid_map(self, text: str) -> Optional[Tuple[bytes, bytes]]:
+        """返回重新编号的子集及 CIDToGIDMap 数据，页面中按完整字体字形编号写入的 CID 经映射表指向子集字形
+
+        比保留原字形编号的子集快得多（不必写出数万个空字形）；CIDToGIDMap 只适用于 TrueType 字形，
+        其他字体或无法生成子集时返回 None。
+        """
+        if not settings.PDF_SUBSET_FONT or not self._subsetting:
+            return None
+        try:
+            parsed = self._parsed_font()
+            if "glyf" not in parsed:
+                return None
+            font = self._subset_font(text, retain_gids=False)
+            data = self._save(font)
+        except ImportError:
+            self._disable_subsetting("fontTools is not installed")
+            return None
+        except Exception as e:
+            logger.warning("Failed to subset font, embedding the full font: %s", e)
+            return None
+        glyph_ids = parsed.getReverseGlyphMap()
+        order = font.getGlyphOrder()
+        # 大端序的 2 字节数组，下标为 CID（完整字体的字形编号），值为子集中的字形编号
+        cid_map = array("H", bytes(2 * (max(glyph_ids[name] for name in order) + 1)))
+        for gid, name in enumerate(order):
+            cid_map[glyph_ids[name]] = gid
+        if sys.byteorder == "little":
+            cid_map.byteswap()
+        return data, cid_map.tobytes()
+
+    def _subset_font(self, text: str, retain_gids: bool):
+        from fontTools import subset
+        font = copy.deepcopy(self._parsed_font())
+        options = subset.Options()
+        options.recalc_bounds = False
+        options.recalc_timestamp = False
+        options.notdef_outline = True
+        options.retain_gids = retain_gids
+        subsetter = subset.Subsetter(options)
+        # 断行后的文本只含空格，不需要其他空白字符
+        subsetter.populate(unicodes={ord(char) for char in text if char not in "\n\t\r"} | {ord(" ")})
+        subsetter.subset(font)
+        return font
+
+    @staticmethod
+    def _save(font) -> bytes:
+        output = io.BytesIO()
+        font.save(output)
+        return output.getvalue()
+
+    def widths(self, text: str) -> str:
+        """返回 text 中字符对应字形的 CID 字体宽度数组（PDF 的 /W），字形编号与完整字体一致"""
+        glyphs = {}
+        for char in set(text) - set("\n\t\r"):
+            gid = self.font.has_glyph(ord(char))
+            if gid:
+                glyphs[gid] = round(self.font.glyph_advance(ord(char)) * 1000)
+        # 连续编号的字形合并为 "起始编号 [宽度 ...]"
+        runs = []
+        for gid in sorted(glyphs):
+            if runs and runs[-1][0] + len(runs[-1][1]) == gid:
+                runs[-1][1].append(glyphs[gid])
+            else:
+                runs.append((gid, [glyphs[gid]]))
+        return "[" + " ".join(f"{start} [{' '.join(map(str, values))}]" for start, values in runs) + "]"
+
+
+def _read_font(path: str) -> bytes:
+    """读取并校验字体文件，无法解析时抛出异常"""
+    with open(path, "rb") as f:
+        buffer = f.read()
+    fitz.Font(fontbuffer=buffer)
+    return buffer
+
+
+_font: Optional[EmbeddedFont] = None
+
+
+def get_embedded_font() -> EmbeddedFont:
+    """返回本进程共享的嵌入字体；配置的字体不可用时退回 MuPDF 自带的 CJK 字体（Droid Sans Fallback）"""
+    global _font
+    if _font is None:
+        path = settings.PDF_FONT_PATH or BUNDLED_FONT_PATH
+        try:
+            buffer = _read_font(path)
+            source = path
+        except Exception as e:
+            logger.error("Cannot load font %s, falling back to the builtin CJK font: %s", path, e)
+            buffer = fitz.Font("cjk").buffer
+            source = "builtin:cjk"
+        _font = EmbeddedFont(buffer, source)
+        logger.info("Loaded font %s (%d KiB)", source, len(buffer) // 1024)
+    return _font
+
+
+def check_font():
+    """启动时校验译文字体：PDF_FONT_PATH 指定的字体无法解析时启动失败
+
+    随代码发布的字体无法解析时只记录错误，译文改用 MuPDF 自带的 CJK 字体，输出仍可阅读。
+    """
+    if not settings.PDF_EMBED_FONT:
+        return
+    path = settings.PDF_FONT_PATH or BUNDLED_FONT_PATH
+    try:
+        _read_font(path)
+    except Exception as e:
+        if settings.PDF_FONT_PATH:
+            raise RuntimeError(f"PDF_FONT_PATH {path} is not a usable font: {e}") from e
+        logger.error(
+            "Bundled font %s cannot be parsed (%s), translated PDFs will use the builtin CJK font instead; "
+            "replace it with the Noto Sans SC OTF or set PDF_FONT_PATH",
+            path, e
+        )
+
+
+def preload_fonts():
+    """PDF 进程的初始化函数：启动时加载字体，之后的页面和任务直接复用"""
+    if settings.PDF_EMBED_FONT:
+        get_embedded_font().preload()
@@ -0,0 +1,648 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from ..config import settings
+from ..models import TranslationJob, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# 仍在排队或执行中的任务状态
+ACTIVE_STATUSES = (JobStatus.PENDING.value, JobStatus.PROCESSING.value)
+
+
+class JobWatchers:
+    """本进程内等待任务更新的连接：任务保存后立即唤醒，其他进程的更新由连接轮询共享存储发现"""
+
+    def __init__(self):
+        self._events: Dict[str, Set[asyncio.Event]] = {}
+
+    @contextmanager
+    def watch(self, job_id: str) -> Iterator[asyncio.Event]:
+        event = asyncio.Event()
+        self._events.setdefault(job_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            events = self._events.get(job_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._events[job_id]
+
+    def notify(self, job_id: str):
+        for event in self._events.get(job_id, ()):
+            event.set()
+
+
+job_watchers = JobWatchers()
+
+
+class JobStore(ABC):
+    """任务状态存储接口，所有 web worker 和后台 worker 共享同一份任务状态"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[TranslationJob]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save(self, job: TranslationJob, lease: Optional[str] = None) -> bool:
+        """保存任务，返回是否写入
+
+        传入 lease 时只有仍持有该租约且任务仍在执行中才写入，避免已被其他 worker 接管的执行
+        或已结束的任务被覆盖。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def acquire_lease(self, job: TranslationJob, lease: str, ttl: float) -> bool:
+        """任务仍在排队时登记执行租约并保存 job（状态应为 processing），否则返回 False"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def renew_lease(self, job_id: str, lease: str, ttl: float) -> bool:
+        """续期租约，租约已被其他 worker 接管时返回 False"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_lease(self, job_id: str, lease: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def requeue_expired(self, job: TranslationJob, file_path: str, priority: float) -> bool:
+        """任务仍在执行中且租约已过期时改为排队并重新入队，返回是否入队
+
+        检查与入队在同一事务中完成，执行中的 worker 续期后不会被重复入队。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list_by_status(self, status: JobStatus, limit: int = 100) -> List[TranslationJob]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def enqueue(self, job: TranslationJob, file_path: str, priority: float):
+        """保存任务并加入等待队列，priority 越小越先执行"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim(self) -> Optional[Tuple[TranslationJob, str]]:
+        """原子地取出优先级最高的排队任务，返回任务及其源文件路径"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def queue_length(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def queue_position(self, job_id: str) -> Optional[int]:
+        """返回任务在队列中的位置（从 1 开始），不在队列中时返回 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reserve_document(
+        self,
+        document_key: str,
+        job: TranslationJob
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        """登记相同文档的翻译任务
+
+        已有完成的结果或仍在执行的任务时返回 (任务 ID, 结果对象键)，任务执行中时对象键为 None；
+        否则保存 job 并登记为该文档的执行任务，返回 None。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def complete_document(self, document_key: str, job_id: str, object_key: str):
+        """记录文档翻译结果在存储中的对象键"""
+        raise NotImplementedError
+
+    def progress_writer(self, job: TranslationJob, lease: Optional[str] = None) -> "ProgressWriter":
+        return ProgressWriter(self, job, settings.JOB_PROGRESS_FLUSH_INTERVAL, lease)
+
+
+class ProgressWriter:
+    """合并高频的进度更新，最多每 interval 秒写一次存储"""
+
+    def __init__(self, store: JobStore, job: TranslationJob, interval: float, lease: Optional[str] = None):
+        self.store = store
+        self.job = job
+        self.interval = interval
+        self.lease = lease
+        self._last_flush = 0.0
+        self._dirty = False
+
+    async def update(self, progress: float):
+        self.job.progress = progress
+        await self.changed(force=progress >= 100)
+
+    async def changed(self, force: bool = False):
+        """任务的其他字段已修改，到达写入间隔时一并保存"""
+        self._dirty = True
+        if force or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        await self.store.save(self.job, self.lease)
+
+
+class SQLiteJobStore(JobStore):
+    """基于 SQLite（WAL 模式）的任务存储，适用于单机多 worker 部署"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "lease_owner TEXT, lease_expires REAL)"
+            )
+            # 旧版本创建的表没有租约列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("lease_owner", "TEXT"), ("lease_expires", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_queue ("
+                "job_id TEXT PRIMARY KEY, file_path TEXT NOT NULL, priority REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_priority ON job_queue (priority)")
+            # 文档去重索引：(源文件哈希, 目标语言, 模型, 提示词版本) -> 结果对象键
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "key TEXT PRIMARY KEY, job_id TEXT NOT NULL, object_key TEXT, updated_at REAL NOT NULL)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _run(self, func, *args):
+        """在线程中执行一次数据库操作，每次操作使用独立连接"""
+        def run():
+            conn = self._connect()
+            try:
+                return func(conn, *args)
+            finally:
+                conn.close()
+        return await asyncio.to_thread(run)
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, job: TranslationJob):
+        job.updated_at = datetime.now()
+        conn.execute(
+            "INSERT INTO jobs (id, status, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status = excluded.status, data = excluded.data, "
+            "updated_at = excluded.updated_at",
+            (job.id, job.status.value, job.model_dump_json(),
+             job.created_at.timestamp(), job.updated_at.timestamp())
+        )
+
+    async def get(self, job_id: str) -> Optional[TranslationJob]:
+        def query(conn):
+            return conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        row = await self._run(query)
+        return TranslationJob.model_validate_json(row[0]) if row else None
+
+    async def save(self, job: TranslationJob, lease: Optional[str] = None) -> bool:
+        def upsert(conn):
+            if lease is None:
+                self._upsert(conn, job)
+                conn.commit()
+                return True
+            job.updated_at = datetime.now()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, data = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (job.status.value, job.model_dump_json(), job.updated_at.timestamp(),
+                 job.id, lease, JobStatus.PROCESSING.value)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        saved = await self._run(upsert)
+        if saved:
+            job_watchers.notify(job.id)
+        return saved
+
+    async def acquire_lease(self, job: TranslationJob, lease: str, ttl: float) -> bool:
+        def acquire(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job.id,)).fetchone()
+                if row is None or row[0] != JobStatus.PENDING.value:
+                    conn.commit()
+                    return False
+                self._upsert(conn, job)
+                conn.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                    (lease, time.time() + ttl, job.id)
+                )
+                conn.commit()
+                return True
+            except BaseException:
+                conn.rollback()
+                raise
+        acquired = await self._run(acquire)
+        if acquired:
+            job_watchers.notify(job.id)
+        return acquired
+
+    async def renew_lease(self, job_id: str, lease: str, ttl: float) -> bool:
+        def renew(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                (time.time() + ttl, job_id, lease)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        return await self._run(renew)
+
+    async def release_lease(self, job_id: str, lease: str):
+        def release(conn):
+            conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+                (job_id, lease)
+            )
+            conn.commit()
+        await self._run(release)
+
+    async def requeue_expired(self, job: TranslationJob, file_path: str, priority: float) -> bool:
+        def requeue(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT status, lease_expires FROM jobs WHERE id = ?", (job.id,)
+                ).fetchone()
+                # 没有租约的 processing 任务（旧版本写入或 worker 已释放租约）同样视为已退出
+                if row is None or row[0] != JobStatus.PROCESSING.value or (row[1] or 0) >= time.time():
+                    conn.commit()
+                    return False
+                job.status = JobStatus.PENDING
+                self._upsert(conn, job)
+                conn.execute(
+                    "UPDATE jobs SET lease_owner = NULL, lease_expires = NULL WHERE id = ?", (job.id,)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_queue (job_id, file_path, priority) VALUES (?, ?, ?)",
+                    (job.id, file_path, priority)
+                )
+                conn.commit()
+                return True
+            except BaseException:
+                conn.rollback()
+                raise
+        requeued = await self._run(requeue)
+        if requeued:
+            job_watchers.notify(job.id)
+        return requeued
+
+    async def list_by_status(self, status: JobStatus, limit: int = 100) -> List[TranslationJob]:
+        def query(conn):
+            return conn.execute(
+                "SELECT data FROM jobs WHERE status = ? ORDER BY created_at LIMIT ?",
+                (status.value, limit)
+            ).fetchall()
+        rows = await self._run(query)
+        return [TranslationJob.model_validate_json(row[0]) for row in rows]
+
+    async def enqueue(self, job: TranslationJob, file_path: str, priority: float):
+        def insert(conn):
+            self._upsert(conn, job)
+            conn.execute(
+                "INSERT OR REPLACE INTO job_queue (job_id, file_path, priority) VALUES (?, ?, ?)",
+                (job.id, file_path, priority)
+            )
+            conn.commit()
+        await self._run(insert)
+        job_watchers.notify(job.id)
+
+    async def claim(self) -> Optional[Tuple[TranslationJob, str]]:
+        def pop(conn):
+            # BEGIN IMMEDIATE 获取写锁，保证多个 worker 不会取到同一个任务
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT q.job_id, q.file_path, j.data FROM job_queue q "
+                    "JOIN jobs j ON j.id = q.job_id ORDER BY q.priority LIMIT 1"
+                ).fetchone()
+                if row:
+                    conn.execute("DELETE FROM job_queue WHERE job_id = ?", (row[0],))
+                conn.commit()
+                return row
+            except BaseException:
+                conn.rollback()
+                raise
+        row = await self._run(pop)
+        if row is None:
+            return None
+        return TranslationJob.model_validate_json(row[2]), row[1]
+
+    async def queue_length(self) -> int:
+        def query(conn):
+            return conn.execute("SELECT COUNT(*) FROM job_queue").fetchone()[0]
+        return await self._run(query)
+
+    async def queue_position(self, job_id: str) -> Optional[int]:
+        def query(conn):
+            row = conn.execute("SELECT priority FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM job_queue WHERE priority < ?", (row[0],)
+            ).fetchone()[0]
+            return ahead + 1
+        return await self._run(query)
+
+    async def reserve_document(
+        self,
+        document_key: str,
+        job: TranslationJob
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        def reserve(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT d.job_id, d.object_key, j.status FROM documents d "
+                    "LEFT JOIN jobs j ON j.id = d.job_id WHERE d.key = ?",
+                    (document_key,)
+                ).fetchone()
+                if row and (row[1] or row[2] in ACTIVE_STATUSES):
+                    conn.commit()
+                    return row[0], row[1]
+                # 没有记录，或登记的任务已失败：由当前任务接手
+                self._upsert(conn, job)
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents (key, job_id, object_key, updated_at) "
+                    "VALUES (?, ?, NULL, ?)",
+                    (document_key, job.id, time.time())
+                )
+                conn.commit()
+                return None
+            except BaseException:
+                conn.rollback()
+                raise
+        return await self._run(reserve)
+
+    async def complete_document(self, document_key: str, job_id: str, object_key: str):
+        def update(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (key, job_id, object_key, updated_at) VALUES (?, ?, ?, ?)",
+                (document_key, job_id, object_key, time.time())
+            )
+            conn.commit()
+        await self._run(update)
+
+
+class RedisJobStore(JobStore):
+    """基于 Redis（或兼容协议的服务）的任务存储，适用于多机部署"""
+
+    KEY_PREFIX = "doc-translator:job:"
+    STATUS_PREFIX = "doc-translator:status:"
+    QUEUE_KEY = "doc-translator:queue"
+    QUEUE_FILES_KEY = "doc-translator:queue-files"
+    DOCUMENT_PREFIX = "doc-translator:document:"
+    LEASE_PREFIX = "doc-translator:lease:"
+    # 弹出优先级最高的任务并一并取出、删除其源文件路径，返回 [任务 ID, 源文件路径, 任务数据]
+    CLAIM_SCRIPT = """
+    local popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then
+        return nil
+    end
+    local job_id = popped[1]
+    local file_path = redis.call('HGET', KEYS[2], job_id)
+    redis.call('HDEL', KEYS[2], job_id)
+    return {job_id, file_path, redis.call('GET', ARGV[1] .. job_id)}
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("使用 Redis 任务存储需要安装 redis 包: pip install redis")
+        self.redis = redis.from_url(url)
+
+    async def get(self, job_id: str) -> Optional[TranslationJob]:
+        data = await self.redis.get(self.KEY_PREFIX + job_id)
+        return TranslationJob.model_validate_json(data) if data else None
+
+    def _save(self, pipe, job: TranslationJob):
+        job.updated_at = datetime.now()
+        for status in JobStatus:
+            if status != job.status:
+                pipe.zrem(self.STATUS_PREFIX + status.value, job.id)
+        pipe.zadd(self.STATUS_PREFIX + job.status.value, {job.id: job.created_at.timestamp()})
+        pipe.set(self.KEY_PREFIX + job.id, job.model_dump_json())
+
+    async def save(self, job: TranslationJob, lease: Optional[str] = None) -> bool:
+        if lease is None:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                self._save(pipe, job)
+                await pipe.execute()
+            job_watchers.notify(job.id)
+            return True
+        saved = await self._watch(
+            [self.KEY_PREFIX + job.id, self.LEASE_PREFIX + job.id],
+            lambda stored, owner: owner == lease and stored is not None
+            and stored.status == JobStatus.PROCESSING,
+            lambda pipe: self._save(pipe, job),
+            job.id
+        )
+        if saved:
+            job_watchers.notify(job.id)
+        return saved
+
+    async def _watch(self, keys: List[str], check, update, job_id: str) -> bool:
+        """WATCH 任务与租约后检查 check(已保存的任务, 租约持有者)，通过时在事务中执行 update(pipe)"""
+        from redis.exceptions import WatchError
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(*keys)
+                    data = await pipe.get(self.KEY_PREFIX + job_id)
+                    owner = await pipe.get(self.LEASE_PREFIX + job_id)
+                    stored = TranslationJob.model_validate_json(data) if data else None
+                    if not check(stored, owner.decode() if owner else None):
+                        await pipe.reset()
+                        return False
+                    pipe.multi()
+                    update(pipe)
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    async def acquire_lease(self, job: TranslationJob, lease: str, ttl: float) -> bool:
+        def update(pipe):
+            pipe.set(self.LEASE_PREFIX + job.id, lease, px=int(ttl * 1000))
+            self._save(pipe, job)
+
+        acquired = await self._watch(
+            [self.KEY_PREFIX + job.id, self.LEASE_PREFIX + job.id],
+            lambda stored, owner: stored is not None and stored.status == JobStatus.PENDING,
+            update,
+            job.id
+        )
+        if acquired:
+            job_watchers.notify(job.id)
+        return acquired
+
+    async def renew_lease(self, job_id: str, lease: str, ttl: float) -> bool:
+        return await self._watch(
+            [self.LEASE_PREFIX + job_id],
+            lambda stored, owner: owner == lease,
+            lambda pipe: pipe.pexpire(self.LEASE_PREFIX + job_id, int(ttl * 1000)),
+            job_id
+        )
+
+    async def release_lease(self, job_id: str, lease: str):
+        await self._watch(
+            [self.LEASE_PREFIX + job_id],
+            lambda stored, owner: owner == lease,
+            lambda pipe: pipe.delete(self.LEASE_PREFIX + job_id),
+            job_id
+        )
+
+    async def requeue_expired(self, job: TranslationJob, file_path: str, priority: float) -> bool:
+        def update(pipe):
+            job.status = JobStatus.PENDING
+            self._save(pipe, job)
+            pipe.hset(self.QUEUE_FILES_KEY, job.id, file_path)
+            pipe.zadd(self.QUEUE_KEY, {job.id: priority})
+
+        # 租约键随 TTL 过期，不存在即表示执行它的 worker 已停止续期
+        requeued = await self._watch(
+            [self.KEY_PREFIX + job.id, self.LEASE_PREFIX + job.id],
+            lambda stored, owner: owner is None and stored is not None
+            and stored.status == JobStatus.PROCESSING,
+            update,
+            job.id
+        )
+        if requeued:
+            job_watchers.notify(job.id)
+        return requeued
+
+    async def list_by_status(self, status: JobStatus, limit: int = 100) -> List[TranslationJob]:
+        job_ids = await self.redis.zrange(self.STATUS_PREFIX + status.value, 0, limit - 1)
+        if not job_ids:
+            return []
+        values = await self.redis.mget([self.KEY_PREFIX + job_id.decode() for job_id in job_ids])
+        return [TranslationJob.model_validate_json(value) for value in values if value]
+
+    async def enqueue(self, job: TranslationJob, file_path: str, priority: float):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._save(pipe, job)
+            pipe.hset(self.QUEUE_FILES_KEY, job.id, file_path)
+            pipe.zadd(self.QUEUE_KEY, {job.id: priority})
+            await pipe.execute()
+        job_watchers.notify(job.id)
+
+    async def claim(self) -> Optional[Tuple[TranslationJob, str]]:
+        # 出队、取出源文件路径与任务数据在同一个脚本中完成：
+        # 多个 worker 不会取到同一个任务，worker 在中途退出也不会留下没有队列项的文件记录
+        while True:
+            popped = await self.redis.eval(
+                self.CLAIM_SCRIPT, 2, self.QUEUE_KEY, self.QUEUE_FILES_KEY, self.KEY_PREFIX
+            )
+            if not popped:
+                return None
+            job_id, file_path, data = popped
+            job_id = job_id.decode()
+            if data is None:
+                logger.warning("Queued job %s no longer exists, skipping", job_id)
+                continue
+            job = TranslationJob.model_validate_json(data)
+            if file_path is None:
+                # 无法执行的任务标记为失败，不会一直停在排队状态
+                logger.error("Queued job %s has no source file, marking it failed", job_id)
+                if job.status == JobStatus.PENDING:
+                    job.status = JobStatus.FAILED
+                    job.stage = None
+                    job.error = "Source file of the queued job is missing"
+                    await self.save(job)
+                continue
+            return job, file_path.decode()
+
+    async def queue_length(self) -> int:
+        return await self.redis.zcard(self.QUEUE_KEY)
+
+    async def queue_position(self, job_id: str) -> Optional[int]:
+        rank = await self.redis.zrank(self.QUEUE_KEY, job_id)
+        return None if rank is None else rank + 1
+
+    async def reserve_document(
+        self,
+        document_key: str,
+        job: TranslationJob
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        from redis.exceptions import WatchError
+
+        key = self.DOCUMENT_PREFIX + document_key
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # WATCH 保证检查与登记之间没有其他请求登记同一文档
+                    await pipe.watch(key)
+                    existing = await pipe.hgetall(key)
+                    if existing:
+                        job_id = existing[b"job_id"].decode()
+                        object_key = existing.get(b"object_key")
+                        if object_key:
+                            return job_id, object_key.decode()
+                        owner = await self.get(job_id)
+                        if owner is not None and owner.status in ACTIVE_STATUSES:
+                            return job_id, None
+                    pipe.multi()
+                    self._save(pipe, job)
+                    pipe.delete(key)
+                    pipe.hset(key, mapping={"job_id": job.id})
+                    await pipe.execute()
+                    return None
+                except WatchError:
+                    continue
+
+    async def complete_document(self, document_key: str, job_id: str, object_key: str):
+        await self.redis.hset(
+            self.DOCUMENT_PREFIX + document_key,
+            mapping={"job_id": job_id, "object_key": object_key}
+        )
+
+
+def create_job_store() -> JobStore:
+    """根据配置创建任务存储"""
+    if settings.JOB_STORE == "redis":
+        return RedisJobStore(settings.REDIS_URL)
+    if settings.JOB_STORE == "sqlite":
+        return SQLiteJobStore(settings.JOB_STORE_PATH)
+    raise ValueError(f"Unknown job store: {settings.JOB_STORE}")
+
+
+_job_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """返回本进程共享的任务存储，首次使用时按配置创建"""
+    global _job_store
+    if _job_store is None:
+        _job_store = create_job_store()
+    return _job_store
@@ -0,0 +1,70 @@
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+
+class TextBlock:
+    """单个文本块的排版信息，使用 __slots__ 以减少大文档的内存占用"""
+
+    __slots__ = ("text", "x0", "y0", "x1", "y1", "size", "color", "font")
+
+    def __init__(
+        self,
+        text: str,
+        rect: Tuple[float, float, float, float],
+        size: float,
+        color: int,
+        font: str
+    ):
+        self.text = text
+        self.x0, self.y0, self.x1, self.y1 = rect
+        self.size = size
+        # 保留 PDF 中的整数 sRGB 颜色，渲染时再转换
+        self.color = color
+        self.font = font
+
+    @property
+    def rect(self) -> Tuple[float, float, float, float]:
+        return (self.x0, self.y0, self.x1, self.y1)
+
+    def with_text(self, text: str) -> "TextBlock":
+        """返回仅文本不同的副本，保持原有格式信息"""
+        return TextBlock(text, self.rect, self.size, self.color, self.font)
+
+    def __repr__(self) -> str:
+        return f"TextBlock({self.text[:30]!r}, rect={self.rect}, size={self.size})"
+
+
+class PageLayout:
+    """单页的排版信息：需要涂抹的全部文本区域及需要翻译的文本块"""
+
+    __slots__ = ("page_num", "redact_rects", "blocks")
+
+    def __init__(self, page_num: int, redact_rects: array, blocks: List[TextBlock]):
+        self.page_num = page_num
+        # 扁平存储的 (x0, y0, x1, y1) 序列，包括不需要翻译的空白文本块
+        self.redact_rects = redact_rects
+        self.blocks = blocks
+
+    def iter_redact_rects(self) -> Iterator[Tuple[float, float, float, float]]:
+        rects = self.redact_rects
+        for i in range(0, len(rects), 4):
+            yield rects[i], rects[i + 1], rects[i + 2], rects[i + 3]
+
+
+def flatten_blocks(layouts: List[PageLayout]) -> List[Tuple[int, TextBlock]]:
+    """展开为翻译服务使用的 (页码, 文本块) 列表"""
+    return [(layout.page_num, block) for layout in layouts for block in layout.blocks]
+
+
+def with_translations(
+    layouts: List[PageLayout],
+    translated_blocks: List[Tuple[int, TextBlock]]
+) -> List[PageLayout]:
+    """用翻译后的文本块替换各页的文本块，涂抹区域保持不变"""
+    page_blocks: Dict[int, List[TextBlock]] = {}
+    for page_num, block in translated_blocks:
+        page_blocks.setdefault(page_num, []).append(block)
+    return [
+        PageLayout(layout.page_num, layout.redact_rects, page_blocks.get(layout.page_num, []))
+        for layout in layouts
+    ]
@@ -1,27 +1,78 @@
 import fitz
-from typing import List, Tuple, Dict
+from typing import List, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from array import array
+import asyncio
 import json
+import logging
+import multiprocessing
+import re
 from ..config import settings
+from .layout import TextBlock, PageLayout
+from .textfit import get_text_fitter
+from .fonts import BUILTIN_FONT_NAME, get_embedded_font, preload_fonts
 import os
 
+logger = logging.getLogger(__name__)
+
+# PyMuPDF 的解析、涂抹和保存都是阻塞的 CPU 密集操作，放到独立进程中执行，
+# 避免阻塞事件循环并让单个 web worker 使用多个 CPU 核心
+_executor: Optional[Executor] = None
+
+
+def get_pdf_executor() -> Executor:
+    """返回共享的 PDF 执行器：PDF_WORKERS 个进程；为 0 时使用单个线程
+
+    PyMuPDF 不是线程安全的，线程模式下所有 PDF 操作都串行执行。
+    """
+    global _executor
+    if _executor is None:
+        if settings.PDF_WORKERS > 0:
+            # 使用 spawn 避免在已有事件循环和线程的进程中 fork；每个进程启动时加载一次字体
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_fonts
+            )
+        else:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf", initializer=preload_fonts)
+    return _executor
+
+
+def shutdown_pdf_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def shard_workers() -> int:
+    """分片并行渲染可用的进程数：不超过 PDF_WORKERS 与 CPU 核数
+
+    分片比整份渲染多出合并的开销，只有多个进程能真正同时运行时才划算。
+    """
+    return min(settings.PDF_WORKERS, os.cpu_count() or 1)
+
+
+async def run_pdf_task(func, *args):
+    """在 PDF 进程池中执行 func(*args)，参数和返回值需可序列化"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pdf_executor(), func, *args)
+
 class PDFService:
-    # 使用本地字体文件
-    FONT_PATH = os.path.join(os.path.dirname(__file__), "../fonts/chinese")
-    
     @staticmethod
-    def init_fonts():
-        """初始化字体"""
-        os.makedirs(PDFService.FONT_PATH, exist_ok=True)
-        font_path = os.path.join(PDFService.FONT_PATH, "NotoSansSC-Regular.otf")
-        
-        if not os.path.exists(font_path):
-            import requests
-            url = "https://github.com/googlefonts/noto-cjk/releases/download/Sans2.004/NotoSansSC-Regular.otf"
-            response = requests.get(url)
-            with open(font_path, "wb") as f:
-                f.write(response.content)
-        
-        return font_path
+    def prepare_font(layouts: List[PageLayout], subset: bool = True) -> Tuple[str, Optional[bytes]]:
+        """返回写入译文使用的字体名及需要嵌入的字体数据（只含这些页面用到的字形）
+
+        subset 为 False 时返回完整字体：各分片嵌入同一份字体，合并时再统一生成子集。
+        """
+        if not settings.PDF_EMBED_FONT:
+            return BUILTIN_FONT_NAME, None
+        font = get_embedded_font()
+        if not subset:
+            return font.name, font.buffer
+        text = "".join(block.text for layout in layouts for block in layout.blocks)
+        return font.name, font.subset(text)
 
     @staticmethod
     def rgb_to_color(color: int) -> List[float]:
@@ -32,131 +83,333 @@ class PDFService:
         return [red / 255.0, green / 255.0, blue / 255.0]
 
     @staticmethod
-    async def extract_text(file_path: str) -> List[Tuple[int, Dict]]:
-        """从PDF文件中提取文本，返回更详细的文本信息"""
+    async def extract_layout(
+        file_path: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> List[PageLayout]:
+        """从PDF文件中提取每页的文本块和排版信息；可只提取 [start, end) 页
+
+        结果同时包含渲染时需要涂抹的区域，渲染阶段无需再次解析页面。
+        """
+        return await run_pdf_task(PDFService._extract_layout_sync, file_path, start, end)
+
+    @staticmethod
+    def _extract_layout_sync(
+        file_path: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> List[PageLayout]:
         try:
             doc = fitz.open(file_path)
-            text_blocks = []
+            layouts = []
+            end = len(doc) if end is None else min(end, len(doc))
             
-            for page_num in range(len(doc)):
+            for page_num in range(start, end):
                 page = doc[page_num]
                 text_dict = page.get_text("dict", sort=True)
+                redact_rects = array("d")
+                blocks = []
                 
                 for block in text_dict["blocks"]:
                     if block["type"] == 0:  # 文本块
-                        block_text = ""
+                        # 空白文本块不需要翻译，但渲染时仍要涂抹
+                        redact_rects.extend(block["bbox"])
+                        span_texts = []
                         font_info = []
                         sizes = []
                         colors = []
                         
                         for line in block["lines"]:
                             for span in line["spans"]:
-                                block_text += span["text"] + " "
+                                span_texts.append(span["text"])
                                 font_info.append(span.get("font", ""))
                                 sizes.append(span["size"])
                                 colors.append(span["color"])
                         
-                        block_text = block_text.strip()
+                        block_text = " ".join(span_texts).strip()
                         if not block_text:
                             continue
                         
-                        # 转换颜色格式
-                        color = colors[0] if colors else 0
-                        rgb_color = PDFService.rgb_to_color(color)
-                        
-                        block_info = {
-                            "text": block_text,
-                            "rect": list(block["bbox"]),
-                            "size": max(set(sizes), key=sizes.count) if sizes else 12,
-                            "color": rgb_color,
-                            "original_font": font_info[0] if font_info else "Helvetica"
-                        }
-                        text_blocks.append((page_num + 1, block_info))
+                        blocks.append(TextBlock(
+                            block_text,
+                            tuple(block["bbox"]),
+                            max(set(sizes), key=sizes.count) if sizes else 12,
+                            colors[0] if colors else 0,
+                            font_info[0] if font_info else "Helvetica"
+                        ))
+                
+                layouts.append(PageLayout(page_num + 1, redact_rects, blocks))
             
             doc.close()
-            return text_blocks
+            return layouts
         except Exception as e:
             raise Exception(f"PDF text extraction failed: {str(e)}")
 
     @staticmethod
     async def create_translated_pdf(
         original_path: str,
-        translated_blocks: List[Tuple[int, Dict]],
+        layouts: List[PageLayout],
+        output_path: str
+    ):
+        """根据带译文的排版信息创建翻译后的PDF文件，保持原有格式；页数较多且有多个 CPU 核时按页分片并行渲染"""
+        page_count = await PDFService.page_count(original_path)
+        if shard_workers() <= 1 or page_count < settings.PDF_SHARD_MIN_PAGES:
+            await run_pdf_task(
+                PDFService._create_translated_pdf_sync,
+                original_path,
+                layouts,
+                output_path
+            )
+            return
+
+        shard_pages = max(1, settings.PDF_SHARD_PAGES)
+        shards = []
+        for index, start in enumerate(range(0, page_count, shard_pages)):
+            end = min(start + shard_pages, page_count)
+            shard_layouts = [layout for layout in layouts if start < layout.page_num <= end]
+            shards.append((start, end, shard_layouts, f"{output_path}.part{index}"))
+
+        try:
+            shard_chars = await asyncio.gather(*(
+                run_pdf_task(PDFService._render_shard_sync, original_path, start, end, shard_layouts, shard_path)
+                for start, end, shard_layouts, shard_path in shards
+            ))
+            await run_pdf_task(
+                PDFService._stitch_shards_sync,
+                original_path,
+                [shard_path for _, _, _, shard_path in shards],
+                output_path,
+                "".join(shard_chars)
+            )
+        finally:
+            for _, _, _, shard_path in shards:
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+
+    @staticmethod
+    async def render_shard(
+        original_path: str,
+        start: int,
+        end: int,
+        layouts: List[PageLayout],
+        shard_path: str
+    ) -> str:
+        """渲染 [start, end) 页到分片文件，返回写入的译文用到的字符"""
+        return await run_pdf_task(PDFService._render_shard_sync, original_path, start, end, layouts, shard_path)
+
+    @staticmethod
+    async def stitch_shards(
+        original_path: str,
+        shard_paths: List[str],
+        output_path: str,
+        chars: Optional[str] = None,
+        copy_outline: bool = True
+    ):
+        """合并分片；chars 为各分片 render_shard 返回的字符，为 None 时从合并后的页面中提取"""
+        await run_pdf_task(PDFService._stitch_shards_sync, original_path, shard_paths, output_path, chars, copy_outline)
+
+    @staticmethod
+    async def page_count(file_path: str) -> int:
+        return await run_pdf_task(PDFService._page_count_sync, file_path)
+
+    @staticmethod
+    def _page_count_sync(file_path: str) -> int:
+        doc = fitz.open(file_path)
+        try:
+            return doc.page_count
+        finally:
+            doc.close()
+
+    @staticmethod
+    def _create_translated_pdf_sync(
+        original_path: str,
+        layouts: List[PageLayout],
         output_path: str
     ):
-        """创建翻译后的PDF文件，保持原有格式"""
         try:
             doc = fitz.open(original_path)
-            
-            # 删除原文本
+            page_layouts = {layout.page_num: layout for layout in layouts}
+            fontname, fontbuffer = PDFService.prepare_font(layouts)
             for page in doc:
-                text_dict = page.get_text("dict")
-                for block in text_dict["blocks"]:
-                    if block["type"] == 0:
-                        rect = fitz.Rect(block["bbox"])
-                        page.add_redact_annot(rect, fill=(1, 1, 1))
-                page.apply_redactions()
-                page.clean_contents()
-            
-            # 写入翻译后的文本
-            for page_num, block_info in translated_blocks:
-                page = doc[page_num - 1]
-                rect = fitz.Rect(block_info["rect"])
-                text = block_info["text"]
-                
-                if not text or not text.strip():
-                    continue
-                    
-                try:
-                    font_size = block_info["size"]
-                    rect_height = rect.height
-                    rect_width = rect.width
-                    is_vertical = rect_height / rect_width > 10
-                    
-                    # 使用内置中文字体
-                    font_name = "china-s"
-                    
-                    if is_vertical:
-                        # 垂直文本
-                        page.insert_text(
-                            point=(rect.x1, rect.y0),
-                            text=text,
-                            fontname=font_name,
-                            fontsize=font_size,
-                            color=block_info["color"],
-                            rotate=90
-                        )
-                    else:
-                        # 水平文本，自动调整大小
-                        while True:
-                            try:
-                                rc = page.insert_textbox(
-                                    rect,
-                                    text,
-                                    fontname=font_name,
-                                    fontsize=font_size,
-                                    color=block_info["color"],
-                                    align=fitz.TEXT_ALIGN_LEFT
-                                )
-                                if rc >= 0:
-                                    break
-                                font_size *= 0.95
-                                if font_size < 4:
-                                    print(f"Text too long to fit: {text[:50]}...")
-                                    break
-                            except Exception as e:
-                                print(f"Write failed, trying smaller font: {str(e)}")
-                                font_size *= 0.95
-                                if font_size < 4:
-                                    break
-                                
-                except Exception as e:
-                    print(f"Failed to process text block: {str(e)}, text: {text[:50]}...")
-                    continue
-            
+                PDFService.render_page(page, page_layouts.get(page.number + 1), fontname, fontbuffer)
+
             # 保存文件
             doc.save(output_path, clean=True, garbage=4, deflate=True, pretty=False)
             doc.close()
-            
+
+        except Exception as e:
+            raise Exception(f"Failed to create translated PDF: {str(e)}")
+
+    @staticmethod
+    def _render_shard_sync(
+        original_path: str,
+        start: int,
+        end: int,
+        layouts: List[PageLayout],
+        shard_path: str
+    ) -> str:
+        """渲染 [start, end) 页并保存为独立的分片文件，返回译文用到的字符（去重），合并时据此生成字体子集"""
+        try:
+            doc = fitz.open(original_path)
+            doc.select(list(range(start, end)))
+            page_layouts = {layout.page_num: layout for layout in layouts}
+            fontname, fontbuffer = PDFService.prepare_font(layouts, subset=False)
+            for page in doc:
+                PDFService.render_page(page, page_layouts.get(start + page.number + 1), fontname, fontbuffer)
+            # 分片只是中间文件，最终保存时统一压缩和清理；
+            # 先写临时文件再改名，读取方不会看到写了一半的分片
+            doc.save(shard_path + ".tmp")
+            doc.close()
+            os.replace(shard_path + ".tmp", shard_path)
+            return "".join({char for layout in layouts for block in layout.blocks for char in block.text})
+        except Exception as e:
+            raise Exception(f"Failed to render pages {start + 1}-{end}: {str(e)}")
+
+    @staticmethod
+    def _stitch_shards_sync(
+        original_path: str,
+        shard_paths: List[str],
+        output_path: str,
+        chars: Optional[str] = None,
+        copy_outline: bool = True
+    ):
+        """按顺序合并分片并一次性保存，同时保留原文档的元数据和目录"""
+        try:
+            original = fitz.open(original_path)
+            doc = fitz.open()
+            for shard_path in shard_paths:
+                shard = fitz.open(shard_path)
+                doc.insert_pdf(shard)
+                shard.close()
+            if settings.PDF_EMBED_FONT:
+                if chars is None:
+                    # 其他字体的字符只会让子集略大
+                    chars = "".join({char for page in doc for char in page.get_text()})
+                PDFService._share_embedded_font(doc, chars)
+            doc.set_metadata(original.metadata)
+            # 只合并了部分页面时，目录可能指向不存在的页
+            toc = original.get_toc(simple=False) if copy_outline else []
+            if toc:
+                doc.set_toc(toc)
+            original.close()
+
+            doc.save(output_path, clean=True, garbage=4, deflate=True, pretty=False)
+            doc.close()
         except Exception as e:
-            raise Exception(f"Failed to create translated PDF: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to create translated PDF: {str(e)}")
+
+    @staticmethod
+    def _share_embedded_font(doc: fitz.Document, chars: str):
+        """让所有页面共用一个译文字体对象，并按 chars 只生成一个子集
+
+        分片嵌入的都是完整字体，页面内容按完整字体的字形编号写入，无需改写：
+        TrueType 字体生成重新编号的子集并通过 CIDToGIDMap 映射，其他字体生成保留原字形编号的子集。
+        其余分片的字体对象不再被引用，保存时由 garbage 清除。
+        """
+        font = get_embedded_font()
+        xrefs = sorted({entry[0] for page in doc for entry in page.get_fonts() if entry[4] == font.name})
+        if not xrefs:
+            return
+        shared = xrefs[0]
+        descendant = PDFService._xref_key(doc, shared, "DescendantFonts")
+        descriptor = PDFService._xref_key(doc, descendant, "FontDescriptor")
+        for key in ("FontFile2", "FontFile3", "FontFile"):
+            if doc.xref_get_key(descriptor, key)[0] != "null":
+                break
+        else:
+            raise ValueError(f"font descriptor {descriptor} has no embedded font file")
+        fontfile = PDFService._xref_key(doc, descriptor, key)
+
+        doc.xref_set_key(descendant, "W", font.widths(chars))
+        mapped = None
+        if key == "FontFile2" and doc.xref_get_key(descendant, "Subtype") == ("name", "/CIDFontType2"):
+            mapped = font.subset_with_cid_map(chars)
+        if mapped is not None:
+            data, cid_map = mapped
+            cid_map_xref = doc.get_new_xref()
+            doc.update_object(cid_map_xref, "<<>>")
+            doc.update_stream(cid_map_xref, cid_map, new=True)
+            doc.xref_set_key(descendant, "CIDToGIDMap", f"{cid_map_xref} 0 R")
+        else:
+            data = font.subset(chars, retain_gids=True)
+        doc.update_stream(fontfile, data)
+        if key == "FontFile2":
+            doc.xref_set_key(fontfile, "Length1", str(len(data)))
+
+        shared_object = doc.xref_object(shared, compressed=True)
+        for xref in xrefs[1:]:
+            doc.update_object(xref, shared_object)
+
+    @staticmethod
+    def _xref_key(doc: fitz.Document, xref: int, key: str) -> int:
+        """返回对象 xref 中 key 引用的对象编号（允许是只含一个引用的数组），不是间接引用时抛出 ValueError"""
+        kind, value = doc.xref_get_key(xref, key)
+        match = re.fullmatch(r"\[?\s*(\d+) 0 R\s*\]?", value)
+        if kind not in ("xref", "array") or match is None:
+            raise ValueError(f"/{key} of object {xref} is not a single indirect reference: {kind} {value}")
+        return int(match.group(1))
+
+    @staticmethod
+    def render_page(
+        page: fitz.Page,
+        layout: Optional[PageLayout],
+        fontname: str = BUILTIN_FONT_NAME,
+        fontbuffer: Optional[bytes] = None
+    ):
+        """删除页面原文本并写入翻译后的文本块；传入 fontbuffer 时嵌入该字体"""
+        # 删除原文本：优先复用提取阶段记录的文本区域，没有排版信息时才重新解析页面
+        if layout is not None:
+            for bbox in layout.iter_redact_rects():
+                page.add_redact_annot(fitz.Rect(bbox), fill=(1, 1, 1))
+        else:
+            text_dict = page.get_text("dict")
+            for block in text_dict["blocks"]:
+                if block["type"] == 0:
+                    rect = fitz.Rect(block["bbox"])
+                    page.add_redact_annot(rect, fill=(1, 1, 1))
+        page.apply_redactions()
+        page.clean_contents()
+        if layout is None or not layout.blocks:
+            return
+
+        # 同一份字体数据在文档内只嵌入一次，各页共享
+        font = None
+        if fontbuffer is not None:
+            page.insert_font(fontname=fontname, fontbuffer=fontbuffer)
+            font = get_embedded_font().font
+        fitter = get_text_fitter(fontname, font)
+
+        # 写入翻译后的文本
+        for block in layout.blocks:
+            rect = fitz.Rect(block.rect)
+            text = block.text
+            color = PDFService.rgb_to_color(block.color)
+
+            if not text or not text.strip():
+                continue
+
+            try:
+                font_size = block.size
+                rect_height = rect.height
+                rect_width = rect.width
+                is_vertical = rect_height / rect_width > 10
+
+                if is_vertical:
+                    # 垂直文本
+                    page.insert_text(
+                        point=(rect.x1, rect.y0),
+                        text=text,
+                        fontname=fontname,
+                        fontsize=font_size,
+                        color=color,
+                        rotate=90
+                    )
+                else:
+                    # 水平文本：测量并断行后以能放下的最大字号一次写入
+                    if fitter.write(page, rect, text, font_size, color) is None:
+                        logger.warning("Text too long to fit: %s...", text[:50])
+
+            except Exception as e:
+                logger.warning("Failed to process text block: %s, text: %s...", e, text[:50])
+                continue
@@ -0,0 +1,101 @@
+from functools import lru_cache
+from typing import List
+import logging
+import math
+import re
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# CJK 统一表意文字、假名与谚文，大致按一个字符一个 token 估算
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+# 句子边界：西文标点后的空白，或中日文句末标点之后
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+|(?<=[。！？；])\s*")
+# 译文按字符连续书写、片段之间不加空格的语言
+UNSPACED_LANGUAGES = {"zh", "ja", "th"}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：CJK 字符按 1 个计，其余字符按 4 个 1 token 计"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """按模型加载 tiktoken 编码；未安装或加载失败时返回 None，改用估算"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Failed to load tiktoken encoding, estimating token counts instead: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """计算文本的 token 数：安装了 tiktoken 时精确计算，否则估算"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def output_token_limit(text: str) -> int:
+    """翻译请求的 max_tokens：译文（尤其是 JSON 转义或译成中文后）通常比原文长，预留足够的输出空间"""
+    return min(settings.TRANSLATION_MAX_OUTPUT_TOKENS, count_tokens(text) * 2 + 200)
+
+
+def _split_words(text: str, budget: int) -> List[str]:
+    """单个句子超出预算时按空白断开，没有空白（如中文长句）时按字符数硬切"""
+    words = text.split()
+    if len(words) <= 1:
+        # 按整句的平均每 token 字符数折算每片长度
+        step = max(1, len(text) * budget // max(1, count_tokens(text)))
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    return _pack(words, budget, " ")
+
+
+def _pack(parts: List[str], budget: int, separator: str) -> List[str]:
+    """按 token 预算贪心合并相邻片段"""
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for part in parts:
+        tokens = count_tokens(part)
+        if tokens > budget:
+            if current:
+                pieces.append(separator.join(current))
+                current, current_tokens = [], 0
+            pieces.extend(_split_words(part, budget))
+            continue
+        if current and current_tokens + tokens > budget:
+            pieces.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        pieces.append(separator.join(current))
+    return pieces
+
+
+def split_text(text: str, budget: int) -> List[str]:
+    """将超出 token 预算的文本在句子边界处切分，每片不超过预算；未超出时原样返回"""
+    if budget <= 0 or count_tokens(text) <= budget:
+        return [text]
+    sentences = [sentence for sentence in SENTENCE_PATTERN.split(text) if sentence]
+    # 中日文句子之间原本没有空格，拼接时也不加
+    separator = "" if CJK_PATTERN.search(text) and " " not in text else " "
+    return _pack(sentences, budget, separator)
+
+
+def join_pieces(pieces: List[str], target_language: str) -> str:
+    """按顺序拼接分片的译文"""
+    language = re.split(r"[-_]", target_language.lower(), maxsplit=1)[0]
+    separator = "" if language in UNSPACED_LANGUAGES else " "
+    return separator.join(piece.strip() for piece in pieces)
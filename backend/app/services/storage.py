@@ -1,36 +1,145 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from ..config import settings
+import asyncio
+import logging
 import os
+import shutil
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
 
 class StorageService:
+    """R2（S3 兼容）存储；boto3 调用都是阻塞的，统一放到有界线程池中执行"""
+
     def __init__(self):
         self.s3 = boto3.client(
             's3',
-            endpoint_url=f'https://{settings.CLOUDFLARE_ACCOUNT_ID}.r2.cloudflarestorage.com',
+            endpoint_url=settings.R2_ENDPOINT_URL or f'https://{settings.CLOUDFLARE_ACCOUNT_ID}.r2.cloudflarestorage.com',
             aws_access_key_id=settings.CLOUDFLARE_ACCESS_KEY_ID,
             aws_secret_access_key=settings.CLOUDFLARE_ACCESS_KEY_SECRET,
-            config=Config(signature_version='v4'),
+            config=Config(
+                signature_version='v4',
+                # 连接池需容纳所有上传线程及其分片线程
+                max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+            ),
         )
         self.bucket = settings.R2_BUCKET_NAME
+        # 大文件按分片并行上传
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=settings.STORAGE_MULTIPART_CHUNK_MB * MB,
+            max_concurrency=settings.STORAGE_MULTIPART_CONCURRENCY,
+            use_threads=True,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_WORKERS,
+            thread_name_prefix="storage"
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
 
     async def upload_file(self, file_path: str, object_name: str) -> str:
         """Upload file to R2 storage"""
         try:
-            self.s3.upload_file(file_path, self.bucket, object_name)
-            url = self.s3.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket, 'Key': object_name},
-                ExpiresIn=3600 * 24
+            await self._run(
+                self.s3.upload_file,
+                file_path,
+                self.bucket,
+                object_name,
+                Config=self.transfer_config
             )
-            print(f"Generated presigned URL: {url}")
-            return url
+            return await self.presign_url(object_name)
         except Exception as e:
             raise Exception(f"File upload failed: {str(e)}")
 
+    async def presign_url(self, object_name: str) -> str:
+        """生成对象的临时下载链接"""
+        url = await self._run(
+            self.s3.generate_presigned_url,
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': object_name},
+            ExpiresIn=settings.STORAGE_URL_EXPIRES
+        )
+        logger.debug("Generated presigned URL for %s", object_name)
+        return url
+
     async def download_file(self, object_name: str, file_path: str):
         """Download file from R2 storage"""
         try:
-            self.s3.download_file(self.bucket, object_name, file_path)
+            await self._run(
+                self.s3.download_file,
+                self.bucket,
+                object_name,
+                file_path,
+                Config=self.transfer_config
+            )
         except Exception as e:
-            raise Exception(f"File download failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"File download failed: {str(e)}")
+
+
+class LocalStorageService:
+    """本地文件系统存储，无需 R2 即可运行完整流程；文件通过 API 的 /files 路由下载"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def local_path(self, object_name: str) -> str:
+        """返回对象在本地的路径，拒绝跳出存储目录的对象名"""
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, object_name))
+        if os.path.commonpath([root, path]) != root or path == root:
+            raise ValueError(f"Invalid object name: {object_name}")
+        return path
+
+    @staticmethod
+    def _copy(source: str, target: str):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        shutil.copyfile(source, target + ".tmp")
+        os.replace(target + ".tmp", target)
+
+    async def upload_file(self, file_path: str, object_name: str) -> str:
+        try:
+            await asyncio.to_thread(self._copy, file_path, self.local_path(object_name))
+            return await self.presign_url(object_name)
+        except Exception as e:
+            raise Exception(f"File upload failed: {str(e)}")
+
+    async def presign_url(self, object_name: str) -> str:
+        return f"{settings.PUBLIC_BASE_URL}{settings.API_PREFIX}/files/{quote(object_name)}"
+
+    async def download_file(self, object_name: str, file_path: str):
+        try:
+            await asyncio.to_thread(self._copy, self.local_path(object_name), file_path)
+        except Exception as e:
+            raise Exception(f"File download failed: {str(e)}")
+
+
+def create_storage_service():
+    """根据配置创建存储服务"""
+    if settings.STORAGE_BACKEND == "r2":
+        return StorageService()
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorageService(settings.LOCAL_STORAGE_DIR)
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+
+
+_storage_service = None
+
+
+def get_storage_service():
+    """返回本进程共享的存储服务，首次使用时按配置创建"""
+    global _storage_service
+    if _storage_service is None:
+        _storage_service = create_storage_service()
+    return _storage_service
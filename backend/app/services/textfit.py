@@ -0,0 +1,165 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+import fitz
+
+# PyMuPDF 内置的 CJK 字体不嵌入字形，阅读器按默认宽度 1em 显示每个字符
+CJK_BUILTIN_FONTS = {"china-s", "china-ss", "china-t", "china-ts", "japan", "japan-s", "korea", "korea-s"}
+
+# 断行单位：换行符、空白、单个 CJK 字符（可在任意字符间断行）、连续的非 CJK 字符（单词）
+_CJK_CHARS = "\u2e80-\u2fff\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+TOKEN_PATTERN = re.compile(rf"\n|[ \t]+|[{_CJK_CHARS}]|[^\s{_CJK_CHARS}]+")
+
+# 不能出现在行首的标点，断行时与前一个单位绑定
+NO_LINE_START = set("，。、；：！？）」』】》〉”’%,.;:!?)]}")
+
+
+class TextFitter:
+    """按字体测量文本宽度，自行断行并二分查找能放入矩形的最大字号
+
+    字宽与字号成正比，因此每种字体只缓存字号为 1 时的字形宽度，
+    任意字号下的宽度由缓存值乘以字号得到。
+    """
+
+    MIN_FONT_SIZE = 4.0
+    # 二分查找的字号精度（pt）
+    SIZE_PRECISION = 0.1
+
+    def __init__(self, fontname: str, font: Optional[fitz.Font] = None):
+        self.fontname = fontname
+        # 嵌入字体按名称无法加载，由调用方传入
+        self.font = font or fitz.Font(fontname)
+        self.ascender = self.font.ascender
+        # 与 insert_text 的默认行距一致
+        self.line_height = self.font.ascender - self.font.descender
+        self._fixed_width = 1.0 if fontname in CJK_BUILTIN_FONTS else None
+        self._widths: Dict[str, float] = {}
+
+    def char_width(self, char: str) -> float:
+        width = self._widths.get(char)
+        if width is None:
+            width = self._fixed_width or self.font.text_length(char, fontsize=1)
+            self._widths[char] = width
+        return width
+
+    def text_width(self, text: str) -> float:
+        """字号为 1 时的文本宽度"""
+        return sum(self.char_width(char) for char in text)
+
+    def tokenize(self, text: str) -> List[Tuple[str, float]]:
+        """拆分为断行单位及其宽度，行首禁用的标点并入前一个单位"""
+        tokens: List[Tuple[str, float]] = []
+        for match in TOKEN_PATTERN.finditer(text):
+            token = match.group()
+            width = 0.0 if token == "\n" else self.text_width(token)
+            if (
+                token in NO_LINE_START
+                and tokens
+                and tokens[-1][0] != "\n"
+                and not tokens[-1][0].isspace()
+            ):
+                previous, previous_width = tokens[-1]
+                tokens[-1] = (previous + token, previous_width + width)
+            else:
+                tokens.append((token, width))
+        return tokens
+
+    def wrap(self, tokens: Sequence[Tuple[str, float]], max_width: float) -> List[str]:
+        """按字号为 1 时的行宽 max_width 贪心断行"""
+        lines: List[str] = []
+        line = ""
+        line_width = 0.0
+        for token, width in tokens:
+            if token == "\n":
+                lines.append(line.rstrip())
+                line, line_width = "", 0.0
+                continue
+            if token.isspace():
+                # 行首空白丢弃，行尾空白在换行时去掉
+                if line:
+                    line += token
+                    line_width += width
+                continue
+            if line and line_width + width > max_width:
+                lines.append(line.rstrip())
+                line, line_width = "", 0.0
+            if width > max_width:
+                # 单词比整行还宽时按字符拆开
+                for char in token:
+                    char_width = self.char_width(char)
+                    if line and line_width + char_width > max_width:
+                        lines.append(line)
+                        line, line_width = "", 0.0
+                    line += char
+                    line_width += char_width
+            else:
+                line += token
+                line_width += width
+        if line.strip():
+            lines.append(line.rstrip())
+        return lines
+
+    def fit(
+        self,
+        text: str,
+        rect: fitz.Rect,
+        max_size: float
+    ) -> Optional[Tuple[float, List[str]]]:
+        """返回能放入 rect 的最大字号及对应的分行结果，最小字号也放不下时返回 None"""
+        tokens = self.tokenize(text)
+
+        def layout(size: float) -> Optional[List[str]]:
+            lines = self.wrap(tokens, rect.width / size)
+            if len(lines) * self.line_height * size <= rect.height:
+                return lines
+            return None
+
+        lines = layout(max_size)
+        if lines is not None:
+            return max_size, lines
+
+        low, high = self.MIN_FONT_SIZE, max_size
+        best = layout(low)
+        if best is None:
+            return None
+        best_size = low
+        while high - low > self.SIZE_PRECISION:
+            size = (low + high) / 2
+            lines = layout(size)
+            if lines is None:
+                high = size
+            else:
+                low, best_size, best = size, size, lines
+        return best_size, best
+
+    def write(
+        self,
+        page: fitz.Page,
+        rect: fitz.Rect,
+        text: str,
+        max_size: float,
+        color: Sequence[float]
+    ) -> Optional[float]:
+        """将文本以能放下的最大字号一次性写入 rect，返回所用字号，放不下时返回 None"""
+        fitted = self.fit(text, rect, max_size)
+        if fitted is None:
+            return None
+        size, lines = fitted
+        page.insert_text(
+            (rect.x0, rect.y0 + self.ascender * size),
+            "\n".join(lines),
+            fontname=self.fontname,
+            fontsize=size,
+            color=color
+        )
+        return size
+
+
+_fitters: Dict[str, TextFitter] = {}
+
+
+def get_text_fitter(fontname: str, font: Optional[fitz.Font] = None) -> TextFitter:
+    """返回进程内按字体共享的 TextFitter，字宽缓存跨页面和任务复用"""
+    fitter = _fitters.get(fontname)
+    if fitter is None:
+        fitter = _fitters[fontname] = TextFitter(fontname, font)
+    return fitter
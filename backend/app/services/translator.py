@@ -1,17 +1,100 @@
-from openai import AsyncOpenAI
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional, Callable, Awaitable, TypeVar
 import asyncio
+import hashlib
+import json
+import logging
+import random
 from ..config import settings
+from .. import metrics
+from .cache import TranslationCache, get_translation_cache
+from .checkpoint import TranslationCheckpoint
+from .engines import get_engine_router, is_fatal, is_rate_limited, is_retryable
+from .layout import TextBlock
+from .segmenter import count_tokens, join_pieces, output_token_limit, split_text
 import os
 
 # os.environ["http_proxy"] = "http://127.0.0.1:7890"
 # os.environ["https_proxy"] = "http://127.0.0.1:7890"
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def retry_delay(attempt: int) -> float:
+    """第 attempt 次重试前的等待时间：指数退避并加随机抖动，避免大量请求同时重试"""
+    delay = min(
+        settings.TRANSLATION_RETRY_MAX_BACKOFF,
+        settings.TRANSLATION_RETRY_BACKOFF * 2 ** (attempt - 1)
+    )
+    return random.uniform(delay / 2, delay)
+
+
+async def gather_or_cancel(*aws: Awaitable):
+    """并发执行，任一失败时取消其余的并抛出该异常，不留下仍在运行的任务"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AdaptiveLimiter:
+    """可动态调整上限的并发限制器：遇到限流时减半，连续成功后逐步恢复
+
+    进入时返回当前的调整轮次（epoch）；上次下调之前发出的请求再遇到限流不会重复下调，
+    避免同一波并发请求一起返回 429 时把上限一路减到最小。
+    """
+
+    def __init__(self, limit: int, min_limit: int = 1):
+        self.max_limit = max(1, limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.epoch = 0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            return self.epoch
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def on_success(self):
+        """每完成 limit 个请求且未再触发限流时，上限加一"""
+        async with self._cond:
+            self._successes += 1
+            if self.limit < self.max_limit and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    async def on_rate_limit(self, epoch: Optional[int] = None):
+        """触发限流时将上限减半；epoch 为请求发出时的轮次，早于上次下调的请求不再下调"""
+        async with self._cond:
+            self._successes = 0
+            if epoch is not None and epoch < self.epoch:
+                return
+            self.epoch += 1
+            new_limit = max(self.min_limit, self.limit // 2)
+            if new_limit < self.limit:
+                logger.warning("Rate limited, lowering concurrency %d -> %d", self.limit, new_limit)
+                self.limit = new_limit
 
 class TranslatorService:
-    TRANSLATION_PROMPT = """
-        You are a senior translator, and your goal is to help users translate specified text content into Chinese.
+    # 修改提示词后需要递增，使旧的翻译缓存失效
+    PROMPT_VERSION = "2"
+
+    TRANSLATION_GUIDELINES = """
         You must meet the following requirements:
         - If the text content to be translated is empty, no output is required. Please do not output any apologies or descriptions.
         - Below are some aspects to consider when translating to ensure accuracy.
@@ -24,55 +107,382 @@ class TranslatorService:
             - "Sentence Structure": Different languages have very different sentence structures, especially Chinese and English. These differences need to be understood when translating.
             - "Professional Knowledge": If the original text involves specific professional knowledge, you may need to combine relevant professional knowledge to ensure accuracy.
             - "Format": The translation needs to maintain the format of the original text, including paragraphs, titles, lists, etc.
-        Below is the specified text content to be translated. You don't need to return the original text, no explanations or descriptions are needed, just provide the final translation result.
-        {text}
         """
 
+    TRANSLATION_PROMPT = """
+        You are a senior translator, and your goal is to help users translate specified text content into Chinese.
+        """ + TRANSLATION_GUIDELINES + """
+        The user message is the text content to be translated. You don't need to return the original text, no explanations or descriptions are needed, just provide the final translation result.
+        """
+
+    BATCH_TRANSLATION_PROMPT = """
+        You are a senior translator, and your goal is to help users translate specified text content into Chinese.
+        """ + TRANSLATION_GUIDELINES + """
+        The user message is a JSON array of strings, each string being an independent text block from the same document.
+        Translate every element and return ONLY a JSON array of strings with exactly the same number of elements in the same order.
+        Do not merge, split, drop or reorder elements, and do not wrap the array in any explanation.
+        """
+
+    @staticmethod
+    def cache_key(text: str, target_language: str) -> str:
+        return TranslationCache.make_key(
+            text,
+            target_language,
+            get_engine_router().primary.model,
+            TranslatorService.PROMPT_VERSION
+        )
+
+    @staticmethod
+    def document_key(file_hash: str, target_language: str) -> str:
+        """整份文档的去重键：源文件内容、目标语言、模型或提示词任一变化都会重新翻译"""
+        raw = "\x1f".join([file_hash, target_language, get_engine_router().primary.model, TranslatorService.PROMPT_VERSION])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
     @staticmethod
     async def translate_text(text: str, target_language: str) -> str:
-        """翻译单个文本块"""
+        """翻译单个文本块，优先使用翻译缓存"""
+        cache = get_translation_cache()
+        if cache is None:
+            value, _ = await TranslatorService._request_text(text, target_language)
+            return value
+        return await cache.get_or_translate(
+            TranslatorService.cache_key(text, target_language),
+            lambda: TranslatorService._request_text(text, target_language)
+        )
+
+    @staticmethod
+    async def _create_completion(kind: str, messages: List[Dict[str, str]], max_tokens: int) -> Tuple[str, bool]:
+        """通过引擎路由发起请求：主引擎超时或变慢时对冲，失败时改用备用引擎
+
+        返回结果及其是否来自主引擎：缓存、断点与文档去重都以主引擎的模型为键，
+        备用引擎的结果不能写入。
+        """
+        router = get_engine_router()
+        content, engine = await router.complete(kind, messages, max_tokens, temperature=0.3)
+        return content, engine is router.primary
+
+    @staticmethod
+    async def _request_text(text: str, target_language: str) -> Tuple[str, bool]:
+        """调用 API 翻译单个文本块，返回译文及其是否来自主引擎"""
         try:
-            prompt = TranslatorService.TRANSLATION_PROMPT.format(text=text)
-            response = await client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            content, primary = await TranslatorService._create_completion(
+                "single",
                 messages=[
-                    {"role": "system", "content": prompt},
+                    {"role": "system", "content": TranslatorService.TRANSLATION_PROMPT},
                     {"role": "user", "content": text}
                 ],
-                temperature=0.3,
-                max_tokens=1500
+                max_tokens=output_token_limit(text)
+            )
+            return content.strip(), primary
+        except Exception as e:
+            raise Exception(f"翻译引擎调用失败: {str(e)}") from e
+
+    @staticmethod
+    def parse_batch_response(content: str, expected: int) -> Optional[List[str]]:
+        """解析批量翻译返回的 JSON 数组，数量不符或格式错误时返回 None"""
+        start = content.find("[")
+        end = content.rfind("]")
+        if start < 0 or end <= start:
+            return None
+        try:
+            items = json.loads(content[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(items, list) or len(items) != expected:
+            return None
+        if not all(isinstance(item, str) for item in items):
+            return None
+        return [item.strip() for item in items]
+
+    @staticmethod
+    async def translate_batch(texts: List[str], target_language: str) -> Tuple[Optional[List[str]], bool]:
+        """在一次请求中翻译多个文本块，返回译文（数量与输入不一致时为 None）及其是否来自主引擎"""
+        try:
+            payload = json.dumps(texts, ensure_ascii=False)
+            content, primary = await TranslatorService._create_completion(
+                "batch",
+                messages=[
+                    {"role": "system", "content": TranslatorService.BATCH_TRANSLATION_PROMPT},
+                    {"role": "user", "content": payload}
+                ],
+                max_tokens=output_token_limit(payload)
             )
-            return response.choices[0].message.content.strip()
         except Exception as e:
-            raise Exception(f"OpenAI API 调用失败: {str(e)}")
+            raise Exception(f"翻译引擎调用失败: {str(e)}") from e
+        return TranslatorService.parse_batch_response(content, len(texts)), primary
+
+    @staticmethod
+    def pack_batches(texts: List[str], token_budget: int, max_blocks: int) -> List[List[int]]:
+        """按 token 预算将相邻文本块打包，返回每批的下标列表"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if current and (current_tokens + tokens > token_budget or len(current) >= max_blocks):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    async def _call_limited(
+        limiter: AdaptiveLimiter,
+        call: Callable[[], Awaitable[T]]
+    ) -> T:
+        """在并发限制下发起一次请求，临时错误按指数退避重试，限流时同时下调并发"""
+        attempt = 0
+        while True:
+            epoch = None
+            try:
+                async with limiter as epoch:
+                    result = await call()
+                await limiter.on_success()
+                return result
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                if rate_limited:
+                    await limiter.on_rate_limit(epoch)
+                if not is_retryable(e) or attempt >= settings.TRANSLATION_RETRIES:
+                    raise
+                attempt += 1
+                metrics.LLM_RETRIES.inc(reason="rate_limited" if rate_limited else "transient")
+                await asyncio.sleep(retry_delay(attempt))
 
     @staticmethod
     async def translate_blocks(
-        text_blocks: List[Tuple[int, Dict]],
+        text_blocks: List[Tuple[int, TextBlock]],
         target_language: str,
-        progress_callback = None
-    ) -> List[Tuple[int, Dict]]:
-        """翻译所有文本块"""
-        translated_blocks = []
-        total_blocks = len(text_blocks)
-        
-        for i, (page_num, block_info) in enumerate(text_blocks):
-            try:
-                translated_text = await TranslatorService.translate_text(
-                    block_info["text"], 
-                    target_language
+        progress_callback = None,
+        concurrency: Optional[int] = None,
+        checkpoint: Optional[TranslationCheckpoint] = None,
+        limiter: Optional[AdaptiveLimiter] = None
+    ) -> List[Tuple[int, TextBlock]]:
+        """并发翻译所有文本块，输出顺序与输入一致
+
+        超出 TRANSLATION_SPLIT_TOKENS 的文本块在句子边界处切分，各片单独并发请求后按顺序拼接。
+        传入 checkpoint 时先复用其中已有的译文，新的译文逐条写入断点；
+        重试后仍失败的文本块不再让整批失败，而是保留原文并立即计入 checkpoint.failed_blocks，
+        超过 checkpoint.max_failed_blocks 时提前结束。认证失败、额度用尽等影响所有请求的错误直接抛出。
+        备用引擎的译文只用于本次结果，不写入断点与翻译缓存，并计入 checkpoint.fallback_blocks。
+        同一任务分多次调用时传入共用的 limiter，并发上限与限流后的下调在各次调用之间保持。
+        """
+        # 以切分后的片段为翻译单位，owners 记录每个片段所属的文本块
+        texts: List[str] = []
+        owners: List[int] = []
+        spans: List[Tuple[int, int]] = []
+        split_units = set()
+        for index, (_, block) in enumerate(text_blocks):
+            pieces = split_text(block.text, settings.TRANSLATION_SPLIT_TOKENS)
+            if len(pieces) > 1:
+                split_units.update(range(len(texts), len(texts) + len(pieces)))
+                metrics.SPLIT_BLOCKS.inc()
+            spans.append((len(texts), len(texts) + len(pieces)))
+            texts.extend(pieces)
+            owners.extend([index] * len(pieces))
+        total_units = len(texts)
+        results: List[Optional[str]] = [None] * total_units
+        if limiter is None:
+            limiter = AdaptiveLimiter(
+                concurrency or settings.TRANSLATION_CONCURRENCY,
+                settings.TRANSLATION_MIN_CONCURRENCY
+            )
+        cache = get_translation_cache()
+        isolate_failures = checkpoint is not None
+        completed = 0
+        failed = 0
+        # 已有片段最终失败的文本块
+        failed_owners = set()
+
+        # 按缓存 key 合并相同内容：断点或缓存中已有的直接填充，其他任务正在翻译的等待其结果，
+        # 其余每个 key 只请求一次
+        groups: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = TranslatorService.cache_key(text, target_language) if cache or checkpoint else str(i)
+            groups.setdefault(key, []).append(i)
+
+        pending: List[Tuple[str, List[int]]] = []
+        waiting: List[Tuple[str, asyncio.Future, List[int]]] = []
+        unsaved = [key for key in groups if not checkpoint or checkpoint.get(key) is None]
+        # 一次批量查询所有断点中没有的 key
+        cached_values = await cache.get_many(unsaved) if cache and unsaved else {}
+        for key, indices in groups.items():
+            saved = checkpoint.get(key) if checkpoint else None
+            if saved is not None:
+                for i in indices:
+                    results[i] = saved
+                completed += len(indices)
+                continue
+            if cache is None:
+                pending.append((key, indices))
+                continue
+            if len(indices) > 1:
+                cache.deduplicated += len(indices) - 1
+                metrics.CACHE_LOOKUPS.inc(len(indices) - 1, result="deduplicated")
+            cached = cached_values.get(key)
+            if cached is not None:
+                for i in indices:
+                    results[i] = cached
+                completed += len(indices)
+                if checkpoint:
+                    checkpoint.record(key, cached)
+                continue
+            future = cache.begin(key)
+            if future is not None:
+                waiting.append((key, future, indices))
+            else:
+                pending.append((key, indices))
+
+        pending_texts = [texts[indices[0]] for _, indices in pending]
+        # 本次调用登记为在途、尚未结束的 key；结束后同一 key 可能已被其他任务重新登记，失败清理时不能再动
+        owned = {key for key, _ in pending} if cache else set()
+
+        def finish(key: str, value: Optional[str] = None, error: Optional[BaseException] = None, store: bool = True):
+            owned.discard(key)
+            cache.finish(key, value, error=error, store=store)
+
+        # 长文本块的片段各自单独请求并优先发出，缩短最慢文本块的等待时间
+        solo = [j for j, (_, indices) in enumerate(pending) if split_units.intersection(indices)]
+        packable = [j for j, (_, indices) in enumerate(pending) if not split_units.intersection(indices)]
+        if settings.TRANSLATION_BATCHING:
+            batches = [[j] for j in solo] + [
+                [packable[i] for i in batch]
+                for batch in TranslatorService.pack_batches(
+                    [pending_texts[j] for j in packable],
+                    settings.TRANSLATION_BATCH_TOKENS,
+                    settings.TRANSLATION_BATCH_MAX_BLOCKS
                 )
-                
-                # 创建新的block_info，保持原有格式信息
-                new_block_info = block_info.copy()
-                new_block_info["text"] = translated_text
-                translated_blocks.append((page_num, new_block_info))
-                
-                if progress_callback:
-                    progress = (i + 1) / total_blocks * 100
-                    await progress_callback(progress)
-                    
+            ]
+        else:
+            batches = [[j] for j in solo] + [[j] for j in packable]
+
+        async def report(key: str, indices: List[int], value: Optional[str], primary: bool = True):
+            nonlocal completed
+            if value is not None:
+                for i in indices:
+                    results[i] = value
+                if checkpoint and primary:
+                    checkpoint.record(key, value)
+                elif checkpoint:
+                    checkpoint.fallback_blocks += len({owners[i] for i in indices})
+            completed += len(indices)
+            if progress_callback:
+                progress = completed / total_units * 100
+                await progress_callback(progress)
+
+        async def report_failure(key: str, indices: List[int], error: BaseException):
+            page_num = text_blocks[owners[indices[0]]][0]
+            logger.warning(
+                "Leaving %d block(s) on page %d untranslated after retries: %s",
+                len(indices), page_num, error
+            )
+            await report(key, indices, None)
+            newly_failed = {owners[i] for i in indices} - failed_owners
+            failed_owners.update(newly_failed)
+            if newly_failed:
+                checkpoint.record_failure(len(newly_failed), error)
+
+        async def translate_one(text: str) -> Tuple[str, bool]:
+            return await TranslatorService._call_limited(
+                limiter,
+                lambda: TranslatorService._request_text(text, target_language)
+            )
+
+        def page_of(j: int) -> int:
+            return text_blocks[owners[pending[j][1][0]]][0]
+
+        async def translate_unit(j: int):
+            """单独翻译一个待翻译单位，完成后立即记录结果，使失败数超限时能尽早结束"""
+            key, indices = pending[j]
+            try:
+                value, primary = await translate_one(pending_texts[j])
             except Exception as e:
-                raise Exception(f"翻译第 {page_num} 页时失败: {str(e)}")
-        print(translated_blocks)  
-        return translated_blocks
\ No newline at end of file
+                if not isolate_failures or is_fatal(e):
+                    raise Exception(f"翻译第 {page_of(j)} 页时失败: {str(e)}") from e
+                if cache:
+                    finish(key, error=e)
+                await report_failure(key, indices, e)
+                return
+            if cache:
+                finish(key, value, store=primary)
+            await report(key, indices, value, primary)
+
+        async def worker(batch: List[int]):
+            values = None
+            primary = True
+            if len(batch) > 1:
+                batch_texts = [pending_texts[j] for j in batch]
+                try:
+                    values, primary = await TranslatorService._call_limited(
+                        limiter,
+                        lambda: TranslatorService.translate_batch(batch_texts, target_language)
+                    )
+                    if values is None:
+                        logger.warning(
+                            "Batch of %d blocks returned mismatched output, falling back to per-block requests",
+                            len(batch)
+                        )
+                        metrics.BATCH_FALLBACKS.inc()
+                except Exception as e:
+                    if not isolate_failures or is_fatal(e):
+                        raise Exception(f"翻译第 {page_of(batch[0])} 页时失败: {str(e)}") from e
+                    # 逐块重试，只有仍然失败的块保留原文
+                    logger.warning("Batch of %d blocks failed, retrying block by block: %s", len(batch), e)
+            if values is None:
+                await gather_or_cancel(*(translate_unit(j) for j in batch))
+                return
+            for j, value in zip(batch, values):
+                key, indices = pending[j]
+                if cache:
+                    finish(key, value, store=primary)
+                await report(key, indices, value, primary)
+
+        async def wait_inflight(key: str, future: asyncio.Future, indices: List[int]):
+            try:
+                value, stored = await asyncio.shield(future)
+            except Exception as e:
+                if isolate_failures and not is_fatal(e):
+                    await report_failure(key, indices, e)
+                    return
+                page_num = text_blocks[owners[indices[0]]][0]
+                raise Exception(f"翻译第 {page_num} 页时失败: {str(e)}") from e
+            await report(key, indices, value, stored)
+
+        if completed and progress_callback:
+            await progress_callback(completed / total_units * 100)
+
+        tasks = [asyncio.create_task(worker(batch)) for batch in batches]
+        tasks += [asyncio.create_task(wait_inflight(*item)) for item in waiting]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException as e:
+            # 任一块失败则取消其余请求
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if cache:
+                for key in list(owned):
+                    finish(key, error=e)
+            raise
+
+        translated_blocks = []
+        for (page_num, block), (start, end) in zip(text_blocks, spans):
+            values = results[start:end]
+            # 任一片段翻译失败时整块保留原文，避免译文与原文混杂
+            if any(value is None for value in values):
+                failed += 1
+                translated_blocks.append((page_num, block))
+                continue
+            translated_text = values[0] if len(values) == 1 else join_pieces(values, target_language)
+            # 创建新的文本块，保持原有格式信息
+            translated_blocks.append((page_num, block.with_text(translated_text)))
+        if cache:
+            await cache.flush()
+        if failed:
+            metrics.FAILED_BLOCKS.inc(failed)
+        metrics.TRANSLATED_BLOCKS.inc(len(text_blocks) - failed)
+        return translated_blocks
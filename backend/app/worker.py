@@ -0,0 +1,78 @@
+"""独立的翻译 worker：python -m app.worker
+
+与 API 进程共享任务存储和上传目录，可以独立于 API 扩缩容。
+API 进程可通过 RUN_EMBEDDED_WORKER=false 关闭内嵌的调度器。
+"""
+import asyncio
+import logging
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import settings, setup_logging
+from . import metrics
+from .scheduler import start_scheduler, stop_scheduler
+from .services.fonts import check_font
+from .services.job_store import get_job_store
+from .services.pdf import get_pdf_executor, shutdown_pdf_executor
+from .services.storage import get_storage_service
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """只提供 /metrics 的最小 HTTP 服务，worker 不运行 FastAPI"""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving metrics on port %d", port)
+    return server
+
+
+async def run():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    check_font()
+    get_job_store()
+    get_storage_service()
+    metrics_server = None
+    if settings.WORKER_METRICS_PORT:
+        metrics_server = start_metrics_server(settings.WORKER_METRICS_PORT)
+    get_pdf_executor()
+    start_scheduler()
+    logger.info("Worker started, concurrency %d", settings.JOB_CONCURRENCY)
+    await stop.wait()
+    logger.info("Worker stopping, waiting for running jobs")
+    await stop_scheduler()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+
+def main():
+    setup_logging()
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_pdf_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""端到端基准：合成 PDF + 本地 LLM 桩服务 + 本地存储，运行真实的 process_translation
+
+python -m benchmarks.e2e --pages 50 --blocks-per-page 12 --latency 0.3 --rate-limit 20
+python -m benchmarks.e2e --pages 50 --compare benchmarks/results/e2e-<commit>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from .synthetic import SAMPLE_TEXTS, make_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+
+class StageTimer:
+    """统计各阶段的调用次数、累计耗时，以及从首次开始到最后结束的时间跨度
+
+    流水线模式下各阶段相互重叠，累计耗时反映阶段自身的开销，时间跨度反映其在总耗时中的位置。
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = {}
+
+    def wrap(self, stage: str, func):
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                record = self.stages.setdefault(stage, {"calls": 0, "busy": 0.0, "first": started, "last": finished})
+                record["calls"] += 1
+                record["busy"] += finished - started
+                record["first"] = min(record["first"], started)
+                record["last"] = max(record["last"], finished)
+        return timed
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "calls": record["calls"],
+                "busy_seconds": round(record["busy"], 3),
+                "start_seconds": round(record["first"] - self.origin, 3),
+                "end_seconds": round(record["last"] - self.origin, 3),
+            }
+            for stage, record in self.stages.items()
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """在独立进程中启动 LLM 桩服务，避免其开销计入被测进程"""
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_llm",
+            "--port", str(port),
+            "--latency", str(args.latency),
+            "--jitter", str(args.jitter),
+            "--rate-limit", str(args.rate_limit),
+        ],
+        cwd=BACKEND_DIR,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("LLM stub server exited")
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("LLM stub server did not start")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure(args: argparse.Namespace, workdir: str, base_url: str):
+    """将所有状态指向临时目录和桩服务
+
+    .env 会在导入配置时覆盖环境变量，因此导入后再直接修改 settings；
+    任务存储与存储服务在首次使用时才按修改后的配置创建。
+    """
+    overrides = {
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": base_url,
+        "TRANSLATION_ENGINE": "openai",
+        "TRANSLATION_FALLBACK_ENGINE": "",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_DIR": os.path.join(workdir, "storage"),
+        "JOB_STORE": "sqlite",
+        "JOB_STORE_PATH": os.path.join(workdir, "jobs.db"),
+        "TRANSLATION_CACHE_ENABLED": args.cache,
+        "TRANSLATION_CACHE_PATH": os.path.join(workdir, "translation_memory.db"),
+        "TRANSLATION_CONCURRENCY": args.concurrency,
+        "TRANSLATION_BATCHING": args.batching,
+        "PIPELINE_ENABLED": args.pipeline,
+        "PDF_WORKERS": args.pdf_workers,
+    }
+    # PDF 进程池的子进程通过环境变量读取配置
+    os.environ.update({key: str(value) for key, value in overrides.items()})
+
+    from app.config import settings
+
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+
+def instrument(timer: StageTimer, counters: dict):
+    """在服务方法外包一层计时，返回恢复原方法的函数"""
+    from app.services.pdf import PDFService
+    from app.services.storage import get_storage_service
+    from app.services.translator import TranslatorService
+
+    async def count_blocks(text_blocks, *args, **kwargs):
+        counters["blocks"] += len(text_blocks)
+        return await translate_blocks(text_blocks, *args, **kwargs)
+
+    translate_blocks = TranslatorService.translate_blocks
+    patches = [
+        (TranslatorService, "translate_blocks", "translate", count_blocks),
+        (PDFService, "extract_layout", "extract", PDFService.extract_layout),
+        (PDFService, "render_shard", "render", PDFService.render_shard),
+        (PDFService, "create_translated_pdf", "render", PDFService.create_translated_pdf),
+        (PDFService, "stitch_shards", "stitch", PDFService.stitch_shards),
+    ]
+    originals = [(owner, name, owner.__dict__[name]) for owner, name, _, _ in patches]
+    for owner, name, stage, func in patches:
+        setattr(owner, name, staticmethod(timer.wrap(stage, func)))
+    storage = get_storage_service()
+    storage.upload_file = timer.wrap("upload", storage.upload_file)
+
+    def restore():
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+        del storage.upload_file
+    return restore
+
+
+async def run(args: argparse.Namespace, workdir: str) -> dict:
+    from app import pipeline
+    from app.models import JobStatus, TranslationJob
+    from app.config import settings
+    from app.services.job_store import get_job_store
+    from app.services.pdf import PDFService, shutdown_pdf_executor
+    from app.services.storage import get_storage_service
+
+    source = os.path.join(workdir, "source.pdf")
+    make_pdf(source, args.pages, args.blocks_per_page, seed=args.seed, language=args.language)
+
+    job = TranslationJob(
+        id="benchmark",
+        file_name="source.pdf",
+        source_language=args.language,
+        target_language=args.target_language,
+        status=JobStatus.PENDING,
+        page_count=args.pages,
+    )
+    file_path = pipeline.upload_path(job.id, job.file_name)
+    shutil.copyfile(source, file_path)
+    await get_job_store().save(job)
+
+    # 预先启动 PDF 进程，进程池启动时间不计入任务耗时
+    await asyncio.gather(*(PDFService.page_count(source) for _ in range(max(1, settings.PDF_WORKERS))))
+    timer = StageTimer()
+    counters = {"blocks": 0}
+    restore = instrument(timer, counters)
+    try:
+        started = time.perf_counter()
+        timer.origin = started
+        await pipeline.process_translation(job.id, file_path)
+        wall = time.perf_counter() - started
+    finally:
+        restore()
+        shutdown_pdf_executor()
+
+    job = await get_job_store().get(job.id)
+    if job.status != JobStatus.COMPLETED:
+        raise RuntimeError(f"Benchmark job {job.status}: {job.error}")
+    output_path = get_storage_service().local_path(job.result_key)
+    return {
+        "wall_seconds": round(wall, 3),
+        "pages": args.pages,
+        "blocks": counters["blocks"],
+        "pages_per_second": round(args.pages / wall, 3),
+        "blocks_per_second": round(counters["blocks"] / wall, 3),
+        "output_bytes": os.path.getsize(output_path),
+        "job_timings": job.timings,
+        "stages": timer.report(),
+    }
+
+
+def peak_rss_mib() -> dict:
+    """Linux 上 ru_maxrss 以 KiB 为单位；子进程为已退出的 PDF 进程中的最大值"""
+    return {
+        "main": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "pdf_workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(result: dict, baseline: dict):
+    """打印与基线结果的差异"""
+    rows = [
+        ("wall_seconds", result["wall_seconds"], baseline["wall_seconds"]),
+        ("pages_per_second", result["pages_per_second"], baseline["pages_per_second"]),
+        ("blocks_per_second", result["blocks_per_second"], baseline["blocks_per_second"]),
+        ("llm_requests", result["llm"]["requests"], baseline["llm"]["requests"]),
+        ("peak_rss_main_mib", result["peak_rss_mib"]["main"], baseline["peak_rss_mib"]["main"]),
+        ("peak_rss_pdf_workers_mib", result["peak_rss_mib"]["pdf_workers"], baseline["peak_rss_mib"]["pdf_workers"]),
+    ]
+    for stage, record in result["stages"].items():
+        if stage in baseline.get("stages", {}):
+            rows.append((f"{stage}_busy_seconds", record["busy_seconds"], baseline["stages"][stage]["busy_seconds"]))
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('label') or 'no label'}):")
+    for name, current, previous in rows:
+        change = f"{(current - previous) / previous * 100:+.1f}%" if previous else "n/a"
+        print(f"  {name:<28} {previous:>10} -> {current:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--blocks-per-page", type=int, default=8)
+    parser.add_argument("--language", choices=list(SAMPLE_TEXTS) + ["mixed"], default="en")
+    parser.add_argument("--target-language", default="zh")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.3, help="LLM 桩服务的平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit", type=float, default=0, help="每秒允许的请求数，0 表示不限流")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pdf-workers", type=int, default=2)
+    parser.add_argument("--batching", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--pipeline", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", help="结果 JSON 路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", help="用于对比的历史结果 JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    stub = start_stub(args, port)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure(args, workdir, f"http://127.0.0.1:{port}/v1")
+            result = asyncio.run(run(args, workdir))
+        # 此时已退出的子进程只有 PDF 进程，桩服务仍在运行
+        peak_rss = peak_rss_mib()
+        llm_stats = httpx.get(f"http://127.0.0.1:{port}/stats", timeout=5).json()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    commit = git_commit()
+    result = {
+        "label": args.label,
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        **result,
+        "peak_rss_mib": peak_rss,
+        "llm": llm_stats,
+    }
+
+    print(json.dumps({key: result[key] for key in result if key != "config"}, indent=2, ensure_ascii=False))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"e2e-{commit}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""OpenAI 兼容的本地桩服务，模拟响应延迟与限流：python -m benchmarks.fake_llm --port 8765 --latency 0.3"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+from app.services.translator import TranslatorService
+from app.services.segmenter import estimate_tokens
+
+
+def fake_translation(text: str) -> str:
+    """长度与原文相当的伪译文"""
+    return "译文" * max(1, len(text) // 4)
+
+
+def create_app(latency: float, jitter: float, rate_limit: float, seed: int = 0) -> FastAPI:
+    """latency/jitter 为每个请求的平均延迟及随机波动（秒），rate_limit 为每秒允许的请求数，0 表示不限流"""
+    app = FastAPI()
+    rng = random.Random(seed)
+    stats = {
+        "requests": 0,
+        "batch_requests": 0,
+        "rate_limited": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "max_in_flight": 0,
+    }
+    state = {"in_flight": 0, "tokens": rate_limit, "refilled": time.monotonic()}
+
+    def take_token() -> bool:
+        """令牌桶限流，桶容量为一秒的请求数"""
+        if rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        state["tokens"] = min(rate_limit, state["tokens"] + (now - state["refilled"]) * rate_limit)
+        state["refilled"] = now
+        if state["tokens"] < 1:
+            return False
+        state["tokens"] -= 1
+        return True
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if not take_token():
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+
+        stats["requests"] += 1
+        state["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+        finally:
+            state["in_flight"] -= 1
+
+        messages = body["messages"]
+        text = messages[-1]["content"]
+        if messages[0]["content"] == TranslatorService.BATCH_TRANSLATION_PROMPT:
+            stats["batch_requests"] += 1
+            content = json.dumps([fake_translation(item) for item in json.loads(text)], ensure_ascii=False)
+        else:
+            content = fake_translation(text)
+
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        completion_tokens = estimate_tokens(content)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        return {
+            "id": f"chatcmpl-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        for key in stats:
+            stats[key] = 0
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.jitter, args.rate_limit)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
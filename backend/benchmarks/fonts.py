@@ -0,0 +1,119 @@
+"""对比译文字体的嵌入方式对输出大小和渲染耗时的影响：python -m benchmarks.fonts --pages 50
+
+- builtin：内置 china-s，不嵌入字形（显示效果取决于阅读器）
+- full：嵌入完整字体
+- subset：只嵌入用到的字形（默认配置）
+- pipeline：与 subset 相同的配置，按流水线模式每 PIPELINE_CHUNK_PAGES 页渲染一个分片再合并
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+import fitz
+
+from app.config import settings
+from app.services.fonts import get_embedded_font
+from app.services.layout import TextBlock, flatten_blocks, with_translations
+from app.services.pdf import PDFService
+from .synthetic import make_pdf
+
+MODES = {
+    "builtin": {"PDF_EMBED_FONT": False, "PDF_SUBSET_FONT": False},
+    "full": {"PDF_EMBED_FONT": True, "PDF_SUBSET_FONT": False},
+    "subset": {"PDF_EMBED_FONT": True, "PDF_SUBSET_FONT": True},
+    "pipeline": {"PDF_EMBED_FONT": True, "PDF_SUBSET_FONT": True},
+}
+
+
+def varied_translate(
+    text_blocks: List[Tuple[int, TextBlock]],
+    vocabulary: int,
+    seed: int = 0
+) -> List[Tuple[int, TextBlock]]:
+    """生成由 vocabulary 个常用汉字组成的伪译文，字符种类接近真实译文，子集大小才有参考意义"""
+    rng = random.Random(seed)
+    chars = [chr(0x4e00 + i) for i in range(vocabulary)]
+    translated = []
+    for page_num, block in text_blocks:
+        length = max(4, len(block.text) // 2)
+        text = "".join(rng.choice(chars) for _ in range(length))
+        translated.append((page_num, block.with_text(text[: length // 2] + " Transformer 95% " + text[length // 2:])))
+    return translated
+
+
+def render_pipeline(source: str, layouts, output: str, page_count: int):
+    """按流水线模式逐块渲染分片后合并，与 run_pipeline 的渲染阶段一致"""
+    chunk_pages = max(1, settings.PIPELINE_CHUNK_PAGES)
+    shard_paths = []
+    chars = []
+    for start in range(0, page_count, chunk_pages):
+        end = min(start + chunk_pages, page_count)
+        shard_path = f"{output}.part{len(shard_paths)}"
+        chars.append(PDFService._render_shard_sync(
+            source, start, end, [layout for layout in layouts if start < layout.page_num <= end], shard_path
+        ))
+        shard_paths.append(shard_path)
+    PDFService._stitch_shards_sync(source, shard_paths, output, "".join(chars))
+    for shard_path in shard_paths:
+        os.remove(shard_path)
+
+
+def font_objects(path: str) -> int:
+    doc = fitz.open(path)
+    try:
+        return len({entry[0] for page in doc for entry in page.get_fonts() if entry[2] == "Type0"})
+    finally:
+        doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--blocks", type=int, default=8)
+    parser.add_argument("--vocabulary", type=int, default=2500, help="伪译文使用的不同汉字数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    font = get_embedded_font()
+    font.preload()
+    print(f"font: {font.source} {len(font.buffer) / 1024:.0f} KiB, load {time.perf_counter() - started:.2f}s (once per worker)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.pdf")
+        make_pdf(source, args.pages, args.blocks)
+        layouts = PDFService._extract_layout_sync(source)
+        translated = with_translations(layouts, varied_translate(flatten_blocks(layouts), args.vocabulary))
+        print(f"pages={args.pages} blocks={sum(len(layout.blocks) for layout in translated)} source={os.path.getsize(source) / 1024:.0f} KiB")
+
+        results = {}
+        for mode, overrides in MODES.items():
+            for key, value in overrides.items():
+                setattr(settings, key, value)
+            output = os.path.join(tmp, f"{mode}.pdf")
+            timings = []
+            for _ in range(args.repeat):
+                begin = time.perf_counter()
+                if mode == "pipeline":
+                    render_pipeline(source, translated, output, args.pages)
+                else:
+                    PDFService._create_translated_pdf_sync(source, translated, output)
+                timings.append(time.perf_counter() - begin)
+            results[mode] = (min(timings), os.path.getsize(output))
+            print(
+                f"{mode:8s} render {min(timings):.2f}s  output {os.path.getsize(output) / 1024:.0f} KiB  "
+                f"CJK font objects {font_objects(output)}"
+            )
+
+        full_time, full_size = results["full"]
+        subset_time, subset_size = results["subset"]
+        print(f"subset vs full: {full_size / subset_size:.1f}x smaller, {full_time / subset_time:.2f}x render speed")
+        pipeline_time, pipeline_size = results["pipeline"]
+        print(f"pipeline vs subset: {pipeline_size / subset_size:.2f}x size, {pipeline_time / subset_time:.2f}x render time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""对比对冲请求与备用引擎对翻译请求尾延迟的影响：python -m benchmarks.hedging --requests 400
+
+- baseline：只请求主引擎
+- hedged：超过主引擎延迟分位后发对冲请求
+- fallback：主引擎偶尔卡住，超时后改用备用引擎
+所有引擎都是 OfflineEngine，延迟由参数模拟，不访问网络。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import List
+
+from app.config import settings
+from app.services.engines import EngineRouter, OfflineEngine
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+
+async def run(router: EngineRouter, requests: int, concurrency: int) -> List[float]:
+    """以固定并发发出单块翻译请求，返回每个请求从发出到拿到结果的耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await router.complete("single", [{"role": "user", "content": f"block {i}"}], 100, 0.3)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="常规请求延迟（秒）")
+    parser.add_argument("--tail-ratio", type=float, default=0.02, help="变慢请求的比例")
+    parser.add_argument("--tail-latency", type=float, default=1.0, help="变慢请求额外的延迟（秒）")
+    parser.add_argument("--stuck-latency", type=float, default=30.0, help="fallback 场景中主引擎卡住的时长（秒）")
+    parser.add_argument("--timeout", type=float, default=0.5, help="fallback 场景的单次请求超时（秒）")
+    args = parser.parse_args()
+
+    # fallback 场景中每次降级都会记录警告
+    logging.getLogger("app.services.engines").setLevel(logging.ERROR)
+    settings.TRANSLATION_HEDGE_MIN_DELAY = 0
+    settings.TRANSLATION_HEDGE_MIN_SAMPLES = 20
+    scenarios = {
+        "baseline": (
+            {"TRANSLATION_HEDGE_ENABLED": False},
+            OfflineEngine(args.latency, args.tail_ratio, args.tail_latency, seed=1),
+            None,
+        ),
+        "hedged": (
+            {"TRANSLATION_HEDGE_ENABLED": True},
+            OfflineEngine(args.latency, args.tail_ratio, args.tail_latency, seed=1),
+            None,
+        ),
+        "fallback": (
+            {"TRANSLATION_HEDGE_ENABLED": False, "TRANSLATION_REQUEST_TIMEOUT": args.timeout},
+            OfflineEngine(args.latency, args.tail_ratio, args.stuck_latency, seed=1),
+            OfflineEngine(args.latency * 2, name="secondary"),
+        ),
+    }
+    print(
+        f"requests={args.requests} concurrency={args.concurrency} latency={args.latency}s "
+        f"tail={args.tail_ratio:.0%} +{args.tail_latency}s"
+    )
+    for scenario, (overrides, primary, fallback) in scenarios.items():
+        for key, value in overrides.items():
+            setattr(settings, key, value)
+        router = EngineRouter(primary, fallback)
+        started = time.perf_counter()
+        latencies = asyncio.run(run(router, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - started
+        sent = sum(router._requests.values())
+        print(
+            f"{scenario:9s} p50 {percentile(latencies, 50):.3f}s  p95 {percentile(latencies, 95):.3f}s  "
+            f"p99 {percentile(latencies, 99):.3f}s  max {max(latencies):.3f}s  "
+            f"total {elapsed:.2f}s  extra requests {sent / args.requests - 1:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""对比旧的字典列表与紧凑排版结构：python -m benchmarks.layout --pages 200
+
+- 提取结果的内存峰值：旧实现每个文本块一个 dict（rect/color 为 list）
+- 渲染阶段被省掉的开销：旧实现渲染时会对每页再调用一次 get_text("dict")
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+from app.services.layout import flatten_blocks, with_translations
+from app.services.pdf import PDFService
+from .synthetic import make_pdf, fake_translate
+
+
+def legacy_extract(file_path: str):
+    """旧版 extract_text 的数据结构：(页码, dict) 列表"""
+    doc = fitz.open(file_path)
+    text_blocks = []
+    for page in doc:
+        for block in page.get_text("dict", sort=True)["blocks"]:
+            if block["type"] != 0:
+                continue
+            spans = [span for line in block["lines"] for span in line["spans"]]
+            text = " ".join(span["text"] for span in spans).strip()
+            if not text:
+                continue
+            sizes = [span["size"] for span in spans]
+            text_blocks.append((page.number + 1, {
+                "text": text,
+                "rect": list(block["bbox"]),
+                "size": max(set(sizes), key=sizes.count),
+                "color": PDFService.rgb_to_color(spans[0]["color"]),
+                "original_font": spans[0]["font"],
+            }))
+    doc.close()
+    return text_blocks
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+
+def reparse_cost(file_path: str) -> float:
+    """旧版渲染为了找到涂抹区域而重复解析页面的耗时"""
+    doc = fitz.open(file_path)
+    started = time.perf_counter()
+    for page in doc:
+        page.get_text("dict")
+    elapsed = time.perf_counter() - started
+    doc.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--blocks", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.pdf")
+        make_pdf(source, args.pages, args.blocks)
+
+        _, legacy_time, legacy_kept, legacy_peak = measure(legacy_extract, source)
+        layouts, layout_time, layout_kept, layout_peak = measure(PDFService._extract_layout_sync, source)
+        print(f"pages={args.pages} blocks={len(flatten_blocks(layouts))}")
+        print(f"extract dicts:  {legacy_time:.2f}s  retained {legacy_kept / 1024:.0f} KiB  peak {legacy_peak / 1024:.0f} KiB")
+        print(f"extract layout: {layout_time:.2f}s  retained {layout_kept / 1024:.0f} KiB  peak {layout_peak / 1024:.0f} KiB")
+
+        translated = with_translations(layouts, fake_translate(flatten_blocks(layouts)))
+        output = os.path.join(tmp, "output.pdf")
+        started = time.perf_counter()
+        PDFService._create_translated_pdf_sync(source, translated, output)
+        render_time = time.perf_counter() - started
+        print(f"render with layout: {render_time:.2f}s  (re-parse avoided: {reparse_cost(source):.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""对比顺序渲染与按页分片并行渲染：python -m benchmarks.render --pages 500"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import fitz
+
+from app.config import settings
+from app.services.layout import flatten_blocks, with_translations
+from app.services.pdf import PDFService, shard_workers, shutdown_pdf_executor
+from .synthetic import make_pdf, fake_translate
+
+
+def page_texts(path: str):
+    doc = fitz.open(path)
+    try:
+        return [page.get_text() for page in doc]
+    finally:
+        doc.close()
+
+
+async def run(pages: int, blocks_per_page: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.pdf")
+        make_pdf(source, pages, blocks_per_page)
+        layouts = await PDFService.extract_layout(source)
+        translated = with_translations(layouts, fake_translate(flatten_blocks(layouts)))
+
+        sequential = os.path.join(tmp, "sequential.pdf")
+        started = time.perf_counter()
+        PDFService._create_translated_pdf_sync(source, translated, sequential)
+        sequential_time = time.perf_counter() - started
+
+        sharded = os.path.join(tmp, "sharded.pdf")
+        started = time.perf_counter()
+        await PDFService.create_translated_pdf(source, translated, sharded)
+        sharded_time = time.perf_counter() - started
+
+        same = page_texts(sequential) == page_texts(sharded)
+        print(f"pages={pages} blocks={sum(len(layout.blocks) for layout in translated)} workers={settings.PDF_WORKERS} cpus={os.cpu_count()} shard_workers={shard_workers()} shard={settings.PDF_SHARD_PAGES}")
+        print(f"sequential: {sequential_time:.2f}s  {os.path.getsize(sequential) / 1024:.0f} KiB")
+        print(f"{'sharded:' if shard_workers() > 1 else 'unsharded:':<11} {sharded_time:.2f}s  {os.path.getsize(sharded) / 1024:.0f} KiB")
+        print(f"speedup: {sequential_time / sharded_time:.2f}x  identical text: {same}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--blocks", type=int, default=8)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.pages, args.blocks))
+    finally:
+        shutdown_pdf_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+# 导入配置前提供必需的环境变量，测试不访问任何外部服务
+for name in ("CLOUDFLARE_ACCOUNT_ID", "CLOUDFLARE_ACCESS_KEY_ID", "CLOUDFLARE_ACCESS_KEY_SECRET", "R2_BUCKET_NAME"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.services import cache, engines  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(monkeypatch, tmp_path):
+    """每个测试使用独立的缓存目录与引擎，结束后恢复配置"""
+    monkeypatch.setattr(settings, "TRANSLATION_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "TRANSLATION_CACHE_PATH", str(tmp_path / "translation_memory.db"))
+    monkeypatch.setattr(settings, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(settings, "TRANSLATION_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(settings, "TRANSLATION_RETRY_MAX_BACKOFF", 0.02)
+    monkeypatch.setattr(cache, "_translation_cache", None)
+    monkeypatch.setattr(engines, "_engine_router", None)
+    yield
+
+
+@pytest.fixture
+def use_engine(monkeypatch):
+    """让翻译服务改用指定的引擎，返回对应的 EngineRouter"""
+    def use(primary, fallback=None) -> engines.EngineRouter:
+        router = engines.EngineRouter(primary, fallback)
+        monkeypatch.setattr(engines, "_engine_router", router)
+        return router
+    return use
+
+
+@pytest.fixture
+def job_store(monkeypatch, tmp_path):
+    """API 与任务流程使用临时目录中的任务存储、上传目录与本地结果存储，PDF 操作在线程中执行"""
+    from app.services import job_store as job_store_module, pdf, storage as storage_module
+
+    store = job_store_module.SQLiteJobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_store_module, "_job_store", store)
+    storage = storage_module.LocalStorageService(str(tmp_path / "storage"))
+    monkeypatch.setattr(storage_module, "_storage_service", storage)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    os.makedirs(settings.UPLOAD_DIR)
+    monkeypatch.setattr(settings, "PDF_WORKERS", 0)
+    monkeypatch.setattr(pdf, "_executor", None)
+    yield store
+    pdf.shutdown_pdf_executor()
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.cache import TranslationCache, get_translation_cache
+from app.services.checkpoint import TranslationCheckpoint
+from app.services.engines import OfflineEngine
+from app.services.layout import TextBlock
+from app.services.translator import TranslatorService
+
+
+def test_put_is_written_in_background_and_read_in_batches(tmp_path):
+    path = str(tmp_path / "memory.db")
+
+    async def run():
+        cache = TranslationCache(path, max_entries=1000)
+        for i in range(50):
+            cache.put(f"key-{i}", f"value-{i}")
+        # 尚未落盘的译文同样可以命中
+        assert (await cache.get_many(["key-1", "missing"])) == {"key-1": "value-1"}
+        await cache.flush()
+        assert cache.stats()["pending_writes"] == 0
+
+        reopened = TranslationCache(path, max_entries=1000)
+        found = await reopened.get_many([f"key-{i}" for i in range(60)])
+        assert len(found) == 50 and found["key-49"] == "value-49"
+        assert reopened.hits == 50 and reopened.misses == 10
+
+    asyncio.run(run())
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path):
+    async def run():
+        cache = TranslationCache(str(tmp_path / "memory.db"), max_entries=100)
+        cache.EVICT_CHECK_INTERVAL = 50
+        for i in range(100):
+            cache.put(f"old-{i}", "value")
+        await cache.flush()
+        await cache.get("old-0")
+        for i in range(50):
+            cache.put(f"new-{i}", "value")
+        await cache.flush()
+        assert await cache.get("old-0") == "value"
+        assert await cache.get("old-1") is None
+        assert await cache.get("new-49") == "value"
+
+    asyncio.run(run())
+
+
+def test_translate_blocks_reuses_cached_translations(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_CACHE_ENABLED", True)
+
+    class Counting(OfflineEngine):
+        requests = 0
+
+        async def complete(self, kind, messages, max_tokens, temperature):
+            Counting.requests += 1
+            return await super().complete(kind, messages, max_tokens, temperature)
+
+    use_engine(Counting())
+    blocks = [(1, TextBlock(f"Cached paragraph {i}.", (0, 0, 100, 20), 10, 0, "Helv")) for i in range(10)]
+
+    first = asyncio.run(TranslatorService.translate_blocks(blocks, "zh"))
+    requests = Counting.requests
+    second = asyncio.run(TranslatorService.translate_blocks(blocks, "zh"))
+
+    assert requests > 0 and Counting.requests == requests
+    assert [block.text for _, block in first] == [block.text for _, block in second]
+
+
+def test_fallback_translations_are_not_cached_or_checkpointed(use_engine, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRANSLATION_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+
+    class Down(OfflineEngine):
+        async def complete(self, kind, messages, max_tokens, temperature):
+            raise ConnectionError("primary is down")
+
+    use_engine(Down(), OfflineEngine(name="secondary"))
+    blocks = [(1, TextBlock(f"Fallback paragraph {i}.", (0, 0, 100, 20), 10, 0, "Helv")) for i in range(10)]
+    checkpoint = TranslationCheckpoint(str(tmp_path / "job.jsonl"))
+
+    async def run():
+        translated = await TranslatorService.translate_blocks(blocks, "zh", checkpoint=checkpoint)
+        keys = [TranslatorService.cache_key(block.text, "zh") for _, block in blocks]
+        return translated, await get_translation_cache().get_many(keys)
+
+    try:
+        translated, cached = asyncio.run(run())
+    finally:
+        checkpoint.close()
+
+    assert all(block.text.startswith("〔译") for _, block in translated)
+    # 缓存与断点以主引擎的模型为键，备用引擎的译文不能写入
+    assert cached == {}
+    assert checkpoint.translations == {}
+    assert checkpoint.fallback_blocks == 10
+
+
+def test_failed_call_leaves_keys_claimed_by_other_jobs_alone(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+
+    class Down(OfflineEngine):
+        async def complete(self, kind, messages, max_tokens, temperature):
+            raise ConnectionError("primary is down")
+
+    class Secondary(OfflineEngine):
+        """立即翻译第一段，第二段稍后失败"""
+
+        async def complete(self, kind, messages, max_tokens, temperature):
+            if "Second" in messages[-1]["content"]:
+                await asyncio.sleep(0.3)
+                raise ConnectionError("secondary is down")
+            return await super().complete(kind, messages, max_tokens, temperature)
+
+    use_engine(Down(), Secondary(name="secondary"))
+    blocks = [(1, TextBlock(text, (0, 0, 100, 20), 10, 0, "Helv")) for text in ("First paragraph.", "Second paragraph.")]
+    first_key = TranslatorService.cache_key("First paragraph.", "zh")
+
+    async def run():
+        cache = get_translation_cache()
+        job = asyncio.create_task(TranslatorService.translate_blocks(blocks, "zh"))
+        await asyncio.sleep(0.1)
+        # 第一段的备用引擎译文没有写入缓存，另一个任务重新翻译并登记为在途
+        assert cache.begin(first_key) is None
+        waiter = cache.begin(first_key)
+        with pytest.raises(Exception, match="primary is down"):
+            await job
+        # 失败的调用不会结束不属于它的在途登记
+        assert not waiter.done()
+        cache.finish(first_key, "译文")
+        return await waiter
+
+    assert asyncio.run(run()) == ("译文", True)
@@ -0,0 +1,106 @@
+from array import array
+
+import pytest
+
+from app.config import settings
+from app.services.classifier import BlockClassifier
+from app.services.layout import PageLayout, TextBlock
+from app.services.segmenter import count_tokens
+
+
+def classify(text: str):
+    return BlockClassifier.classify(TextBlock(text, (0, 0, 100, 20), 10, 0, "Helv"), "zh")
+
+
+@pytest.mark.parametrize("text", [
+    "a = b + c",
+    "a = b + c.",
+    "E = mc^2",
+    "f(x) = max(0, x)",
+    "σ(z) = 1 / (1 + exp(-z))",
+    "L = -∑ y log p",
+])
+def test_equations_are_skipped(text):
+    assert classify(text) == "equation"
+
+
+@pytest.mark.parametrize("text", [
+    "Let x = 1 and y = 2, so the sum is 3.",
+    "Let x = 1.",
+    "if x > 0 then y = 1",
+    "where x ∈ R",
+])
+def test_sentences_with_inline_math_are_translated(text):
+    assert classify(text) is None
+
+
+def line(text: str, rect, size: float = 10, color: int = 0) -> TextBlock:
+    return TextBlock(text, rect, size, color, "Helv")
+
+
+def prepare(*blocks: TextBlock):
+    redact_rects = array("d", [value for block in blocks for value in block.rect])
+    layout = PageLayout(1, redact_rects, list(blocks))
+    return BlockClassifier.prepare_layouts([layout], "zh")[0]
+
+
+def test_fragments_of_one_paragraph_are_merged():
+    layout = prepare(
+        line("The results show that the proposed method", (50, 100, 300, 112)),
+        line("outperforms the baseline on every dataset", (50, 113, 290, 125)),
+        line("we evaluated.", (50, 126, 120, 138)),
+    )
+
+    assert len(layout.blocks) == 1
+    merged = layout.blocks[0]
+    assert merged.text == (
+        "The results show that the proposed method outperforms the baseline on every dataset we evaluated."
+    )
+    assert merged.rect == (50, 100, 300, 138)
+    # 涂抹区域仍是原来的各个文本块
+    assert list(layout.iter_redact_rects()) == [(50, 100, 300, 112), (50, 113, 290, 125), (50, 126, 120, 138)]
+
+
+@pytest.mark.parametrize("first_text,second", [
+    # 前一块以句末标点结束
+    ("First paragraph ends here.", line("Second paragraph starts here", (50, 113, 290, 125))),
+    # 字号不同（标题与正文）
+    ("Section heading", line("continued in a larger font", (50, 113, 290, 125), size=14)),
+    # 颜色不同
+    ("First paragraph continues", line("continued in another color", (50, 113, 290, 125), color=0xFF0000)),
+    # 间距超过一行
+    ("First paragraph continues", line("continued much further down", (50, 150, 290, 162))),
+    # 另一栏
+    ("First paragraph continues", line("continued in the next column", (320, 100, 560, 112))),
+])
+def test_blocks_from_different_paragraphs_are_kept_apart(first_text, second):
+    layout = prepare(line(first_text, (50, 100, 300, 112)), second)
+
+    assert [block.text for block in layout.blocks] == [first_text, second.text]
+
+
+def test_blocks_separated_by_a_skipped_block_are_not_merged():
+    layout = prepare(
+        line("The method described in the previous", (50, 100, 300, 112)),
+        line("12", (170, 113, 180, 125)),
+        line("section is evaluated below", (50, 126, 290, 138)),
+    )
+
+    assert [block.text for block in layout.blocks] == ["The method described in the previous", "section is evaluated below"]
+    # 跳过的页码不涂抹，保留原文
+    assert (170, 113, 180, 125) not in list(layout.iter_redact_rects())
+
+
+def test_merged_blocks_stay_within_the_token_limit(monkeypatch):
+    first = "The results show that the proposed method"
+    second = "outperforms the baseline on every dataset"
+    # 只够合并前两块
+    monkeypatch.setattr(settings, "BLOCK_MERGE_MAX_TOKENS", count_tokens(first) + count_tokens(second))
+    layout = prepare(
+        line(first, (50, 100, 300, 112)),
+        line(second, (50, 113, 290, 125)),
+        line("we evaluated in this work", (50, 126, 200, 138)),
+    )
+
+    assert len(layout.blocks) == 2
+    assert layout.blocks[1].text == "we evaluated in this work"
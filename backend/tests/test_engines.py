@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.engines import EngineRouter, OfflineEngine, TranslationEngine, size_bucket
+
+SHORT = [{"role": "user", "content": "A short sentence."}]
+LONG = [{"role": "user", "content": "A much longer paragraph of text. " * 200}]
+
+
+class SizedEngine(OfflineEngine):
+    """耗时随输入长度增长的引擎"""
+
+    async def complete(self, kind, messages, max_tokens, temperature):
+        await asyncio.sleep(0.1 if len(messages[-1]["content"]) > 1000 else 0.01)
+        return await super().complete(kind, messages, max_tokens, temperature)
+
+
+def test_latency_is_tracked_per_size_bucket(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_HEDGE_MIN_DELAY", 0)
+    monkeypatch.setattr(settings, "TRANSLATION_HEDGE_MIN_SAMPLES", 5)
+    engine = OfflineEngine()
+    router = EngineRouter(engine)
+    router._requests[engine.name] = 100
+    short, long = size_bucket(SHORT), size_bucket(LONG)
+
+    for _ in range(5):
+        router.observe(engine, "single", short, 0.1)
+        router.observe(engine, "single", long, 2.0)
+
+    assert short != long
+    assert router.hedge_delay(engine, "single", short) == 0.1
+    assert router.hedge_delay(engine, "single", long) == 2.0
+
+
+def test_long_requests_are_not_hedged_at_short_request_latency(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_HEDGE_MIN_DELAY", 0)
+    monkeypatch.setattr(settings, "TRANSLATION_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(settings, "TRANSLATION_HEDGE_MAX_RATIO", 1)
+    engine = SizedEngine()
+    router = EngineRouter(engine)
+
+    async def run():
+        for _ in range(20):
+            await router.complete("single", SHORT, 100, 0.3)
+        # 短请求的抖动可能触发个别对冲，只统计长请求
+        hedges = router._hedges.get(engine.name, 0)
+        await asyncio.gather(*(router.complete("single", LONG, 100, 0.3) for _ in range(5)))
+        return router._hedges.get(engine.name, 0) - hedges
+
+    # 长请求所在分桶的样本不足，不按短请求的延迟分位对冲
+    assert asyncio.run(run()) == 0
+
+
+def test_engines_must_implement_complete():
+    class Incomplete(TranslationEngine):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="complete"):
+        Incomplete()
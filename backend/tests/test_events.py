@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config import settings
+from app.models import JobStage, JobStatus, TranslationJob
+from app.services.job_store import job_watchers
+
+
+def make_job() -> TranslationJob:
+    return TranslationJob(
+        id="00000000-0000-0000-0000-000000000004",
+        file_name="source.pdf",
+        source_language="en",
+        target_language="zh",
+        status=JobStatus.PROCESSING,
+        stage=JobStage.TRANSLATING,
+    )
+
+
+async def collect(job_id: str):
+    """读取事件流直到关闭，返回 status 事件中的任务状态"""
+    events = []
+    async for message in main.job_events(job_id):
+        if message.startswith("event: status"):
+            events.append(json.loads(message.split("data: ", 1)[1]))
+    return events
+
+
+def stream_updates(store, job: TranslationJob, updates: int, interval: float):
+    """订阅事件流的同时逐步更新任务进度，最后完成任务；返回收到的事件与耗时"""
+    async def update():
+        for i in range(1, updates + 1):
+            await asyncio.sleep(interval)
+            job.progress = i * 100 / updates
+            await store.save(job)
+        job.status = JobStatus.COMPLETED
+        job.stage = None
+        await store.save(job)
+
+    async def run():
+        await store.save(job)
+        started = time.perf_counter()
+        events, _ = await asyncio.gather(collect(job.id), update())
+        return events, time.perf_counter() - started
+
+    return asyncio.run(run())
+
+
+def test_unknown_job_has_no_event_stream(job_store):
+    response = TestClient(main.app).get(f"{settings.API_PREFIX}/jobs/missing/events")
+    assert response.status_code == 404
+
+
+def test_progress_updates_are_pushed_and_coalesced(job_store, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_EVENTS_MIN_INTERVAL", 0.1)
+    # 轮询间隔远大于任务耗时，事件只能由本进程保存任务时唤醒
+    monkeypatch.setattr(settings, "JOB_EVENTS_POLL_INTERVAL", 30)
+
+    events, elapsed = stream_updates(job_store, make_job(), updates=50, interval=0.01)
+
+    assert elapsed < 5
+    # 50 次进度更新合并为每 0.1 秒最多一次推送
+    assert 2 <= len(events) <= 15
+    assert events[0]["status"] == "processing"
+    assert events[-1]["status"] == "completed" and events[-1]["progress"] == 100
+    # 只推送跟踪进度所需的字段
+    assert set(events[-1]) == main.EVENT_FIELDS
+    progress = [event["progress"] for event in events]
+    assert progress == sorted(progress)
+
+
+def test_updates_from_other_processes_are_found_by_polling(job_store, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_EVENTS_MIN_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "JOB_EVENTS_POLL_INTERVAL", 0.1)
+    # 其他 worker 保存任务时不会唤醒本进程的连接
+    monkeypatch.setattr(job_watchers, "notify", lambda job_id: None)
+
+    events, _ = stream_updates(job_store, make_job(), updates=3, interval=0.3)
+
+    # 每次更新间隔大于轮询间隔，每个进度都会推送
+    progress = [event["progress"] for event in events]
+    assert progress[:3] == [0, 100 / 3, 200 / 3]
+    assert events[-1]["status"] == "completed" and events[-1]["progress"] == 100
@@ -0,0 +1,204 @@
+import asyncio
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import fitz
+import pytest
+
+from app.config import settings
+from app.services import fonts, pdf
+from app.services.fonts import get_embedded_font
+from app.services.layout import flatten_blocks, with_translations
+from app.services.pdf import PDFService, run_pdf_task
+from benchmarks.synthetic import make_pdf
+
+
+@pytest.fixture
+def thread_executor(monkeypatch):
+    """PDF_WORKERS=0：在当前进程的线程中执行 PDF 操作"""
+    monkeypatch.setattr(settings, "PDF_WORKERS", 0)
+    monkeypatch.setattr(pdf, "_executor", None)
+    yield
+    pdf.shutdown_pdf_executor()
+
+
+@pytest.fixture
+def process_executor(monkeypatch):
+    """生产默认的进程池：两个 PDF 进程，按两核计算分片"""
+    monkeypatch.setattr(settings, "PDF_WORKERS", 2)
+    monkeypatch.setattr(pdf.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(pdf, "_executor", None)
+    yield
+    pdf.shutdown_pdf_executor()
+
+
+def test_thread_mode_runs_pdf_tasks_one_at_a_time(thread_executor):
+    active = []
+    overlaps = []
+    lock = threading.Lock()
+
+    def task(i):
+        with lock:
+            active.append(i)
+            overlaps.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(i)
+        return i
+
+    async def run():
+        return await asyncio.gather(*(run_pdf_task(task, i) for i in range(8)))
+
+    assert asyncio.run(run()) == list(range(8))
+    assert isinstance(pdf.get_pdf_executor(), ThreadPoolExecutor)
+    assert max(overlaps) == 1
+
+
+def test_extract_and_render_in_thread_mode(thread_executor, tmp_path):
+    source = str(tmp_path / "source.pdf")
+    output = str(tmp_path / "output.pdf")
+    make_pdf(source, 3, 4)
+
+    async def run():
+        layouts = await PDFService.extract_layout(source)
+        translated = with_translations(
+            layouts, [(page, block.with_text("译文 " + block.text)) for page, block in flatten_blocks(layouts)]
+        )
+        # 与 API 中的页数查询并发执行
+        await asyncio.gather(
+            PDFService.create_translated_pdf(source, translated, output),
+            PDFService.page_count(source)
+        )
+        return layouts
+
+    layouts = asyncio.run(run())
+    assert len(layouts) == 3 and all(layout.blocks for layout in layouts)
+    assert asyncio.run(PDFService.page_count(output)) == 3
+
+
+def test_stitched_shards_share_one_subset_font(tmp_path):
+    source = str(tmp_path / "source.pdf")
+    output = str(tmp_path / "output.pdf")
+    make_pdf(source, 6, 4)
+    layouts = PDFService._extract_layout_sync(source)
+    translated = with_translations(
+        layouts, [(page, block.with_text(f"第{page}页译文 " + block.text)) for page, block in flatten_blocks(layouts)]
+    )
+    shard_paths = []
+    chars = []
+    for start in range(0, 6, 2):
+        shard_path = str(tmp_path / f"output.pdf.part{start}")
+        chars.append(PDFService._render_shard_sync(
+            source, start, start + 2, [layout for layout in translated if start < layout.page_num <= start + 2], shard_path
+        ))
+        shard_paths.append(shard_path)
+    PDFService._stitch_shards_sync(source, shard_paths, output, "".join(chars))
+
+    font_name = get_embedded_font().name
+    doc = fitz.open(output)
+    try:
+        assert len({entry[0] for page in doc for entry in page.get_fonts() if entry[4] == font_name}) == 1
+        assert all(f"第{page.number + 1}页译文" in page.get_text() for page in doc)
+    finally:
+        doc.close()
+    # 子集远小于完整字体
+    assert os.path.getsize(output) < len(get_embedded_font().buffer) / 2
+
+
+def test_unexpected_font_objects_fail_with_a_clear_error():
+    doc = fitz.open()
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<< /Type /Font /DescendantFonts [ ] /FontDescriptor /None >>")
+    try:
+        with pytest.raises(ValueError, match="DescendantFonts"):
+            PDFService._xref_key(doc, xref, "DescendantFonts")
+        with pytest.raises(ValueError, match="FontDescriptor"):
+            PDFService._xref_key(doc, xref, "FontDescriptor")
+    finally:
+        doc.close()
+
+
+def translate_fixture(source: str):
+    layouts = PDFService._extract_layout_sync(source)
+    return with_translations(
+        layouts, [(page, block.with_text(f"第{page}页译文 " + block.text)) for page, block in flatten_blocks(layouts)]
+    )
+
+
+@pytest.fixture
+def pdf_tasks(monkeypatch):
+    """记录提交到 PDF 执行器的函数名，仍由真实的执行器运行"""
+    names = []
+    run = pdf.run_pdf_task
+
+    async def record(func, *args):
+        names.append(func.__name__)
+        return await run(func, *args)
+
+    monkeypatch.setattr(pdf, "run_pdf_task", record)
+    return names
+
+
+def test_large_documents_are_sharded_across_pdf_processes(process_executor, pdf_tasks, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PDF_SHARD_MIN_PAGES", 4)
+    monkeypatch.setattr(settings, "PDF_SHARD_PAGES", 2)
+    source = str(tmp_path / "source.pdf")
+    output = str(tmp_path / "output.pdf")
+    make_pdf(source, 6, 4)
+    translated = translate_fixture(source)
+
+    asyncio.run(PDFService.create_translated_pdf(source, translated, output))
+
+    assert isinstance(pdf.get_pdf_executor(), ProcessPoolExecutor)
+    assert pdf_tasks.count("_render_shard_sync") == 3 and "_stitch_shards_sync" in pdf_tasks
+    assert not glob.glob(f"{output}.part*")
+    font_name = get_embedded_font().name
+    doc = fitz.open(output)
+    try:
+        assert doc.page_count == 6
+        assert all(f"第{page.number + 1}页译文" in page.get_text() for page in doc)
+        assert len({entry[0] for page in doc for entry in page.get_fonts() if entry[4] == font_name}) == 1
+    finally:
+        doc.close()
+
+
+def test_single_cpu_hosts_render_without_sharding(process_executor, pdf_tasks, monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf.os, "cpu_count", lambda: 1)
+    monkeypatch.setattr(settings, "PDF_SHARD_MIN_PAGES", 4)
+    source = str(tmp_path / "source.pdf")
+    make_pdf(source, 6, 4)
+
+    asyncio.run(PDFService.create_translated_pdf(source, translate_fixture(source), str(tmp_path / "output.pdf")))
+
+    assert "_render_shard_sync" not in pdf_tasks
+    assert "_create_translated_pdf_sync" in pdf_tasks
+
+
+@pytest.fixture
+def html_font(tmp_path):
+    path = tmp_path / "font.otf"
+    path.write_text("<!DOCTYPE html><html></html>")
+    return str(path)
+
+
+def test_configured_font_that_cannot_be_parsed_fails_startup(monkeypatch, html_font):
+    monkeypatch.setattr(settings, "PDF_FONT_PATH", html_font)
+
+    with pytest.raises(RuntimeError, match="PDF_FONT_PATH"):
+        fonts.check_font()
+
+
+def test_broken_bundled_font_is_reported_as_an_error(monkeypatch, caplog, html_font):
+    monkeypatch.setattr(settings, "PDF_FONT_PATH", "")
+    monkeypatch.setattr(fonts, "BUNDLED_FONT_PATH", html_font)
+    monkeypatch.setattr(fonts, "_font", None)
+
+    fonts.check_font()
+    font = fonts.get_embedded_font()
+
+    assert font.source == "builtin:cjk"
+    errors = [record for record in caplog.records if record.levelname == "ERROR"]
+    assert len(errors) == 2 and all(html_font in record.getMessage() for record in errors)
@@ -0,0 +1,264 @@
+import asyncio
+import glob
+import shutil
+import time
+
+import fitz
+import httpx
+import openai
+import pytest
+
+from app import pipeline
+from app.config import settings
+from app.models import JobStatus, TranslationJob
+from app.services.checkpoint import TooManyFailedBlocks, TranslationCheckpoint
+from app.services.engines import OfflineEngine
+from app.services.job_store import get_job_store
+from app.services.layout import TextBlock
+from app.services.storage import get_storage_service
+from app.services.translator import TranslatorService
+from benchmarks.synthetic import make_pdf
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def api_error(status_code: int, code: str = None) -> openai.APIStatusError:
+    body = {"message": "error", "code": code}
+    response = httpx.Response(status_code, request=REQUEST, json={"error": body})
+    return openai.APIStatusError(f"Error code: {status_code}", response=response, body=body)
+
+
+class FailingEngine(OfflineEngine):
+    """对包含 fail_marker 的请求（不传则对所有请求）抛出 error"""
+
+    def __init__(self, error: Exception, fail_marker: str = ""):
+        super().__init__()
+        self.error = error
+        self.fail_marker = fail_marker
+        self.requests = 0
+
+    async def complete(self, kind, messages, max_tokens, temperature):
+        self.requests += 1
+        if self.fail_marker in messages[-1]["content"]:
+            raise self.error
+        return await super().complete(kind, messages, max_tokens, temperature)
+
+
+def make_blocks(count: int):
+    return [(1, TextBlock(f"Sentence number {i}.", (0, 0, 100, 20), 10, 0, "Helv")) for i in range(count)]
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = TranslationCheckpoint(str(tmp_path / "job.jsonl"))
+    yield checkpoint
+    checkpoint.close()
+
+
+@pytest.mark.parametrize("error", [api_error(401), api_error(400), api_error(429, "insufficient_quota")])
+def test_fatal_errors_are_not_isolated_or_retried(use_engine, monkeypatch, checkpoint, error):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    engine = FailingEngine(error)
+    use_engine(engine)
+
+    with pytest.raises(Exception, match="Error code"):
+        asyncio.run(TranslatorService.translate_blocks(make_blocks(20), "zh", concurrency=1, checkpoint=checkpoint))
+
+    # 第一个请求失败时可能已有下一个请求发出，但都不会重试
+    assert engine.requests <= 2
+
+
+def test_block_specific_request_errors_are_isolated(use_engine, monkeypatch, checkpoint):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    use_engine(FailingEngine(api_error(400, "context_length_exceeded"), fail_marker="number 3."))
+
+    translated = asyncio.run(TranslatorService.translate_blocks(make_blocks(10), "zh", checkpoint=checkpoint))
+
+    assert checkpoint.failed_blocks == 1
+    assert translated[3][1].text == "Sentence number 3."
+    assert "Error code: 400" in checkpoint.first_error
+
+
+def test_translation_stops_once_failures_exceed_the_limit(use_engine, monkeypatch, checkpoint):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+    engine = FailingEngine(api_error(503))
+    use_engine(engine)
+    checkpoint.max_failed_blocks = 2
+
+    with pytest.raises(TooManyFailedBlocks, match="first error: .*Error code: 503"):
+        asyncio.run(TranslatorService.translate_blocks(make_blocks(100), "zh", concurrency=1, checkpoint=checkpoint))
+
+    assert checkpoint.failed_blocks == 3
+    # 第三次失败时下一个请求可能已经发出
+    assert engine.requests <= 4
+
+
+def run_job(tmp_path, pages: int, **fields) -> TranslationJob:
+    source = str(tmp_path / "source.pdf")
+    make_pdf(source, pages, 4)
+    job = TranslationJob(
+        id="00000000-0000-0000-0000-000000000001",
+        file_name="source.pdf",
+        source_language="en",
+        target_language="zh",
+        status=JobStatus.PENDING,
+        page_count=pages,
+        **fields
+    )
+    file_path = pipeline.upload_path(job.id, job.file_name)
+    shutil.copyfile(source, file_path)
+
+    async def run():
+        await get_job_store().save(job)
+        await pipeline.process_translation(job.id, file_path)
+        return await get_job_store().get(job.id)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("pipelined", [True, False])
+def test_job_fails_fast_with_the_underlying_error(use_engine, job_store, monkeypatch, tmp_path, pipelined):
+    monkeypatch.setattr(settings, "PIPELINE_ENABLED", pipelined)
+    # 不重试：重试退避期间会让出并发名额，使其余文本块的首次请求先于失败计数发出
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+    engine = FailingEngine(api_error(503))
+    use_engine(engine)
+
+    job = run_job(tmp_path, pages=40)
+
+    assert job.status == JobStatus.FAILED
+    assert "Error code: 503" in job.error
+    # 远没有翻译完整份文档就已结束（每页 4 个文本块，完整跑完每块至少请求 1 次）
+    assert engine.requests < 40 * 4 / 2
+
+
+def test_job_with_few_failures_completes_as_partial(use_engine, job_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    # 合成文档的文本块以 "页码.块序号 " 开头，只有第 2 页第 2 块失败
+    use_engine(FailingEngine(api_error(503), fail_marker="2.2 "))
+
+    job = run_job(tmp_path, pages=8)
+
+    assert job.status == JobStatus.PARTIAL
+    assert job.failed_blocks == 1
+    assert "Error code: 503" in job.error
+
+
+def test_results_using_the_fallback_engine_are_not_reused(use_engine, job_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 0)
+    use_engine(FailingEngine(api_error(503), fail_marker="1.1 "), OfflineEngine(name="secondary"))
+
+    job = run_job(tmp_path, pages=2, document_key="document")
+    other = TranslationJob(
+        id="00000000-0000-0000-0000-000000000003",
+        file_name="source.pdf",
+        source_language="en",
+        target_language="zh",
+        status=JobStatus.PENDING,
+    )
+
+    assert job.status == JobStatus.COMPLETED
+    # 结果没有登记为该文档的译文，相同文档会重新翻译
+    assert asyncio.run(job_store.reserve_document("document", other)) is None
+
+
+class ScriptedEngine(OfflineEngine):
+    """含 slow_marker 的请求额外等待 delay 秒，含 fail_marker 的请求抛出 error；记录同时进行的请求数"""
+
+    def __init__(self, slow_marker: str, delay: float, fail_marker: str = None, error: Exception = None):
+        super().__init__()
+        self.slow_marker = slow_marker
+        self.delay = delay
+        self.fail_marker = fail_marker
+        self.error = error
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, kind, messages, max_tokens, temperature):
+        content = messages[-1]["content"]
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.slow_marker in content:
+                await asyncio.sleep(self.delay)
+            if self.fail_marker and self.fail_marker in content:
+                raise self.error
+            return await super().complete(kind, messages, max_tokens, temperature)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def chunk_calls(monkeypatch):
+    """记录流水线各块的 translate_blocks 调用：同时进行的最大块数与使用的并发限制器"""
+    calls = {"active": 0, "peak": 0, "limiters": set()}
+    translate_blocks = TranslatorService.translate_blocks
+
+    async def tracked(*args, **kwargs):
+        calls["active"] += 1
+        calls["peak"] = max(calls["peak"], calls["active"])
+        calls["limiters"].add(id(kwargs["limiter"]))
+        try:
+            return await translate_blocks(*args, **kwargs)
+        finally:
+            calls["active"] -= 1
+
+    monkeypatch.setattr(TranslatorService, "translate_blocks", tracked)
+    return calls
+
+
+def test_pipelined_chunks_are_rendered_in_page_order(use_engine, job_store, monkeypatch, tmp_path, chunk_calls):
+    monkeypatch.setattr(settings, "PIPELINE_CHUNK_PAGES", 1)
+    monkeypatch.setattr(settings, "PIPELINE_WINDOW", 3)
+    # 第 1 页最慢，后面的块先翻译完
+    use_engine(ScriptedEngine("1.1 ", 0.3))
+
+    job = run_job(tmp_path, pages=6)
+
+    assert job.status == JobStatus.COMPLETED
+    assert chunk_calls["peak"] == 3
+    doc = fitz.open(get_storage_service().local_path(job.result_key))
+    try:
+        texts = [page.get_text() for page in doc]
+    finally:
+        doc.close()
+    assert len(texts) == 6
+    for page_num, text in enumerate(texts, start=1):
+        assert "〔译" in text and f"{page_num}.1 " in text
+
+
+def test_pipeline_window_and_limiter_are_shared_across_chunks(use_engine, job_store, monkeypatch, tmp_path, chunk_calls):
+    monkeypatch.setattr(settings, "PIPELINE_CHUNK_PAGES", 1)
+    monkeypatch.setattr(settings, "PIPELINE_WINDOW", 2)
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_CONCURRENCY", 3)
+    # 每个请求都有延迟，两块同时翻译时最多可能有 8 个请求
+    engine = ScriptedEngine(" ", 0.05)
+    use_engine(engine)
+
+    job = run_job(tmp_path, pages=12)
+
+    assert job.status == JobStatus.COMPLETED
+    # 同时翻译的块数不超过窗口，不会把整份文档一次读入
+    assert chunk_calls["peak"] == 2
+    # 各块共用同一个限制器，请求并发不随同时翻译的块数增加
+    assert len(chunk_calls["limiters"]) == 1
+    assert engine.max_in_flight == 3
+
+
+def test_a_failing_chunk_fails_the_job_without_waiting_for_earlier_chunks(use_engine, job_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PIPELINE_CHUNK_PAGES", 1)
+    monkeypatch.setattr(settings, "PIPELINE_WINDOW", 4)
+    use_engine(ScriptedEngine("1.1 ", 30, fail_marker="3.1 ", error=api_error(401)))
+
+    started = time.perf_counter()
+    job = run_job(tmp_path, pages=8)
+
+    assert job.status == JobStatus.FAILED
+    assert "Error code: 401" in job.error
+    # 第 1 页的请求被取消，不等它完成
+    assert time.perf_counter() - started < 10
+    output_path = pipeline.translated_path(job.id, job.file_name)
+    assert not glob.glob(f"{output_path}*")
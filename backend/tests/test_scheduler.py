@@ -0,0 +1,207 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import pipeline, scheduler
+from app.config import settings
+from app.models import JobStatus, TranslationJob
+from app.services.engines import OfflineEngine
+from benchmarks.synthetic import make_pdf
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def make_job(tmp_path, pages: int = 1) -> TranslationJob:
+    """创建排队中的任务及其源文件"""
+    job = TranslationJob(
+        id="00000000-0000-0000-0000-000000000002",
+        file_name="source.pdf",
+        source_language="en",
+        target_language="zh",
+        status=JobStatus.PENDING,
+        page_count=pages,
+    )
+    source = str(tmp_path / "source.pdf")
+    make_pdf(source, pages, 4)
+    shutil.copyfile(source, pipeline.upload_path(job.id, job.file_name))
+    return job
+
+
+def set_lease(store, job_id: str, owner: str, expires: float):
+    conn = sqlite3.connect(store.path)
+    conn.execute("UPDATE jobs SET lease_owner = ?, lease_expires = ? WHERE id = ?", (owner, expires, job_id))
+    conn.commit()
+    conn.close()
+
+
+def test_only_expired_leases_are_requeued(job_store, tmp_path):
+    job = make_job(tmp_path)
+
+    async def run():
+        await job_store.save(job)
+        job.status = JobStatus.PROCESSING
+        assert await job_store.acquire_lease(job, "first", 60)
+
+        await scheduler.recover_stale_jobs()
+        assert (await job_store.get(job.id)).status == JobStatus.PROCESSING
+        assert await job_store.queue_length() == 0
+
+        set_lease(job_store, job.id, "first", 0)
+        await scheduler.recover_stale_jobs()
+        assert (await job_store.get(job.id)).status == JobStatus.PENDING
+        assert await job_store.queue_length() == 1
+
+        # 原 worker 之后的续期和写入都被拒绝
+        assert not await job_store.renew_lease(job.id, "first", 60)
+        job.status = JobStatus.FAILED
+        assert not await job_store.save(job, "first")
+        assert (await job_store.get(job.id)).status == JobStatus.PENDING
+
+    asyncio.run(run())
+
+
+def test_fail_job_does_not_overwrite_a_finished_job(job_store, tmp_path):
+    job = make_job(tmp_path)
+
+    async def run():
+        await job_store.save(job)
+        job.status = JobStatus.PROCESSING
+        assert await job_store.acquire_lease(job, "worker", 60)
+        job.status = JobStatus.COMPLETED
+        assert await job_store.save(job, "worker")
+
+        await pipeline.fail_job(job, "Upload failed: disk full", "worker")
+        return await job_store.get(job.id)
+
+    stored = asyncio.run(run())
+
+    assert stored.status == JobStatus.COMPLETED
+    assert stored.error is None
+
+
+def test_heartbeat_keeps_a_long_job_from_being_requeued(use_engine, job_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.6)
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_CONCURRENCY", 1)
+    # 4 页共 16 个文本块逐个请求，耗时远超租约时长
+    use_engine(OfflineEngine(latency=0.1))
+    job = make_job(tmp_path, pages=4)
+
+    async def run():
+        await job_store.save(job)
+        worker = asyncio.create_task(pipeline.process_translation(job.id, pipeline.upload_path(job.id, job.file_name)))
+        while not worker.done():
+            await scheduler.recover_stale_jobs()
+            await asyncio.sleep(0.05)
+        await worker
+        return await job_store.get(job.id)
+
+    stored = asyncio.run(run())
+
+    assert stored.status == JobStatus.COMPLETED
+    assert asyncio.run(job_store.queue_length()) == 0
+
+
+def test_worker_stops_once_its_lease_is_taken_over(use_engine, job_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.6)
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_CONCURRENCY", 1)
+    use_engine(OfflineEngine(latency=0.1))
+    job = make_job(tmp_path, pages=4)
+
+    async def run():
+        await job_store.save(job)
+        worker = asyncio.create_task(pipeline.process_translation(job.id, pipeline.upload_path(job.id, job.file_name)))
+        await asyncio.sleep(0.05)
+        set_lease(job_store, job.id, "other", 1e12)
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(worker, timeout=5)
+        return await job_store.get(job.id)
+
+    stored = asyncio.run(run())
+
+    # 被接管的执行不会把任务标记为失败
+    assert stored.status == JobStatus.PROCESSING
+
+
+def test_importing_the_app_does_not_create_the_job_store():
+    # 导入时不应打开数据库或连接 Redis，配置有误时也能导入后在启动时报错
+    code = (
+        "import app.main, app.worker\n"
+        "from app.services import job_store, storage\n"
+        "assert job_store._job_store is None and storage._storage_service is None\n"
+    )
+    env = dict(os.environ, JOB_STORE="redis", REDIS_URL="redis://127.0.0.1:1")
+    subprocess.run([sys.executable, "-c", code], cwd=str(BACKEND_DIR), env=env, check=True)
+
+
+class ScriptedRedis:
+    """依次返回预设的 CLAIM_SCRIPT 结果，记录写入的任务数据（环境中没有 Redis 服务）"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.saved = {}
+
+    async def eval(self, script, numkeys, *args):
+        return self.results.pop(0) if self.results else None
+
+    def pipeline(self, transaction=True):
+        return ScriptedPipeline(self)
+
+
+class ScriptedPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def zrem(self, *args):
+        pass
+
+    def zadd(self, *args):
+        pass
+
+    def set(self, key, value):
+        self.redis.saved[key] = value
+
+    async def execute(self):
+        pass
+
+
+def test_redis_claim_fails_jobs_without_a_source_file_and_keeps_looking():
+    from app.services.job_store import RedisJobStore
+
+    orphan = TranslationJob(
+        id="00000000-0000-0000-0000-000000000002",
+        file_name="source.pdf",
+        source_language="en",
+        target_language="zh",
+        status=JobStatus.PENDING,
+    )
+    job = orphan.model_copy(update={"id": "00000000-0000-0000-0000-000000000003"})
+    store = RedisJobStore.__new__(RedisJobStore)
+    store.redis = ScriptedRedis([
+        # 任务数据已被删除
+        [b"00000000-0000-0000-0000-000000000009", b"/tmp/gone.pdf", None],
+        # 源文件路径丢失
+        [orphan.id.encode(), None, orphan.model_dump_json().encode()],
+        [job.id.encode(), b"/tmp/source.pdf", job.model_dump_json().encode()],
+    ])
+
+    claimed, file_path = asyncio.run(store.claim())
+
+    assert (claimed.id, file_path) == (job.id, "/tmp/source.pdf")
+    failed = TranslationJob.model_validate_json(store.redis.saved[RedisJobStore.KEY_PREFIX + orphan.id])
+    assert failed.status == JobStatus.FAILED
+    assert "Source file" in failed.error
+    assert asyncio.run(store.claim()) is None
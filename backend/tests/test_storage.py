@@ -0,0 +1,87 @@
+import asyncio
+import os
+from urllib.parse import urlparse, parse_qs
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.config import settings
+from app.services.storage import LocalStorageService, StorageService
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    """指向 moto 模拟的 S3 的 StorageService，分片阈值调到 S3 允许的最小值 5 MB"""
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "R2_ENDPOINT_URL", "https://s3.amazonaws.com")
+    monkeypatch.setattr(settings, "R2_BUCKET_NAME", "translations")
+    monkeypatch.setattr(settings, "CLOUDFLARE_ACCESS_KEY_ID", "testing")
+    monkeypatch.setattr(settings, "CLOUDFLARE_ACCESS_KEY_SECRET", "testing")
+    monkeypatch.setattr(settings, "STORAGE_MULTIPART_THRESHOLD_MB", 5)
+    monkeypatch.setattr(settings, "STORAGE_MULTIPART_CHUNK_MB", 5)
+    with mock_aws():
+        boto3.client("s3", endpoint_url=settings.R2_ENDPOINT_URL).create_bucket(Bucket="translations")
+        service = StorageService()
+        yield service
+        service.executor.shutdown(wait=True)
+
+
+def test_large_file_is_uploaded_in_parts(s3_storage, tmp_path):
+    source = tmp_path / "translated.pdf"
+    content = os.urandom(11 * MB)
+    source.write_bytes(content)
+
+    url = asyncio.run(s3_storage.upload_file(str(source), "jobs/translated.pdf"))
+
+    head = s3_storage.s3.head_object(Bucket="translations", Key="jobs/translated.pdf")
+    assert head["ContentLength"] == len(content)
+    # 分片上传的 ETag 以分片数结尾
+    assert head["ETag"].strip('"').endswith("-3")
+    assert urlparse(url).path.endswith("/translations/jobs/translated.pdf")
+
+    target = tmp_path / "downloaded.pdf"
+    asyncio.run(s3_storage.download_file("jobs/translated.pdf", str(target)))
+    assert target.read_bytes() == content
+
+
+def test_small_file_is_uploaded_in_one_request(s3_storage, tmp_path):
+    source = tmp_path / "small.pdf"
+    source.write_bytes(b"%PDF-1.4 small")
+
+    asyncio.run(s3_storage.upload_file(str(source), "small.pdf"))
+
+    head = s3_storage.s3.head_object(Bucket="translations", Key="small.pdf")
+    assert "-" not in head["ETag"]
+
+
+def test_presigned_url_expires(s3_storage, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_URL_EXPIRES", 600)
+
+    url = asyncio.run(s3_storage.presign_url("jobs/result file.pdf"))
+
+    query = parse_qs(urlparse(url).query)
+    assert query["X-Amz-Expires"] == ["600"]
+    assert "X-Amz-Signature" in query
+    assert urlparse(url).path.endswith("/translations/jobs/result%20file.pdf")
+
+
+def test_local_storage_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PUBLIC_BASE_URL", "http://localhost:8000")
+    storage = LocalStorageService(str(tmp_path / "storage"))
+    source = tmp_path / "translated.pdf"
+    source.write_bytes(b"%PDF-1.4 local")
+
+    url = asyncio.run(storage.upload_file(str(source), "jobs/translated.pdf"))
+
+    assert url == f"http://localhost:8000{settings.API_PREFIX}/files/jobs/translated.pdf"
+    assert open(storage.local_path("jobs/translated.pdf"), "rb").read() == b"%PDF-1.4 local"
+
+
+@pytest.mark.parametrize("object_name", ["../outside.pdf", "jobs/../../outside.pdf", "/etc/passwd", "", "."])
+def test_local_storage_rejects_paths_outside_root(tmp_path, object_name):
+    storage = LocalStorageService(str(tmp_path / "storage"))
+    with pytest.raises(ValueError):
+        storage.local_path(object_name)
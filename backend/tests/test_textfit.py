@@ -0,0 +1,98 @@
+import fitz
+import pytest
+
+from app.services.textfit import NO_LINE_START, TextFitter
+
+PARAGRAPH = "The proposed method outperforms the baseline on every dataset we evaluated. " * 4
+CJK_PARAGRAPH = "实验结果表明，所提出的方法在我们评估的每个数据集上都优于基线方法。" * 4
+
+
+def assert_fits(fitter: TextFitter, rect: fitz.Rect, size: float, lines):
+    assert len(lines) * fitter.line_height * size <= rect.height
+    for line in lines:
+        assert fitter.text_width(line) * size <= rect.width + 1e-6
+
+
+def test_short_text_is_written_at_the_original_size():
+    fitter = TextFitter("helv")
+    rect = fitz.Rect(0, 0, 300, 40)
+
+    size, lines = fitter.fit("A short title", rect, 12)
+
+    assert size == 12
+    assert lines == ["A short title"]
+
+
+@pytest.mark.parametrize("fontname,text", [("helv", PARAGRAPH), ("china-s", CJK_PARAGRAPH)])
+def test_long_text_uses_the_largest_size_that_fits(fontname, text):
+    fitter = TextFitter(fontname)
+    rect = fitz.Rect(0, 0, 200, 80)
+
+    size, lines = fitter.fit(text, rect, 12)
+
+    assert TextFitter.MIN_FONT_SIZE <= size < 12
+    assert_fits(fitter, rect, size, lines)
+    # 再大一档就放不下
+    larger = size + 2 * TextFitter.SIZE_PRECISION
+    wrapped = fitter.wrap(fitter.tokenize(text), rect.width / larger)
+    assert len(wrapped) * fitter.line_height * larger > rect.height
+    # 分行只丢弃行尾空白，不丢失文字
+    assert "".join(lines).replace(" ", "") == text.replace(" ", "")
+
+
+def test_latin_text_breaks_between_words():
+    fitter = TextFitter("helv")
+    lines = fitter.wrap(fitter.tokenize(PARAGRAPH), fitter.text_width("The proposed method outperforms"))
+
+    assert len(lines) > 1
+    words = set(PARAGRAPH.split())
+    for line in lines:
+        assert set(line.split()) <= words
+
+
+def test_words_wider_than_the_line_are_split():
+    fitter = TextFitter("helv")
+    word = "Pneumonoultramicroscopicsilicovolcanoconiosis"
+    max_width = fitter.text_width(word) / 3
+
+    lines = fitter.wrap(fitter.tokenize(word), max_width)
+
+    assert len(lines) >= 3
+    assert "".join(lines) == word
+    assert all(fitter.text_width(line) <= max_width for line in lines)
+
+
+def test_cjk_punctuation_does_not_start_a_line():
+    fitter = TextFitter("china-s")
+    tokens = fitter.tokenize(CJK_PARAGRAPH)
+
+    for width in range(5, 30):
+        lines = fitter.wrap(tokens, width)
+        assert "".join(lines) == CJK_PARAGRAPH
+        assert not any(line[0] in NO_LINE_START for line in lines)
+
+
+def test_text_that_does_not_fit_at_the_minimum_size_is_rejected():
+    fitter = TextFitter("helv")
+
+    assert fitter.fit(PARAGRAPH * 10, fitz.Rect(0, 0, 50, 10), 12) is None
+
+
+def test_written_text_stays_inside_the_rect():
+    doc = fitz.open()
+    try:
+        page = doc.new_page()
+        rect = fitz.Rect(72, 72, 272, 152)
+        fitter = TextFitter("helv")
+
+        size = fitter.write(page, rect, PARAGRAPH, 12, (0, 0, 0))
+
+        assert size is not None and size < 12
+        assert page.get_text(clip=rect).split() == PARAGRAPH.split()
+        words = page.get_text("words")
+        assert words
+        for x0, y0, x1, y1, *_ in words:
+            assert rect.x0 - 0.5 <= x0 and x1 <= rect.x1 + 0.5
+            assert rect.y0 - 0.5 <= y0 and y1 <= rect.y1 + 0.5
+    finally:
+        doc.close()
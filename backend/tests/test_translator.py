@@ -0,0 +1,176 @@
+import asyncio
+
+from app.config import settings
+from app.services.engines import OfflineEngine, TranslationEngine
+from app.services.layout import TextBlock
+from app.services.translator import AdaptiveLimiter, TranslatorService
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class CountingEngine(OfflineEngine):
+    """记录同时在途的请求数，前 rate_limited 个请求返回 429"""
+
+    def __init__(self, latency: float = 0.01, rate_limited: int = 0):
+        super().__init__(latency=latency)
+        self.rate_limited = rate_limited
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, kind, messages, max_tokens, temperature):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.requests <= self.rate_limited:
+                await asyncio.sleep(self.latency)
+                raise RateLimited("rate limited")
+            return await super().complete(kind, messages, max_tokens, temperature)
+        finally:
+            self.in_flight -= 1
+
+
+def make_blocks(count: int, page_size: int = 5):
+    return [
+        (i // page_size + 1, TextBlock(f"Paragraph number {i} of the document.", (0, 0, 100, 20), 10, 0, "Helv"))
+        for i in range(count)
+    ]
+
+
+def test_translations_keep_input_order(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    # 部分请求明显变慢，完成顺序与发出顺序不同
+    use_engine(OfflineEngine(latency=0.001, tail_ratio=0.3, tail_latency=0.05, seed=3))
+    blocks = make_blocks(40)
+
+    translated = asyncio.run(TranslatorService.translate_blocks(blocks, "zh", concurrency=8))
+
+    assert [page for page, _ in translated] == [page for page, _ in blocks]
+    assert [block.text for _, block in translated] == [OfflineEngine.translate(block.text) for _, block in blocks]
+    assert [block.rect for _, block in translated] == [block.rect for _, block in blocks]
+
+
+def test_batched_translations_keep_input_order(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCH_MAX_BLOCKS", 7)
+    use_engine(OfflineEngine(latency=0.001))
+    blocks = make_blocks(30)
+
+    translated = asyncio.run(TranslatorService.translate_blocks(blocks, "zh"))
+
+    assert [block.text for _, block in translated] == [OfflineEngine.translate(block.text) for _, block in blocks]
+
+
+def test_progress_callback_is_monotonic_and_reaches_100(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    use_engine(OfflineEngine(latency=0.001, tail_ratio=0.5, tail_latency=0.01, seed=1))
+    reported = []
+
+    async def progress(value: float):
+        reported.append(value)
+
+    asyncio.run(TranslatorService.translate_blocks(make_blocks(20), "zh", progress_callback=progress))
+
+    assert len(reported) == 20
+    assert reported == sorted(reported)
+    assert 0 < reported[0] and reported[-1] == 100
+
+
+def test_concurrency_limit_is_respected(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    engine = CountingEngine(latency=0.01)
+    use_engine(engine)
+
+    asyncio.run(TranslatorService.translate_blocks(make_blocks(30), "zh", concurrency=4))
+
+    assert engine.max_in_flight == 4
+
+
+def test_rate_limit_lowers_concurrency_and_retries(use_engine, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCHING", False)
+    monkeypatch.setattr(settings, "TRANSLATION_RETRIES", 5)
+    engine = CountingEngine(latency=0.01, rate_limited=8)
+    use_engine(engine)
+    blocks = make_blocks(24)
+
+    translated = asyncio.run(TranslatorService.translate_blocks(blocks, "zh", concurrency=8))
+
+    assert [block.text for _, block in translated] == [OfflineEngine.translate(block.text) for _, block in blocks]
+    assert engine.requests == 24 + 8
+
+
+def test_concurrent_rate_limits_halve_once():
+    limiter = AdaptiveLimiter(8)
+
+    async def burst(count: int):
+        async def call():
+            raise RateLimited("rate limited")
+
+        async def one():
+            try:
+                async with limiter as epoch:
+                    await asyncio.sleep(0.01)
+                    await call()
+            except RateLimited:
+                await limiter.on_rate_limit(epoch)
+
+        await asyncio.gather(*(one() for _ in range(count)))
+
+    asyncio.run(burst(8))
+    assert limiter.limit == 4
+
+    # 下调之后发出的一轮请求再遇到限流时继续下调，同样只下调一次
+    asyncio.run(burst(4))
+    assert limiter.limit == 2
+
+
+def test_limit_recovers_after_successes():
+    limiter = AdaptiveLimiter(4)
+
+    async def run():
+        async with limiter as epoch:
+            pass
+        await limiter.on_rate_limit(epoch)
+        assert limiter.limit == 2
+        for _ in range(2):
+            await limiter.on_success()
+        assert limiter.limit == 3
+
+    asyncio.run(run())
+
+
+def test_non_retryable_errors_are_not_retried(use_engine):
+    class BadRequest(TranslationEngine):
+        name = "bad"
+        calls = 0
+
+        async def complete(self, kind, messages, max_tokens, temperature):
+            BadRequest.calls += 1
+            raise ValueError("invalid request")
+
+    use_engine(BadRequest())
+    try:
+        asyncio.run(TranslatorService.translate_blocks(make_blocks(1), "zh"))
+    except Exception as e:
+        assert "invalid request" in str(e)
+    else:
+        raise AssertionError("translation should fail")
+    assert BadRequest.calls == 1
+
+
+def test_single_request_sends_text_once(use_engine):
+    class Recording(OfflineEngine):
+        messages = None
+
+        async def complete(self, kind, messages, max_tokens, temperature):
+            Recording.messages = messages
+            return await super().complete(kind, messages, max_tokens, temperature)
+
+    use_engine(Recording())
+    text = "A distinctive sentence that should appear exactly once."
+    asyncio.run(TranslatorService.translate_text(text, "zh"))
+
+    assert sum(message["content"].count(text) for message in Recording.messages) == 1
+    assert Recording.messages[-1] == {"role": "user", "content": text}
@@ -0,0 +1,88 @@
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from benchmarks.synthetic import make_pdf
+
+
+def pdf_form(size: int):
+    return {"file": ("paper.pdf", b"%PDF-1.4\n" + b"0" * size, "application/pdf")}
+
+
+def test_declared_oversized_upload_is_rejected_before_parsing(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    client = TestClient(app)
+    response = client.post(f"{settings.API_PREFIX}/translate", files=pdf_form(200 * 1024))
+    assert response.status_code == 413
+
+
+def test_chunked_oversized_upload_is_rejected_while_streaming(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+
+    # 生成器请求体不带 Content-Length，按分块传输发送
+    def body():
+        for _ in range(100):
+            yield b"0" * 8192
+
+    client = TestClient(app)
+    response = client.post(
+        f"{settings.API_PREFIX}/translate",
+        content=body(),
+        headers={"content-type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
+
+
+def test_upload_within_limit_reaches_the_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    client = TestClient(app)
+    files = {"file": ("paper.txt", b"%PDF-1.4\n", "text/plain")}
+    response = client.post(f"{settings.API_PREFIX}/translate", files=files)
+    # 通过了大小限制，由接口按文件名拒绝
+    assert response.status_code == 400
+
+
+def upload(client, source):
+    with open(source, "rb") as f:
+        return client.post(f"{settings.API_PREFIX}/translate", files={"file": ("paper.pdf", f, "application/pdf")})
+
+
+def test_same_document_attaches_to_in_flight_job(job_store, tmp_path):
+    source = str(tmp_path / "source.pdf")
+    make_pdf(source, 2, 3)
+    client = TestClient(app)
+
+    first = upload(client, source).json()
+    second = upload(client, source).json()
+
+    assert second["deduplicated"] is True and second["jobId"] == first["jobId"]
+
+
+def test_missing_registered_job_falls_back_to_a_new_job(job_store, tmp_path, monkeypatch):
+    source = str(tmp_path / "source.pdf")
+    make_pdf(source, 2, 3)
+    client = TestClient(app)
+    first = upload(client, source).json()
+
+    # 模拟登记之后、查询之前任务记录被删除
+    def delete(conn):
+        conn.execute("DELETE FROM jobs WHERE id = ?", (first["jobId"],))
+        conn.commit()
+    reserve_document = job_store.reserve_document
+    calls = []
+
+    async def stale_reserve(document_key, job):
+        calls.append(document_key)
+        if len(calls) == 1:
+            existing = await reserve_document(document_key, job)
+            await job_store._run(delete)
+            return existing
+        return await reserve_document(document_key, job)
+    monkeypatch.setattr(job_store, "reserve_document", stale_reserve)
+
+    response = upload(client, source)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["deduplicated"] is False and body["jobId"] != first["jobId"]
+    assert len(calls) == 2
@@ -44,23 +44,58 @@ function App() {
       const jobId = data.jobId;
       console.log('Translation job created:', data);
       
-      // 开始轮询任务状态
-      const pollInterval = setInterval(async () => {
-        const statusResponse = await fetch(`${API_URL}/api/jobs/${jobId}`);
-        const jobStatus = await statusResponse.json();
+      // 任务结束时返回 true
+      const handleStatus = (jobStatus) => {
         console.log('Job status:', jobStatus);
-        
-        if (jobStatus.status === 'completed' && jobStatus.result_url) {
-          clearInterval(pollInterval);
+        // partial：部分文本块翻译失败、保留原文，结果仍可查看
+        if ((jobStatus.status === 'completed' || jobStatus.status === 'partial') && jobStatus.result_url) {
+          if (jobStatus.status === 'partial') {
+            console.warn('Translation partially completed:', jobStatus.error);
+          }
           console.log('Setting translated URL:', jobStatus.result_url);
           setTranslatedUrl(jobStatus.result_url);
           setIsLoading(false);
-        } else if (jobStatus.status === 'failed') {
-          clearInterval(pollInterval);
+          return true;
+        }
+        if (jobStatus.status === 'failed') {
           setIsLoading(false);
           alert(`Translation failed: ${jobStatus.error || 'Unknown error'}`);
+          return true;
         }
-      }, 2000);
+        return false;
+      };
+
+      // 不支持 SSE 或连接失败时退回轮询任务状态
+      const pollStatus = () => {
+        const pollInterval = setInterval(async () => {
+          const statusResponse = await fetch(`${API_URL}/api/jobs/${jobId}`);
+          const jobStatus = await statusResponse.json();
+          if (handleStatus(jobStatus)) {
+            clearInterval(pollInterval);
+          }
+        }, 2000);
+      };
+
+      if (typeof EventSource === 'undefined') {
+        pollStatus();
+      } else {
+        // 通过 SSE 接收服务端推送的进度、阶段和完成事件
+        const events = new EventSource(`${API_URL}/api/jobs/${jobId}/events`);
+        let received = false;
+        events.addEventListener('status', (event) => {
+          received = true;
+          if (handleStatus(JSON.parse(event.data))) {
+            events.close();
+          }
+        });
+        events.onerror = () => {
+          // 从未收到事件说明接口不可用；收到过事件时由浏览器自动重连
+          if (!received) {
+            events.close();
+            pollStatus();
+          }
+        };
+      }
       
     } catch (error) {
       console.error('Translation error:', error);